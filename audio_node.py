@@ -0,0 +1,344 @@
+"""Nodo de audio: resuelve con yt-dlp, ejecuta ffmpeg y trocea el Ogg en paquetes Opus.
+
+Uso:
+    python audio_node.py --listen 127.0.0.1:7070
+    python audio_node.py --listen /tmp/archeon-audio.sock
+
+El bot se conecta con AUDIO_BACKEND=remote y AUDIO_NODES=<direcciones separadas por comas>.
+Se pueden lanzar tantos nodos como haga falta; cada bot reparte entre los que
+tenga conectados. Un ffmpeg que falla solo termina su canción.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import shlex
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from discord.oggparse import OggError, OggPage
+
+from core.audio import CONTROL, escribir_control, escribir_paquete, leer_mensaje
+from core.extraccion import extraer_cancion, extraer_playlist
+from core.ganancia import GainStage
+
+logger = logging.getLogger('audio_node')
+
+NODE_WORKERS = int(os.getenv("AUDIO_NODE_WORKERS", min(32, (os.cpu_count() or 1) * 4)))
+FFMPEG_EXECUTABLE = os.getenv("FFMPEG_EXECUTABLE", "ffmpeg")
+FRAME_SECONDS = 0.02
+
+
+def argumentos_ffmpeg(url, codec, bitrate, before_options, options, posicion=0.0):
+    """Los mismos argumentos que discord.FFmpegOpusAudio, con -ss para retomar a mitad de canción."""
+    args = [FFMPEG_EXECUTABLE]
+    args.extend(shlex.split(before_options or ''))
+    if posicion:
+        args.extend(('-ss', f'{posicion:.2f}'))
+    args.extend(('-i', url))
+    args.extend(('-map_metadata', '-1',
+                 '-f', 'opus',
+                 '-c:a', 'copy' if codec == 'opus' else 'libopus',
+                 '-ar', '48000',
+                 '-ac', '2',
+                 '-b:a', f'{int(bitrate or 128)}k',
+                 '-loglevel', 'warning',
+                 '-fec', 'true',
+                 '-packet_loss', '15',
+                 '-blocksize', '8192'))
+    args.extend(shlex.split(options or ''))
+    args.append('pipe:1')
+    return args
+
+
+async def leer_pagina(stdout):
+    """Siguiente página Ogg de la salida de ffmpeg, o None al final del stream."""
+    try:
+        cabecera = await stdout.readexactly(27)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise OggError('página Ogg incompleta') from None
+        return None
+    if cabecera[:4] != b'OggS':
+        raise OggError(f'cabecera inválida {cabecera[:4]!r}')
+    segtable = await stdout.readexactly(cabecera[26])
+    cuerpo = await stdout.readexactly(sum(segtable))
+    return OggPage(io.BytesIO(cabecera[4:] + segtable + cuerpo))
+
+
+class Stream:
+    """Una canción en reproducción para un bot conectado."""
+
+    def __init__(self, conexion, stream_id, datos):
+        self.conexion = conexion
+        self.stream_id = stream_id
+        self.url = datos['url']
+        self.codec = datos.get('codec')
+        self.bitrate = datos.get('bitrate')
+        self.before_options = datos.get('before_options')
+        self.options = datos.get('options')
+        # Paquetes de audio enviados: la posición para retomar tras una pausa (o una sesión del bot)
+        self.paquetes = round(datos.get('position', 0) / FRAME_SECONDS)
+        self.ganancia = datos.get('gain', 1.0)  # Volumen del servidor por la normalización: se aplica aquí, no en el bot
+        self._etapa = GainStage()
+        self.proceso = None
+        self.pausado = False
+        self.cerrado = False
+        self._creditos = datos.get('credits', 250)
+        self._hay_creditos = asyncio.Event()
+        self._hay_creditos.set()
+        self._reanudado = asyncio.Event()
+        self._interrumpido = False
+        self._stderr = deque(maxlen=5)
+        self.tarea = asyncio.create_task(self._reproducir())
+
+    def conceder(self, n):
+        self._creditos += n
+        self._hay_creditos.set()
+
+    def pausar(self):
+        if not self.pausado:
+            self.pausado = True
+            self._reanudado.clear()
+            self._interrumpir()
+
+    def reanudar(self):
+        self.pausado = False
+        self._reanudado.set()
+
+    def cerrar(self):
+        self.cerrado = True
+        self._reanudado.set()
+        self._interrumpir()
+
+    def _interrumpir(self):
+        # ffmpeg se relanza desde la posición actual en _reproducir
+        self._interrumpido = True
+        self._hay_creditos.set()
+        if self.proceso is not None and self.proceso.returncode is None:
+            with contextlib.suppress(ProcessLookupError):
+                self.proceso.kill()
+
+    async def _reproducir(self):
+        error = None
+        try:
+            while not self.cerrado:
+                if self.pausado:
+                    await self._reanudado.wait()
+                    continue
+                self._interrumpido = False
+                self.proceso = await asyncio.create_subprocess_exec(
+                    *argumentos_ffmpeg(self.url, self.codec, self.bitrate, self.before_options,
+                                       self.options, self.paquetes * FRAME_SECONDS),
+                    stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                drenar = asyncio.create_task(self._drenar_stderr(self.proceso.stderr))
+                try:
+                    await self._bombear(self.proceso.stdout)
+                except (OggError, asyncio.IncompleteReadError) as e:
+                    if not self._interrumpido:
+                        error = f"salida de ffmpeg inválida: {e}"
+                finally:
+                    if self.proceso.returncode is None:
+                        with contextlib.suppress(ProcessLookupError):
+                            self.proceso.kill()
+                    codigo = await self.proceso.wait()
+                    await drenar
+                    self.proceso = None
+                if not self._interrumpido:
+                    if codigo and error is None:
+                        error = f"ffmpeg salió con código {codigo}: {' | '.join(self._stderr)}"
+                    break
+        except Exception as e:
+            logger.exception(f"Error en el stream {self.stream_id}")
+            error = str(e)
+        finally:
+            self.conexion.streams.pop(self.stream_id, None)
+            if not self.cerrado:
+                self.conexion.send({'op': 'end', 'id': self.stream_id, 'error': error})
+
+    async def _bombear(self, stdout):
+        parcial = b''
+        while True:
+            pagina = await leer_pagina(stdout)
+            if pagina is None:
+                return
+            for datos, completo in pagina.iter_packets():
+                parcial += datos
+                if not completo:
+                    continue
+                paquete, parcial = parcial, b''
+                # Las cabeceras Ogg no son audio (y se repetirían en cada relanzamiento)
+                if paquete.startswith((b'OpusHead', b'OpusTags')):
+                    continue
+                while self._creditos <= 0 and not self._interrumpido:
+                    self._hay_creditos.clear()
+                    await self._hay_creditos.wait()
+                if self._interrumpido:
+                    return
+                self._creditos -= 1
+                self.paquetes += 1
+                self.conexion.send_paquete(self.stream_id, self._etapa.procesar(paquete, self.ganancia))
+                await self.conexion.drain()
+
+    async def _drenar_stderr(self, stderr):
+        async for linea in stderr:
+            linea = linea.decode('utf-8', 'replace').strip()
+            if linea:
+                self._stderr.append(linea)
+
+
+class BotConnection:
+    """Un bot conectado: sus peticiones de resolución, playlists y streams."""
+
+    def __init__(self, node, reader, writer):
+        self.node = node
+        self.reader = reader
+        self.writer = writer
+        self.streams = {}
+        self._tareas = {}  # id -> tarea de resolve/playlist
+
+    def send(self, mensaje):
+        if not self.writer.is_closing():
+            escribir_control(self.writer, mensaje)
+
+    def send_paquete(self, stream_id, paquete):
+        if not self.writer.is_closing():
+            escribir_paquete(self.writer, stream_id, paquete)
+
+    async def drain(self):
+        with contextlib.suppress(ConnectionError):
+            await self.writer.drain()
+
+    async def atender(self):
+        try:
+            while True:
+                tipo, _, datos = await leer_mensaje(self.reader)
+                if tipo == CONTROL:
+                    self._despachar(datos)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for stream in list(self.streams.values()):
+                stream.cerrar()
+            for tarea in self._tareas.values():
+                tarea.cancel()
+            self.writer.close()
+
+    def _despachar(self, datos):
+        op, ident = datos.get('op'), datos.get('id')
+        stream = self.streams.get(ident)
+        if op == 'resolve':
+            self._tarea(ident, self._resolver(ident, datos['busqueda']))
+        elif op == 'playlist':
+            self._tarea(ident, self._playlist(ident, datos['url']))
+        elif op == 'cancel':
+            tarea = self._tareas.pop(ident, None)
+            if tarea is not None:
+                tarea.cancel()
+        elif op == 'open':
+            self.streams[ident] = Stream(self, ident, datos)
+        elif op == 'stats':
+            self.send({'op': 'result', 'id': ident, 'result': self.node.stats()})
+        elif stream is None:
+            return
+        elif op == 'credit':
+            stream.conceder(datos['n'])
+        elif op == 'pause':
+            stream.pausar()
+        elif op == 'resume':
+            stream.reanudar()
+        elif op == 'gain':
+            stream.ganancia = datos['gain']
+        elif op == 'close':
+            self.streams.pop(ident, None)
+            stream.cerrar()
+
+    def _tarea(self, ident, coro):
+        tarea = self._tareas[ident] = asyncio.create_task(coro)
+        tarea.add_done_callback(lambda t: self._tareas.pop(ident, None) if self._tareas.get(ident) is t else None)
+
+    async def _resolver(self, ident, busqueda):
+        loop = asyncio.get_running_loop()
+        try:
+            track = await loop.run_in_executor(self.node.executor, extraer_cancion, busqueda)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return self.send({'op': 'result', 'id': ident, 'error': str(e)})
+        self.send({'op': 'result', 'id': ident, 'result': track})
+
+    async def _playlist(self, ident, url):
+        loop = asyncio.get_running_loop()
+        cancelado = threading.Event()
+
+        def emitir(lote):
+            loop.call_soon_threadsafe(self.send, {'op': 'batch', 'id': ident, 'entries': lote})
+
+        try:
+            await loop.run_in_executor(self.node.executor, extraer_playlist, url, emitir, cancelado)
+        except asyncio.CancelledError:
+            cancelado.set()
+            raise
+        except Exception as e:
+            return self.send({'op': 'result', 'id': ident, 'error': str(e)})
+        self.send({'op': 'result', 'id': ident})
+
+
+class AudioNode:
+    def __init__(self, workers=NODE_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='extraccion')
+        self.conexiones = set()
+
+    async def _atender(self, reader, writer):
+        conexion = BotConnection(self, reader, writer)
+        self.conexiones.add(conexion)
+        logger.info(f"Bot conectado ({len(self.conexiones)} en total)")
+        try:
+            await conexion.atender()
+        finally:
+            self.conexiones.discard(conexion)
+            logger.info(f"Bot desconectado ({len(self.conexiones)} en total)")
+
+    def stats(self):
+        streams = [stream for conexion in self.conexiones for stream in conexion.streams.values()]
+        return {
+            'bots': len(self.conexiones),
+            'streams': len(streams),
+            'ffmpeg': sum(stream.proceso is not None for stream in streams),
+            'requests': sum(len(conexion._tareas) for conexion in self.conexiones),
+        }
+
+    async def serve(self, direccion):
+        if '/' in direccion:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(direccion)
+            server = await asyncio.start_unix_server(self._atender, direccion)
+        else:
+            host, puerto = direccion.rsplit(':', 1)
+            server = await asyncio.start_server(self._atender, host, int(puerto))
+        logger.info(f"Nodo de audio escuchando en {direccion}")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nodo de audio de Archeon")
+    parser.add_argument('--listen', default=os.getenv("AUDIO_NODE_LISTEN", "127.0.0.1:7070"),
+                        help="host:puerto o ruta de un socket Unix")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(AudioNode().serve(args.listen))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
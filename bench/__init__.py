@@ -0,0 +1,7 @@
+"""Benchmark sin conexión: los comandos reales contra un Discord, yt-dlp, Gemini, ffmpeg y libopus simulados.
+
+    python -m bench.run --guilds 50 --output antes.json
+    python -m bench.run --guilds 50 --compare antes.json
+
+Los fixtures de bench/fixtures se graban con `python -m bench.record`.
+"""
@@ -0,0 +1,261 @@
+"""Objetos de Discord simulados: lo justo que usan los comandos, con latencia de REST grabada.
+
+Cada servidor lleva su propio RestSimulado (y su propio Random), así que la
+secuencia de latencias de un servidor no depende de cómo se intercalen los demás.
+"""
+import asyncio
+import itertools
+import random
+import threading
+from collections import Counter
+
+_ids = itertools.count(900_000_000_000_000_000)
+
+# Mensajes con los que los comandos avisan de un fallo (se cuentan en el informe)
+PREFIJOS_ERROR = ('❌', '⚠️', '🔴', '⏱️', '⏳', '🚫')
+
+
+def nuevo_id():
+    return next(_ids)
+
+
+class RestSimulado:
+    """Espera en cada llamada REST la latencia de su ruta (media ± jitter, en segundos)."""
+
+    def __init__(self, rutas, seed, escala=1.0):
+        self.rutas = rutas
+        self.escala = escala
+        self.llamadas = Counter()
+        self._rng = random.Random(seed)
+
+    async def esperar(self, ruta):
+        self.llamadas[ruta] += 1
+        media, jitter = self.rutas.get(ruta, self.rutas['default'])
+        latencia = max(0.0, self._rng.gauss(media, jitter)) * self.escala
+        if latencia:
+            await asyncio.sleep(latencia)
+
+
+class FakeMessage:
+    def __init__(self, channel, content=None, embed=None):
+        self.id = nuevo_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.embed = embed
+        self.reactions = []
+
+    async def edit(self, *, content=None, embed=None):
+        await self.channel.rest.esperar('edit_message')
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embed = embed
+        return self
+
+    async def delete(self):
+        await self.channel.rest.esperar('delete_message')
+
+    async def add_reaction(self, emoji):
+        await self.channel.rest.esperar('add_reaction')
+        self.reactions.append(str(emoji))
+
+
+class FakeTextChannel:
+    def __init__(self, guild, name='general'):
+        self.id = nuevo_id()
+        self.name = name
+        self.guild = guild
+        self.rest = guild.rest
+        self.mention = f"<#{self.id}>"
+        self.enviados = 0
+        self.errores = []
+        self.ultimo = None
+
+    async def send(self, content=None, *, embed=None, file=None, **kwargs):
+        await self.rest.esperar('send_message')
+        self.enviados += 1
+        if content and content.startswith(PREFIJOS_ERROR):
+            self.errores.append(content)
+        self.ultimo = FakeMessage(self, content, embed)
+        return self.ultimo
+
+
+class FakeCategory:
+    def __init__(self, guild, name):
+        self.id = nuevo_id()
+        self.name = name
+        self.guild = guild
+        self.channels = []
+
+    async def delete(self, reason=None):
+        await self.guild.rest.esperar('delete_channel')
+        self.guild.categories.remove(self)
+
+
+class FakeVoiceState:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild, name, category=None):
+        self.id = nuevo_id()
+        self.name = name
+        self.guild = guild
+        self.category = category
+        self.members = []
+        self.mention = f"<#{self.id}>"
+
+    async def connect(self, **kwargs):
+        await self.guild.rest.esperar('voice_connect')
+        self.guild.voice_client = FakeVoiceClient(self)
+        return self.guild.voice_client
+
+    async def delete(self, reason=None):
+        await self.guild.rest.esperar('delete_channel')
+        if self.category is not None:
+            self.category.channels.remove(self)
+
+
+class FakeMember:
+    def __init__(self, guild, name, activity=None):
+        self.id = nuevo_id()
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{self.id}>"
+        self.guild = guild
+        self.activity = activity
+        self.voice = None
+        self.bot = False
+
+    async def move_to(self, channel, reason=None):
+        await self.guild.rest.esperar('move_member')
+        if self.voice is not None:
+            self.voice.channel.members.remove(self)
+        channel.members.append(self)
+        self.voice = FakeVoiceState(channel)
+
+
+class FakeVoiceClient:
+    """Reproductor sin red: un hilo lee la fuente cada 20 ms, como el de discord.py, hasta que el
+    benchmark llama a terminar(). Así la ganancia y la caché de audio gastan su CPU de verdad."""
+
+    INTERVALO = 0.02
+    tramas = 0  # Paquetes leídos entre todos los reproductores
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.guild = channel.guild
+        self.source = None
+        self.after = None
+        self._sonando = False
+        self._pausado = False
+        self._hilo = None
+        self._parar = threading.Event()
+
+    def play(self, source, *, after=None, **kwargs):
+        if self._sonando or self._pausado:
+            raise RuntimeError("Already playing audio.")
+        self.source = source
+        self.after = after
+        self._sonando = True
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._leer, args=(source, self._parar), daemon=True)
+        self._hilo.start()
+
+    def _leer(self, source, parar):
+        # Al acabarse la fuente no se llama a `after`: el benchmark llama a check_queue él mismo
+        while not parar.wait(self.INTERVALO):
+            if self._pausado:
+                continue
+            if not source.read():
+                return
+            FakeVoiceClient.tramas += 1
+
+    def is_connected(self):
+        return self.guild.voice_client is self
+
+    def is_playing(self):
+        return self._sonando
+
+    def is_paused(self):
+        return self._pausado
+
+    def pause(self):
+        self._sonando, self._pausado = False, True
+
+    def resume(self):
+        self._sonando, self._pausado = True, False
+
+    def stop(self):
+        self.terminar()
+
+    def terminar(self):
+        """Fin de la canción, sin disparar `after` (el benchmark llama a check_queue él mismo)."""
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        if self.source is not None:
+            self.source.cleanup()
+        self.source = None
+        self._sonando = self._pausado = False
+
+    async def move_to(self, channel):
+        await self.guild.rest.esperar('voice_connect')
+        self.channel = channel
+
+    async def disconnect(self, *, force=False):
+        self.terminar()
+        self.guild.voice_client = None
+
+
+class FakeGuild:
+    def __init__(self, rest, name):
+        self.id = nuevo_id()
+        self.name = name
+        self.rest = rest
+        self.members = {}
+        self.categories = []
+        self.voice_client = None
+        self.member_count = 0
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def add_member(self, name, activity=None):
+        member = FakeMember(self, name, activity)
+        self.members[member.id] = member
+        self.member_count = len(self.members)
+        return member
+
+    async def create_category_channel(self, name, **kwargs):
+        await self.rest.esperar('create_channel')
+        categoria = FakeCategory(self, name)
+        self.categories.append(categoria)
+        return categoria
+
+    async def create_voice_channel(self, name, *, category=None, **kwargs):
+        await self.rest.esperar('create_channel')
+        canal = FakeVoiceChannel(self, name, category)
+        if category is not None:
+            category.channels.append(canal)
+        return canal
+
+
+class FakeContext:
+    """Contexto de un comando escrito por `author` en `channel`."""
+
+    def __init__(self, bot, guild, channel, author):
+        self.bot = bot
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
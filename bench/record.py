@@ -0,0 +1,105 @@
+"""Graba fixtures del benchmark con yt-dlp y Gemini reales.
+
+    python -m bench.record ytdlp "queen bohemian rhapsody" "https://youtu.be/dQw4w9WgXcQ"
+    python -m bench.record gemini "¿qué es un agujero negro?"
+    python -m bench.record gemini --contiene "nombres creativos" "Dame nombres creativos para ..."
+
+Cada grabación sustituye a la anterior con la misma búsqueda (o el mismo
+'contiene'). Las latencias de REST de Discord (discord.json) se toman del
+histograma archeon_discord_rest_seconds de /metrics de un bot en marcha.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from bench.standins import FIXTURES_DIR, cargar_fixture
+
+# Lo que usan extraer_cancion y _elegir_formato; el resto de la info de yt-dlp sobra
+CAMPOS_INFO = ('id', 'title', 'webpage_url', 'duration', 'thumbnail', 'url', 'acodec')
+CAMPOS_FORMATO = ('format_id', 'url', 'ext', 'acodec', 'vcodec', 'abr')
+
+
+def guardar_fixture(nombre, datos):
+    with open(os.path.join(FIXTURES_DIR, nombre), 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, indent=1)
+
+
+def grabar_ytdlp(busquedas):
+    import yt_dlp as youtube_dl
+
+    from core.extraccion import URL_REGEX, ydl_opts
+
+    fixture = cargar_fixture('ytdlp.json')
+    for busqueda in busquedas:
+        inicio = time.perf_counter()
+        with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(busqueda if URL_REGEX.match(busqueda) else f"ytsearch:{busqueda}", download=False)
+        latencia = time.perf_counter() - inicio
+        if info and 'entries' in info:
+            info = next((entry for entry in info['entries'] if entry), None)
+        if not info:
+            print(f"Sin resultados: {busqueda}")
+            continue
+
+        recortada = {campo: info[campo] for campo in CAMPOS_INFO if info.get(campo) is not None}
+        recortada['formats'] = [
+            {campo: formato[campo] for campo in CAMPOS_FORMATO if formato.get(campo) is not None}
+            for formato in info.get('formats') or [] if formato.get('acodec') not in (None, 'none')
+        ]
+        fixture['grabaciones'] = [g for g in fixture['grabaciones'] if g['busqueda'] != busqueda]
+        fixture['grabaciones'].append({'busqueda': busqueda, 'latency': round(latencia, 3), 'info': recortada})
+        print(f"{busqueda}: {recortada['title']} ({latencia:.2f} s)")
+    guardar_fixture('ytdlp.json', fixture)
+
+
+async def grabar_gemini(prompts, contiene):
+    from core.llm import _texto_fragmento, llm
+
+    await llm._cargar()
+    fixture = cargar_fixture('gemini.json')
+    for prompt in prompts:
+        inicio = time.perf_counter()
+        respuesta = await llm.model.generate_content_async(prompt, stream=True)
+        tiempos, fragmentos = [], []
+        async for fragmento in respuesta:
+            tiempos.append(time.perf_counter() - inicio)
+            fragmentos.append(_texto_fragmento(fragmento))
+        if not fragmentos:
+            print(f"Sin respuesta: {prompt}")
+            continue
+
+        intervalos = [b - a for a, b in zip(tiempos, tiempos[1:])]
+        grabacion = {
+            'ttft': round(tiempos[0], 3),
+            'chunk_interval': round(sum(intervalos) / len(intervalos), 3) if intervalos else 0.0,
+            'total': round(tiempos[-1], 3),
+            'chunks': fragmentos,
+        }
+        if contiene:
+            grabacion = {'contiene': contiene, **grabacion}
+            fixture['respuestas'] = [r for r in fixture['respuestas'] if r.get('contiene') != contiene]
+        fixture['respuestas'].append(grabacion)
+        print(f"{prompt[:60]}: {len(fragmentos)} fragmentos, primero a los {tiempos[0]:.2f} s")
+    guardar_fixture('gemini.json', fixture)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m bench.record', description=__doc__.split('\n\n')[0])
+    subparsers = parser.add_subparsers(dest='fuente', required=True)
+    ytdlp = subparsers.add_parser('ytdlp', help="Búsquedas o URLs de YouTube")
+    ytdlp.add_argument('busquedas', nargs='+')
+    gemini = subparsers.add_parser('gemini', help="Prompts para Gemini")
+    gemini.add_argument('prompts', nargs='+')
+    gemini.add_argument('--contiene', help="Servir esta respuesta a los prompts que contengan este texto")
+    args = parser.parse_args()
+
+    if args.fuente == 'ytdlp':
+        grabar_ytdlp(args.busquedas)
+    else:
+        asyncio.run(grabar_gemini(args.prompts, args.contiene))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""Simula N servidores usando el bot a la vez, con los comandos reales y sin red.
+
+Cada servidor repite una sesión: varios ¡play (el primero suena, el resto se
+encola), ¡lista, el paso de canción en canción con check_queue, unas ¡charla,
+una ¡votar con sus reacciones y un ¡separar. Los servidores arrancan escalonados
+y corren a la vez; las sesiones son secuenciales dentro de cada servidor.
+
+La caché de audio y la normalización de sonoridad van activadas: las canciones
+repetidas suenan desde la caché y un hilo por servidor lee la fuente cada 20 ms
+(con la ganancia aplicada), como el reproductor de discord.py.
+
+Mide la latencia de cada comando (p50/p99), el throughput, el retraso del event
+loop y la memoria. Con la misma semilla la carga es la misma, así que dos
+ejecuciones en commits distintos se pueden comparar con --compare.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from bench.fakes import (
+    FakeContext, FakeGuild, FakeTextChannel, FakeVoiceChannel, FakeVoiceClient, FakeVoiceState, RestSimulado, nuevo_id
+)
+from bench.standins import FuenteSimulada, ProcesoSimulado, YoutubeDLGrabado, cargar_fixture, instalar
+
+LAG_PROBE = 0.01  # Cada cuánto se mide el retraso del event loop durante el benchmark
+
+
+def argumentos():
+    parser = argparse.ArgumentParser(prog='python -m bench.run', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--guilds', type=int, default=20, help="Servidores simultáneos")
+    parser.add_argument('--rounds', type=int, default=1, help="Sesiones por servidor")
+    parser.add_argument('--members', type=int, default=6, help="Miembros en el canal de voz de cada servidor")
+    parser.add_argument('--songs', type=int, default=5, help="¡play por sesión")
+    parser.add_argument('--charlas', type=int, default=3, help="¡charla por sesión")
+    parser.add_argument('--votes', type=int, default=20, help="Reacciones a cada ¡votar")
+    parser.add_argument('--ramp', type=float, default=2.0, help="Segundos en los que van entrando los servidores")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--latency-scale', type=float, default=1.0,
+                        help="Multiplica las latencias grabadas (0 = solo CPU del bot)")
+    parser.add_argument('--real-limits', action='store_true',
+                        help="Usar los límites de IA del entorno (por defecto no limitan la carga)")
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help="Pico de memoria de Python con tracemalloc (hace más lentos los comandos)")
+    parser.add_argument('--output', help="Guardar el informe en este JSON")
+    parser.add_argument('--compare', help="Informe JSON anterior con el que comparar")
+    return parser.parse_args()
+
+
+def preparar_entorno(args, data_dir):
+    """Antes de importar core/ y cogs/: leen su configuración del entorno al importarse."""
+    os.environ.update({
+        'ARCHEON_DATA_DIR': data_dir,
+        'ARCHEON_STATE_STORE': 'sqlite',
+        'AUDIO_BACKEND': 'local',
+        'AUDIO_CACHE': '1',  # Las descargas van a ProcesoSimulado, no a ffmpeg
+        'LOUDNESS_NORMALIZATION': '1',  # Se mide sobre la caché; la ganancia usa el libopus simulado
+        'METRICS_PORT': '0',
+    })
+    if not args.real_limits:
+        for variable in ('AI_USER_RATE', 'AI_USER_BURST', 'AI_GUILD_RATE', 'AI_GUILD_BURST',
+                         'AI_GLOBAL_RATE', 'AI_GLOBAL_BURST'):
+            os.environ[variable] = '1000000'
+
+
+class Medidor:
+    """Latencias por comando, incluidos los que fallan (que además se cuentan)."""
+
+    def __init__(self):
+        self.tiempos = defaultdict(list)
+        self.excepciones = Counter()
+
+    async def medir(self, nombre, corrutina):
+        inicio = time.perf_counter()
+        try:
+            return await corrutina
+        except Exception as e:
+            self.excepciones[nombre] += 1
+            logging.getLogger('bench').warning(f"{nombre} lanzó {e!r}")
+        finally:
+            self.tiempos[nombre].append(time.perf_counter() - inicio)
+
+
+class Servidor:
+    """Un servidor simulado: canal de texto, canal de voz y miembros jugando a algo."""
+
+    def __init__(self, indice, args, rutas, juegos):
+        import discord
+
+        self.rng = random.Random(args.seed * 100_003 + indice)
+        self.guild = FakeGuild(RestSimulado(rutas, self.rng.random(), args.latency_scale), f"bench-{indice}")
+        self.texto = FakeTextChannel(self.guild)
+        self.voz = FakeVoiceChannel(self.guild, 'General')
+        # Al menos dos juegos distintos, para que ¡separar tenga algo que separar
+        jugados = self.rng.sample(juegos, k=min(len(juegos), self.rng.randint(2, 3)))
+        self.miembros = [
+            self.guild.add_member(f"usuario{indice}_{i}", discord.Game(jugados[i % len(jugados)]))
+            for i in range(max(2, args.members))
+        ]
+        self.volver_al_canal()
+
+    def volver_al_canal(self):
+        for miembro in self.miembros:
+            if miembro.voice is not None and miembro in miembro.voice.channel.members:
+                miembro.voice.channel.members.remove(miembro)
+            miembro.voice = FakeVoiceState(self.voz)
+        self.voz.members = list(self.miembros)
+
+    def ctx(self, bot, autor=None):
+        return FakeContext(bot, self.guild, self.texto, autor or self.rng.choice(self.miembros))
+
+
+async def sesion(bot, servidor, args, carga, medidor):
+    from cogs.musica import check_queue, fin_de_cancion, get_player
+
+    musica, ia, encuestas, juegos = (bot.get_cog(c) for c in ('Musica', 'IA', 'Encuestas', 'Juegos'))
+    rng = servidor.rng
+    await asyncio.sleep(rng.uniform(0, args.ramp))
+
+    for _ in range(args.rounds):
+        for _ in range(args.songs):
+            busqueda = rng.choice(carga['busquedas'])
+            await medidor.medir('play', musica.play(servidor.ctx(bot), busqueda=busqueda))
+        await medidor.medir('lista', musica.queue(servidor.ctx(bot)))
+
+        # Fin de cada canción: lo que haría el callback `after` del reproductor
+        guild_id = servidor.guild.id
+        for _ in range(len(get_player(guild_id).queue) + 1):
+            voz = servidor.guild.voice_client
+            if voz is None or not voz.is_playing():
+                break
+            voz.terminar()
+            fin_de_cancion[guild_id] = time.perf_counter()
+            await medidor.medir('check_queue', check_queue(servidor.ctx(bot)))
+
+        for _ in range(args.charlas):
+            await medidor.medir('charla', ia.charla(servidor.ctx(bot), mensaje=rng.choice(carga['mensajes'])))
+
+        pregunta, *opciones = rng.choice(carga['encuestas'])
+        await medidor.medir('votar', encuestas.votar(servidor.ctx(bot), '5', pregunta, *opciones))
+        mensaje = servidor.texto.ultimo
+        for _ in range(args.votes):
+            payload = SimpleNamespace(
+                message_id=mensaje.id, channel_id=servidor.texto.id, guild_id=guild_id,
+                user_id=rng.choice(servidor.miembros).id, emoji=rng.choice(mensaje.reactions or ['1️⃣'])
+            )
+            await medidor.medir('reaccion', encuestas.on_raw_reaction_add(payload))
+            await asyncio.sleep(0)
+
+        await medidor.medir('separar', juegos.separar_jugadores(servidor.ctx(bot, servidor.miembros[0])))
+        servidor.volver_al_canal()
+
+
+async def sondear_loop(muestras):
+    loop = asyncio.get_running_loop()
+    while True:
+        inicio = loop.time()
+        await asyncio.sleep(LAG_PROBE)
+        muestras.append(max(0.0, loop.time() - inicio - LAG_PROBE))
+
+
+def resumen(tiempos):
+    from cogs.diagnostico import percentil
+
+    ordenados = sorted(tiempos)
+    if not ordenados:
+        return {'count': 0}
+    return {
+        'count': len(ordenados),
+        'p50_ms': round(percentil(ordenados, 50) * 1000, 2),
+        'p99_ms': round(percentil(ordenados, 99) * 1000, 2),
+        'mean_ms': round(sum(ordenados) / len(ordenados) * 1000, 2),
+        'max_ms': round(ordenados[-1] * 1000, 2),
+    }
+
+
+def commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def principal(args):
+    from core.archeon import EXTENSIONS, Archeon
+    from core.cache import prompt_cache
+    from core.cache_audio import audio_cache
+    from core.volumen import loudness_store
+
+    modelo = instalar(args.latency_scale)
+    carga = cargar_fixture('carga.json')
+    rutas = {ruta: tuple(valores) for ruta, valores in cargar_fixture('discord.json')['rutas'].items()}
+
+    bot = Archeon()
+    bot._connection.user = SimpleNamespace(id=nuevo_id(), name='Archeon', bot=True)
+    for extension in EXTENSIONS:
+        await bot.load_extension(extension)
+    # load_extension vuelve a ejecutar el módulo: importar sus objetos después, no antes
+    from cogs.musica import fuentes_creadas, resolver, transition_gaps
+    random.seed(args.seed)  # Lo que use random directamente (¡shuffle, jitter de reintentos...)
+
+    servidores = [Servidor(i, args, rutas, carga['juegos']) for i in range(args.guilds)]
+    medidor = Medidor()
+    lag = []
+    sonda = asyncio.create_task(sondear_loop(lag))
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    await asyncio.gather(*(sesion(bot, servidor, args, carga, medidor) for servidor in servidores))
+    duracion = time.perf_counter() - inicio
+    pico_python = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    tracemalloc.stop()
+
+    sonda.cancel()
+    await bot.get_cog('Encuestas').engine.stop()
+    for servidor in servidores:
+        if servidor.guild.voice_client is not None:
+            servidor.guild.voice_client.terminar()
+    # Descargas a la caché y medidas de sonoridad pendientes: antes de borrar el directorio de datos
+    for executor in (audio_cache._executor, loudness_store._executor):
+        await asyncio.to_thread(executor.shutdown, wait=True)
+
+    comandos = {nombre: resumen(tiempos) for nombre, tiempos in sorted(medidor.tiempos.items())}
+    total = sum(len(t) for nombre, t in medidor.tiempos.items() if nombre != 'reaccion')
+    rest = Counter()
+    for servidor in servidores:
+        rest.update(servidor.guild.rest.llamadas)
+    errores = Counter(
+        error.split('\n')[0][:80] for servidor in servidores for error in servidor.texto.errores
+    )
+    memoria = {'python_peak_mb': round(pico_python / 2 ** 20, 1) if pico_python is not None else None}
+    if resource is not None:
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        memoria['maxrss_mb'] = round(maxrss / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+    return {
+        'commit': commit_actual(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {clave: valor for clave, valor in vars(args).items() if clave not in ('output', 'compare')},
+        'wall_seconds': round(duracion, 3),
+        'commands': total,
+        'throughput_cmd_s': round(total / duracion, 2),
+        'latency': comandos,
+        'loop_lag_ms': {
+            clave: valor for clave, valor in resumen(lag).items() if clave in ('count', 'p50_ms', 'p99_ms', 'max_ms')
+        },
+        'memory': memoria,
+        'backends': {
+            'ytdlp_extractions': YoutubeDLGrabado.extracciones,
+            'gemini_calls': modelo.llamadas,
+            'audio_sources': dict(fuentes_creadas),
+            'audio_sources_not_cleaned': FuenteSimulada.abiertas - FuenteSimulada.cerradas,
+            'audio_frames': FakeVoiceClient.tramas,
+            'audio_cache': dict(audio_cache.stats(), downloads=ProcesoSimulado.lanzados),
+            'loudness': loudness_store.stats(),
+            'resolver': resolver.stats(),
+            'prompt_cache': prompt_cache.stats(),
+            'transition_gap_ms': resumen(transition_gaps),
+            'discord_rest': dict(sorted(rest.items())),
+        },
+        'exceptions': dict(medidor.excepciones),
+        'error_messages': dict(errores.most_common(10)),
+    }
+
+
+def imprimir(informe, anterior=None):
+    def cambio(actual, antes):
+        if not antes:
+            return ''
+        return f" ({(actual - antes) / antes:+.0%} vs {antes})"
+
+    def fila(nombre, actual, clave):
+        antes = None
+        if anterior is not None:
+            antes = anterior['latency'].get(nombre, {}).get(clave)
+        return f"{actual.get(clave, 0):>9.1f}{cambio(actual.get(clave, 0), antes):<22}"
+
+    print(f"\nCommit {informe['commit']} | {informe['config']['guilds']} servidores | "
+          f"{informe['commands']} comandos en {informe['wall_seconds']:.1f} s")
+    throughput = f"{informe['throughput_cmd_s']:.1f} comandos/s"
+    if anterior is not None:
+        throughput += cambio(informe['throughput_cmd_s'], anterior['throughput_cmd_s'])
+    print(f"Throughput: {throughput}\n")
+    print(f"{'comando':<12}{'n':>6}{'p50 ms':>9}{'':<22}{'p99 ms':>9}")
+    for nombre, stats in informe['latency'].items():
+        print(f"{nombre:<12}{stats['count']:>6}{fila(nombre, stats, 'p50_ms')}{fila(nombre, stats, 'p99_ms')}")
+
+    lag = informe['loop_lag_ms']
+    linea = f"\nRetraso del loop: p50 {lag.get('p50_ms', 0):.1f} ms | p99 {lag.get('p99_ms', 0):.1f} ms"
+    if anterior is not None:
+        linea += cambio(lag.get('p99_ms', 0), anterior['loop_lag_ms'].get('p99_ms'))
+    print(f"{linea} | máx {lag.get('max_ms', 0):.1f} ms")
+    memoria = ' | '.join(f"{clave} {valor}" for clave, valor in informe['memory'].items() if valor is not None)
+    print(f"Memoria: {memoria or 'sin datos'}")
+    if informe['exceptions'] or informe['error_messages']:
+        print(f"Excepciones: {informe['exceptions']} | Mensajes de error: {informe['error_messages']}")
+
+
+def main():
+    args = argumentos()
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s %(name)s: %(message)s')
+    anterior = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            anterior = json.load(f)
+
+    with tempfile.TemporaryDirectory(prefix='archeon-bench-', ignore_cleanup_errors=True) as data_dir:
+        preparar_entorno(args, data_dir)
+        informe = asyncio.run(principal(args))
+
+    imprimir(informe, anterior)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(informe, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""Sustitutos locales de yt-dlp, Gemini, ffmpeg y libopus que sirven los fixtures grabados.
+
+La respuesta y la latencia dependen solo del texto pedido (crc32), no del
+orden de llegada, para que dos ejecuciones con la misma semilla hagan lo mismo.
+"""
+import asyncio
+import copy
+import io
+import json
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import types
+import zlib
+
+import discord
+import numpy as np
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+STREAM_TTL = 6 * 3600  # Lo que dura una URL de googlevideo recién extraída
+
+_EXPIRE = re.compile(r'expire=\d+')
+
+
+def cargar_fixture(nombre):
+    with open(os.path.join(FIXTURES_DIR, nombre), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _indice(texto, n):
+    return zlib.crc32(texto.encode('utf-8')) % n
+
+
+def _jitter(texto, amplitud):
+    """Desviación fija para cada texto, entre -amplitud y +amplitud."""
+    return (_indice(texto, 2001) / 1000 - 1) * amplitud
+
+
+class YoutubeDLGrabado:
+    """Sustituto de yt_dlp.YoutubeDL: devuelve la info grabada tras la latencia grabada."""
+
+    grabaciones = []
+    escala = 1.0
+    extracciones = 0
+    _lock = threading.Lock()
+
+    def __init__(self, opts=None):
+        self.opts = opts or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False, process=True):
+        busqueda = url.removeprefix('ytsearch:')
+        grabacion = self._buscar(busqueda)
+        with self._lock:
+            YoutubeDLGrabado.extracciones += 1
+        latencia = grabacion['latency'] + _jitter(busqueda, grabacion['latency'] * 0.2)
+        time.sleep(max(0.0, latencia) * self.escala)
+
+        info = copy.deepcopy(grabacion['info'])
+        _renovar_urls(info)
+        return {'entries': [info]} if url.startswith('ytsearch:') else info
+
+    def _buscar(self, busqueda):
+        clave = busqueda.lower().strip()
+        for grabacion in self.grabaciones:
+            info = grabacion['info']
+            if clave == grabacion['busqueda'].lower() or clave in (info['webpage_url'].lower(), info['id'].lower()):
+                return grabacion
+        return self.grabaciones[_indice(clave, len(self.grabaciones))]
+
+
+def _renovar_urls(info):
+    # Las URLs grabadas ya caducaron: el resolver las daría por muertas nada más encolarlas
+    expire = f"expire={int(time.time()) + STREAM_TTL}"
+    for formato in [info] + info.get('formats', []):
+        if formato.get('url'):
+            formato['url'] = _EXPIRE.sub(expire, formato['url'])
+
+
+class _Fragmento:
+    def __init__(self, text):
+        self.text = text
+
+
+class _RespuestaStream:
+    def __init__(self, fragmentos, intervalo):
+        self._fragmentos = fragmentos
+        self._intervalo = intervalo
+
+    async def __aiter__(self):
+        for i, texto in enumerate(self._fragmentos):
+            if i:
+                await asyncio.sleep(self._intervalo)
+            yield _Fragmento(texto)
+
+
+class GeminiGrabado:
+    """Sustituto del GenerativeModel: la respuesta grabada para el prompt, con sus tiempos.
+
+    Se usa la primera grabación cuyo 'contiene' aparezca en el prompt; si no
+    hay ninguna, una de las genéricas (las que no tienen 'contiene').
+    """
+
+    def __init__(self, grabaciones, escala=1.0):
+        self.especificas = [g for g in grabaciones if g.get('contiene')]
+        self.genericas = [g for g in grabaciones if not g.get('contiene')]
+        self.escala = escala
+        self.llamadas = 0
+
+    def _elegir(self, prompt):
+        for grabacion in self.especificas:
+            if grabacion['contiene'] in prompt:
+                return grabacion
+        return self.genericas[_indice(prompt, len(self.genericas))]
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.llamadas += 1
+        grabacion = self._elegir(prompt)
+        if not stream:
+            await asyncio.sleep(grabacion['total'] * self.escala)
+            return _Fragmento(''.join(grabacion['chunks']))
+        await asyncio.sleep(grabacion['ttft'] * self.escala)
+        return _RespuestaStream(grabacion['chunks'], grabacion['chunk_interval'] * self.escala)
+
+
+class FuenteSimulada(discord.AudioSource):
+    """En lugar de discord.FFmpegOpusAudio: no arranca ningún proceso."""
+
+    abiertas = 0
+    cerradas = 0
+
+    def __init__(self, source, **kwargs):
+        self.url = source
+        self.opciones = kwargs
+        self._cerrada = False
+        FuenteSimulada.abiertas += 1
+
+    def read(self):
+        return b''
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        if not self._cerrada:
+            self._cerrada = True
+            FuenteSimulada.cerradas += 1
+
+
+# Paquetes Opus simulados: 2 bytes con la amplitud de una senoidal de 1 kHz, estable para cada canción.
+# Bastan para que la caché guarde contenedores de tamaño real, se mida su sonoridad y la
+# ganancia los decodifique, multiplique y vuelva a codificar; lo que no se mide es libopus.
+MUESTRAS_TRAMA = 960
+SENOIDAL = np.sin(2 * np.pi * 1000 * np.arange(MUESTRAS_TRAMA) / 48000).repeat(2)
+_OGG_PAGINA = struct.Struct('<4sBBQIIIB')
+_DURACIONES = {}  # URL del stream sin 'expire' -> duración de la canción grabada
+
+
+def paquete_simulado(amplitud):
+    return struct.pack('!H', amplitud)
+
+
+def ogg_simulado(paquetes, por_pagina=255):
+    """Un stream Ogg con los paquetes, como el que escribe ffmpeg con -f opus (sin CRC de página)."""
+    salida = io.BytesIO()
+    cabeceras = [b'OpusHead' + bytes(11), b'OpusTags' + bytes(8)]
+    for i, pagina in enumerate([cabeceras[:1], cabeceras[1:]] + [
+        paquetes[j:j + por_pagina] for j in range(0, len(paquetes), por_pagina)
+    ]):
+        salida.write(_OGG_PAGINA.pack(b'OggS', 0, 0, 0, 1, i, 0, len(pagina)))
+        salida.write(bytes(len(p) for p in pagina))
+        salida.write(b''.join(pagina))
+    return salida.getvalue()
+
+
+class ProcesoSimulado:
+    """En lugar del ffmpeg que descarga una canción a la caché: un Ogg con tantos paquetes como dure."""
+
+    lanzados = 0
+
+    def __init__(self, args):
+        url = _EXPIRE.sub('', args[args.index('-i') + 1])
+        duracion = _DURACIONES.get(url, 0)
+        amplitud = 2000 + _indice(url, 20000)
+        self.stdout = io.BytesIO(ogg_simulado([paquete_simulado(amplitud)] * round(duracion / 0.02)))
+        self.returncode = 0
+        ProcesoSimulado.lanzados += 1
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+    def poll(self):
+        return self.returncode
+
+    def kill(self):
+        pass
+
+
+class DecoderSimulado:
+    """En lugar de discord.opus.Decoder: el PCM s16le estéreo de la senoidal del paquete."""
+
+    def decode(self, paquete):
+        (amplitud,) = struct.unpack_from('!H', paquete)
+        return (SENOIDAL * amplitud).astype('<i2').tobytes()
+
+
+class EncoderSimulado:
+    """En lugar de discord.opus.Encoder: vuelve a dejar la amplitud en 2 bytes."""
+
+    def encode(self, pcm, frame_size):
+        return paquete_simulado(min(65535, int(np.abs(np.frombuffer(pcm, dtype='<i2')).max())))
+
+
+def instalar(escala=1.0):
+    """Sustituye yt-dlp, el modelo de Gemini, ffmpeg y libopus en este proceso; devuelve el modelo."""
+    import core.cache_audio
+    from core.llm import llm
+
+    yt_dlp = types.ModuleType('yt_dlp')
+    yt_dlp.YoutubeDL = YoutubeDLGrabado
+    sys.modules['yt_dlp'] = yt_dlp
+    YoutubeDLGrabado.grabaciones = cargar_fixture('ytdlp.json')['grabaciones']
+    YoutubeDLGrabado.escala = escala
+
+    for grabacion in YoutubeDLGrabado.grabaciones:
+        info = grabacion['info']
+        for formato in [info] + info.get('formats', []):
+            if formato.get('url') and info.get('duration'):
+                _DURACIONES[_EXPIRE.sub('', formato['url'])] = info['duration']
+
+    discord.FFmpegOpusAudio = FuenteSimulada
+    core.cache_audio.lanzar_ffmpeg = ProcesoSimulado
+    discord.opus.Decoder = DecoderSimulado
+    discord.opus.Encoder = EncoderSimulado
+    llm.model = GeminiGrabado(cargar_fixture('gemini.json')['respuestas'], escala)
+    return llm.model
@@ -0,0 +1 @@
+"""Extensiones del bot (una por módulo); se cargan en Archeon.setup_hook."""
@@ -0,0 +1,259 @@
+"""Diagnóstico: contadores internos para el dueño del bot."""
+import io
+import time
+
+import discord
+from discord.ext import commands
+
+from cogs.ia import CHAT_MEMORY_TOKENS, conversaciones, ttft_charla
+from cogs.musica import fuentes_creadas, players, prefetcher, resolver, transition_gaps
+from core.audio import AUDIO_BACKEND, audio_nodes
+from core.cache import prompt_cache
+from core.cache_audio import audio_cache
+from core.llm import limiter
+from core.metrics import registry
+from core.profiling import PROFILE_MAX_SECONDS, SamplingProfiler
+from core.state import state
+from core.volumen import loudness_store
+
+# Gauges de /metrics; se actualizan en el loop con Diagnostico.recolectar_metricas
+GUILDS = registry.gauge('archeon_guilds', "Servidores de este cluster")
+GATEWAY_LATENCY = registry.gauge('archeon_gateway_latency_seconds', "Latencia del heartbeat del gateway", ('shard',))
+VOICE_CLIENTS = registry.gauge('archeon_voice_clients', "Conexiones de voz activas")
+MUSIC_PLAYERS = registry.gauge('archeon_music_players', "Servidores con reproductor de música")
+QUEUE_TRACKS = registry.gauge('archeon_music_queue_tracks', "Canciones en cola (suma de todos los servidores)")
+QUEUE_MAX = registry.gauge('archeon_music_queue_max_tracks', "Cola más larga de un servidor")
+FFMPEG_PROCESSES = registry.gauge('archeon_ffmpeg_processes', "Procesos ffmpeg de este proceso (sonando o precargados)")
+AUDIO_NODE_STREAMS = registry.gauge('archeon_audio_node_streams', "Streams servidos por nodos de audio")
+AUDIO_NODES_CONNECTED = registry.gauge('archeon_audio_nodes_connected', "Nodos de audio conectados")
+RESOLVES_IN_FLIGHT = registry.gauge('archeon_resolves_in_flight', "Extracciones de yt-dlp en curso")
+CACHE_ENTRIES = registry.gauge('archeon_cache_entries', "Entradas en caché", ('cache',))
+CACHE_HIT_RATIO = registry.gauge('archeon_cache_hit_ratio', "Proporción de aciertos de la caché", ('cache',))
+AUDIO_CACHE_BYTES = registry.gauge('archeon_audio_cache_bytes', "Tamaño en disco de la caché de audio")
+CHAT_USERS = registry.gauge('archeon_charla_users', "Usuarios con memoria de ¡charla")
+AI_QUEUED = registry.gauge('archeon_ai_queued_requests', "Peticiones de IA esperando cupo")
+POLLS_OPEN = registry.gauge('archeon_polls_open', "Votaciones abiertas")
+
+
+def percentil(valores_ordenados, p):
+    indice = min(len(valores_ordenados) - 1, int(len(valores_ordenados) * p / 100))
+    return valores_ordenados[indice]
+
+
+class Diagnostico(commands.Cog):
+    """Comandos de diagnóstico."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.profiler = SamplingProfiler()
+
+    async def cog_load(self):
+        registry.add_collector(self.recolectar_metricas)
+
+    async def cog_unload(self):
+        registry.remove_collector(self.recolectar_metricas)
+
+    def recolectar_metricas(self):
+        """Vuelca en los gauges el mismo estado que muestra ¡stats."""
+        GUILDS.set(len(self.bot.guilds))
+        for shard_id, latencia in self.bot.latencies:
+            if latencia == latencia:  # Sin NaN (shard sin heartbeat todavía)
+                GATEWAY_LATENCY.set(latencia, shard=shard_id)
+
+        VOICE_CLIENTS.set(len(self.bot.voice_clients))
+        colas = [len(player.queue) for player in players.values()]
+        MUSIC_PLAYERS.set(len(colas))
+        QUEUE_TRACKS.set(sum(colas))
+        QUEUE_MAX.set(max(colas, default=0))
+        # Las fuentes de música van dentro de un GainTransformer
+        fuentes = [vc.source for vc in self.bot.voice_clients if vc.source is not None]
+        FFMPEG_PROCESSES.set(sum(
+            isinstance(getattr(source, 'original', source), discord.FFmpegAudio)
+            for source in fuentes + prefetcher.ready_sources()
+        ))
+        if AUDIO_BACKEND == 'remote':
+            nodos = audio_nodes.stats()
+            AUDIO_NODE_STREAMS.set(nodos['streams'])
+            AUDIO_NODES_CONNECTED.set(nodos['connected'])
+
+        canciones = resolver.stats()
+        RESOLVES_IN_FLIGHT.set(canciones['in_flight'])
+        prompts = prompt_cache.stats()
+        audio = audio_cache.stats()
+        for nombre, stats in (('tracks', canciones), ('prompts', prompts), ('audio', audio)):
+            CACHE_ENTRIES.set(stats['entries'], cache=nombre)
+            CACHE_HIT_RATIO.set(stats['hit_ratio'], cache=nombre)
+        AUDIO_CACHE_BYTES.set(audio['bytes'])
+        CHAT_USERS.set(conversaciones.stats()['users'])
+        AI_QUEUED.set(limiter.stats()['queued'])
+        encuestas = self.bot.get_cog('Encuestas')
+        if encuestas is not None:
+            POLLS_OPEN.set(encuestas.engine.stats()['open'])
+
+    @commands.command(name='stats', hidden=True)
+    @commands.is_owner()
+    async def estadisticas(self, ctx):
+        """Muestra contadores internos del bot (solo el dueño)"""
+        stats = resolver.stats()
+        embed = discord.Embed(title="📈 Estadísticas internas", color=discord.Color.dark_grey())
+        embed.add_field(
+            name="Caché de canciones",
+            value=(
+                f"Entradas: {stats['entries']} | En vuelo: {stats['in_flight']}\n"
+                f"Aciertos: {stats['hits']} | Fallos: {stats['misses']} ({stats['hit_ratio']:.0%} aciertos)\n"
+                f"Desalojos: {stats['evictions']} | Expiradas: {stats['expirations']} | "
+                f"Agrupadas: {stats['coalesced']}"
+            ),
+            inline=False
+        )
+        fuentes = (
+            f"Passthrough Opus: {fuentes_creadas['passthrough']} | Transcodificadas: {fuentes_creadas['transcode']} | "
+            f"Desde caché: {fuentes_creadas['cache']}"
+        )
+        if loudness_store.enabled:
+            sonoridad = loudness_store.stats()
+            fuentes += (
+                f"\nSonoridad medida: {sonoridad['measured']} canciones | Midiendo: {sonoridad['measuring']} | "
+                f"Fallidas: {sonoridad['failed']}"
+            )
+        if AUDIO_BACKEND == 'remote':
+            nodos = audio_nodes.stats()
+            fuentes += f"\nNodos de audio: {nodos['connected']}/{nodos['nodes']} | Streams: {nodos['streams']}"
+        embed.add_field(name="Fuentes de audio", value=fuentes, inline=False)
+        audio = audio_cache.stats()
+        if audio_cache.enabled:
+            embed.add_field(
+                name="Caché de audio",
+                value=(
+                    f"Canciones: {audio['entries']} ({audio['bytes'] / 2 ** 20:.0f} MB) | "
+                    f"Aciertos: {audio['hits']} | Fallos: {audio['misses']} ({audio['hit_ratio']:.0%})\n"
+                    f"Guardadas: {audio['populated']} | Descargando: {audio['downloading']} | "
+                    f"Fallidas: {audio['failed']} | Desalojos: {audio['evictions']} | Corruptas: {audio['corrupt']}"
+                ),
+                inline=False
+            )
+        prompts = prompt_cache.stats()
+        embed.add_field(
+            name="Caché de prompts",
+            value=(
+                f"Entradas: {prompts['entries']} | Aciertos: {prompts['hits']} | Fallos: {prompts['misses']} "
+                f"({prompts['hit_ratio']:.0%}) | Desalojos: {prompts['evictions']} | Ignorada: {prompts['bypassed']}"
+            ),
+            inline=False
+        )
+        limites = limiter.stats()
+        embed.add_field(
+            name="Límites de IA",
+            value=(
+                f"Rechazadas: {limites['rejected']} | En espera: {limites['queued']} | "
+                f"Bloqueo por 429: {limites['blocked_for']:.0f} s"
+            ),
+            inline=False
+        )
+        charlas = conversaciones.stats()
+        embed.add_field(
+            name="Memoria de ¡charla",
+            value=(
+                f"Usuarios: {charlas['users']} | Tokens: {charlas['tokens']}/{CHAT_MEMORY_TOKENS} | "
+                f"Desalojados: {charlas['evictions']} | Resúmenes: {charlas['summaries']}"
+            ),
+            inline=False
+        )
+        votaciones = self.bot.get_cog('Encuestas').engine.stats()
+        embed.add_field(
+            name="Votaciones",
+            value=f"Abiertas: {votaciones['open']} | Votos en curso: {votaciones['votes']}",
+            inline=False
+        )
+        if ttft_charla:
+            tiempos = sorted(ttft_charla)
+            embed.add_field(
+                name="Primer texto visible en ¡charla",
+                value=(
+                    f"p50: {percentil(tiempos, 50) * 1000:.0f} ms | p95: {percentil(tiempos, 95) * 1000:.0f} ms "
+                    f"({len(tiempos)} respuestas)"
+                ),
+                inline=False
+            )
+        if transition_gaps:
+            gaps = sorted(transition_gaps)
+            embed.add_field(
+                name="Silencio entre canciones",
+                value=(
+                    f"p50: {percentil(gaps, 50) * 1000:.0f} ms | p95: {percentil(gaps, 95) * 1000:.0f} ms | "
+                    f"máx: {gaps[-1] * 1000:.0f} ms ({len(gaps)} cambios)"
+                ),
+                inline=False
+            )
+        bloqueos = self.bot.watchdog.recientes
+        if bloqueos:
+            hora, duracion, origen, _ = bloqueos[-1]
+            embed.add_field(
+                name="Bloqueos del event loop",
+                value=(
+                    f"Recientes: {len(bloqueos)} | Último: {duracion * 1000:.0f} ms en {origen} "
+                    f"(hace {(time.time() - hora) / 60:.0f} min)"
+                ),
+                inline=False
+            )
+        await ctx.send(embed=embed)
+
+    @commands.command(name='perfilar', hidden=True)
+    @commands.is_owner()
+    async def perfilar(self, ctx, segundos: float = 10):
+        """Perfila el event loop N segundos y resume el tiempo por comando (solo el dueño)"""
+        if self.profiler.running:
+            return await ctx.send("⚠️ Ya hay un perfilado en curso.")
+        segundos = max(1.0, min(segundos, PROFILE_MAX_SECONDS))
+        await ctx.send(f"🔬 Perfilando el event loop durante {segundos:.0f} s...")
+        perfil = await self.profiler.run(segundos)
+
+        total = perfil.total()
+        if not total:
+            return await ctx.send("📭 No se tomó ninguna muestra.")
+        embed = discord.Embed(
+            title="🔬 Perfil del event loop",
+            description=(
+                f"{total} muestras cada {perfil.interval * 1000:.0f} ms | "
+                f"Loop libre el {perfil.inactivo / total:.0%} del tiempo"
+            ),
+            color=discord.Color.dark_grey()
+        )
+        for origen, muestras in list(perfil.por_origen().items())[:10]:
+            funciones = '\n'.join(
+                f"`{funcion}` {n / muestras:.0%}" for funcion, n in perfil.funciones_propias(origen, 3)
+            )
+            embed.add_field(name=f"{origen}: {muestras / total:.0%}", value=funciones, inline=False)
+        embed.set_footer(text="perfil.folded: pilas plegadas para flamegraph.pl o speedscope")
+        archivo = discord.File(io.BytesIO(perfil.plegado().encode('utf-8')), filename='perfil.folded')
+        await ctx.send(embed=embed, file=archivo)
+
+    @commands.command(name='clusters', hidden=True)
+    @commands.is_owner()
+    async def clusters(self, ctx):
+        """Estado agregado de todos los clusters (solo el dueño)"""
+        # El propio cluster se incluye siempre, aunque aún no haya publicado su latido
+        latidos = await state.items('clusters')
+        latidos[str(self.bot.cluster_id)] = self.bot.cluster_stats()
+        filas = sorted(latidos.values(), key=lambda c: c['cluster'])
+
+        embed = discord.Embed(title="🛰️ Clusters", color=discord.Color.dark_grey())
+        for c in filas:
+            latencia = f"{c['latency_ms']} ms" if c['latency_ms'] is not None else "?"
+            embed.add_field(
+                name=f"Cluster {c['cluster']} (pid {c['pid']})",
+                value=(
+                    f"Shards: {', '.join(map(str, c['shards']))} | Servidores: {c['guilds']} | "
+                    f"Voz: {c['voice']} | Latencia: {latencia} | Activo: {c['uptime'] // 60} min"
+                ),
+                inline=False
+            )
+        embed.set_footer(text=(
+            f"Total: {sum(c['guilds'] for c in filas)} servidores, {sum(c['users'] for c in filas)} miembros, "
+            f"{sum(c['voice'] for c in filas)} conexiones de voz en {len(filas)}/{self.bot.cluster_count} clusters"
+        ))
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Diagnostico(bot))
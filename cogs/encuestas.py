@@ -0,0 +1,310 @@
+"""Votaciones: conteo en vivo por reacciones, plazos en un solo temporizador y persistencia."""
+import asyncio
+import contextlib
+import heapq
+import json
+import logging
+import os
+import time
+
+import discord
+from discord.ext import commands
+
+from core.cache import prompt_cache
+from core.llm import llm
+from core.storage import db
+
+POLL_EMOJIS = ['1️⃣', '2️⃣', '3️⃣', '4️⃣', '5️⃣', '6️⃣']
+POLL_FLUSH_INTERVAL = float(os.getenv("POLL_FLUSH_INTERVAL", 5))  # Segundos entre escrituras de votos
+
+
+class Poll:
+    """Votación abierta: un voto por usuario (el último cuenta)."""
+
+    __slots__ = ('message_id', 'channel_id', 'guild_id', 'pregunta', 'opciones', 'deadline', 'votos')
+
+    def __init__(self, message_id, channel_id, guild_id, pregunta, opciones, deadline, votos=None):
+        self.message_id = message_id
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.pregunta = pregunta
+        self.opciones = opciones
+        self.deadline = deadline
+        self.votos = votos or {}  # user_id -> índice de opción
+
+    def option_index(self, emoji):
+        try:
+            indice = POLL_EMOJIS.index(emoji)
+        except ValueError:
+            return None
+        return indice if indice < len(self.opciones) else None
+
+    def results(self):
+        conteo = [0] * len(self.opciones)
+        for indice in self.votos.values():
+            conteo[indice] += 1
+        return {op: conteo[i] for i, op in enumerate(self.opciones) if conteo[i]}
+
+
+class PollEngine:
+    """Votaciones contadas en vivo desde los eventos de reacción.
+
+    Un solo temporizador (un heap de plazos) cierra todas las votaciones, y las
+    abiertas se guardan en SQLite para retomarlas tras un reinicio.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS polls (
+            message_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            guild_id INTEGER,
+            pregunta TEXT NOT NULL,
+            opciones TEXT NOT NULL,
+            deadline REAL NOT NULL,
+            votos TEXT NOT NULL DEFAULT '{}'
+        );
+    """
+
+    def __init__(self, bot, db):
+        self.bot = bot
+        self.db = db
+        db.executescript(self.SCHEMA)
+        self.polls = {}
+        self._plazos = []  # heap de (deadline, message_id)
+        self._sucias = set()
+        self._despertar = None
+        self._tareas = []
+
+    def _cargar(self):
+        """Retoma las votaciones guardadas de los servidores de este cluster."""
+        for message_id, channel_id, guild_id, pregunta, opciones, deadline, votos in self.db.execute(
+            "SELECT message_id, channel_id, guild_id, pregunta, opciones, deadline, votos FROM polls"
+        ):
+            if message_id in self.polls or not self.bot.owns_guild(guild_id):
+                continue
+            votos = {int(uid): indice for uid, indice in json.loads(votos).items()}
+            self._registrar(Poll(message_id, channel_id, guild_id, pregunta, json.loads(opciones), deadline, votos))
+
+    def _registrar(self, poll):
+        self.polls[poll.message_id] = poll
+        heapq.heappush(self._plazos, (poll.deadline, poll.message_id))
+        if self._despertar is not None:
+            self._despertar.set()
+
+    def start(self):
+        """Arranca el temporizador y el guardado periódico (idempotente)."""
+        if self._tareas:
+            return
+        self._cargar()
+        self._despertar = asyncio.Event()
+        self._tareas = [
+            asyncio.create_task(self._temporizador()),
+            asyncio.create_task(self._guardar_periodicamente()),
+        ]
+
+    async def stop(self):
+        """Detiene el temporizador y guarda los votos pendientes."""
+        for tarea in self._tareas:
+            tarea.cancel()
+        self._tareas = []
+        await self.flush()
+
+    async def open(self, mensaje, pregunta, opciones, duracion):
+        poll = Poll(
+            mensaje.id, mensaje.channel.id, getattr(mensaje.guild, 'id', None),
+            pregunta, list(opciones), time.time() + duracion
+        )
+        await self.db.run(
+            self.db.execute,
+            "INSERT INTO polls (message_id, channel_id, guild_id, pregunta, opciones, deadline) VALUES (?, ?, ?, ?, ?, ?)",
+            (poll.message_id, poll.channel_id, poll.guild_id, pregunta, json.dumps(poll.opciones, ensure_ascii=False), poll.deadline)
+        )
+        self._registrar(poll)
+        self.start()
+        return poll
+
+    def vote(self, payload):
+        poll = self.polls.get(payload.message_id)
+        if poll is None or payload.user_id == self.bot.user.id:
+            return
+        indice = poll.option_index(str(payload.emoji))
+        if indice is not None:
+            poll.votos[payload.user_id] = indice
+            self._sucias.add(poll.message_id)
+
+    def unvote(self, payload):
+        poll = self.polls.get(payload.message_id)
+        if poll is None:
+            return
+        indice = poll.option_index(str(payload.emoji))
+        # Solo cuenta si quita la reacción de su voto vigente
+        if indice is not None and poll.votos.get(payload.user_id) == indice:
+            del poll.votos[payload.user_id]
+            self._sucias.add(poll.message_id)
+
+    async def _temporizador(self):
+        while True:
+            self._despertar.clear()
+            # Plazos de votaciones ya cerradas se descartan al llegar a la cima
+            while self._plazos and self._plazos[0][1] not in self.polls:
+                heapq.heappop(self._plazos)
+            espera = self._plazos[0][0] - time.time() if self._plazos else None
+            if espera is not None and espera <= 0:
+                _, message_id = heapq.heappop(self._plazos)
+                poll = self.polls.pop(message_id, None)
+                if poll is not None:
+                    asyncio.create_task(self._cerrar(poll))
+                continue
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._despertar.wait(), timeout=espera)
+
+    async def _guardar_periodicamente(self):
+        while True:
+            await asyncio.sleep(POLL_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        """Escribe solo las votaciones con votos nuevos desde el último guardado."""
+        if not self._sucias:
+            return
+        filas = [
+            (json.dumps(self.polls[mid].votos), mid)
+            for mid in self._sucias if mid in self.polls
+        ]
+        self._sucias.clear()
+        await self.db.run(self.db.executemany, "UPDATE polls SET votos = ? WHERE message_id = ?", filas)
+
+    async def _cerrar(self, poll):
+        self._sucias.discard(poll.message_id)
+        try:
+            await self.db.run(self.db.execute, "DELETE FROM polls WHERE message_id = ?", (poll.message_id,))
+            canal = self.bot.get_channel(poll.channel_id) or await self.bot.fetch_channel(poll.channel_id)
+            await anunciar_resultado(canal, poll)
+        except Exception as e:
+            logging.error(f"Error al cerrar votación {poll.message_id}: {str(e)}")
+
+    def stats(self):
+        return {
+            'open': len(self.polls),
+            'votes': sum(len(p.votos) for p in self.polls.values()),
+        }
+
+
+async def anunciar_resultado(canal, poll):
+    """Publica el ganador de una votación con el conteo ya hecho en memoria."""
+    resultados = poll.results()
+
+    # Determinar ganador
+    if not resultados:
+        return await canal.send("🤷 Nadie votó.")
+
+    ganador = max(resultados.items(), key=lambda x: x[1])
+    porcentaje = (ganador[1] / sum(resultados.values())) * 100
+    pregunta = poll.pregunta
+
+    # Generar comentario con IA
+    try:
+        # El comentario depende solo del resultado: se reutiliza para votaciones equivalentes
+        clave = "votar:" + json.dumps(
+            [' '.join(pregunta.lower().split()), ganador[0].lower().strip(), round(porcentaje, -1)],
+            ensure_ascii=False
+        )
+        comentario = await prompt_cache.get_or_generate(
+            clave,
+            lambda: llm.generate(
+                f"Crea un comentario gracioso (1 línea) sobre esta votación: "
+                f"'{pregunta}'. Ganador: '{ganador[0]}' con {porcentaje:.1f}% votos.",
+                guild_id=poll.guild_id
+            ),
+            ttl=24 * 3600
+        )
+    except Exception:
+        comentario = "¡Y el veredicto es...!"
+
+    # Mostrar resultados
+    embed_resultado = discord.Embed(
+        title=f"🎉 Ganador: {ganador[0]} ({porcentaje:.1f}%)",
+        description=f"**{pregunta}**\n\n{comentario}",
+        color=discord.Color.green()
+    )
+    await canal.send(embed=embed_resultado)
+
+
+class Encuestas(commands.Cog):
+    """Comandos de votaciones."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.engine = PollEngine(bot, db)
+
+    async def cog_unload(self):
+        await self.engine.stop()
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        self.engine.vote(payload)
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_remove(self, payload):
+        self.engine.unvote(payload)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Las votaciones que vencieron con el bot apagado se cierran en cuanto arranca el temporizador
+        self.engine.start()
+
+    @commands.command(name="votar")
+    async def votar(self, ctx, *args):
+        """Crea encuestas con o sin tiempo personalizado.
+        Uso 1: ¡votar "¿Pregunta?" op1 op2 (1 minuto por defecto)
+        Uso 2: ¡votar 5 "¿Pregunta?" op1 op2 (5 minutos)"""
+
+        # Configuración inicial
+        tiempo_minutos = 1  # Valor por defecto
+        pregunta = ""
+        opciones = []
+        emojis = POLL_EMOJIS
+
+        # Procesar argumentos
+        try:
+            # Caso 1: ¡votar "pregunta" op1 op2
+            if not args[0].isdigit():
+                pregunta = args[0]
+                opciones = list(args[1:])
+
+            # Caso 2: ¡votar 5 "pregunta" op1 op2
+            else:
+                tiempo_minutos = int(args[0])
+                pregunta = args[1]
+                opciones = list(args[2:])
+
+            # Validaciones
+            if len(opciones) < 2:
+                return await ctx.send("❌ Necesitas al menos 2 opciones.")
+            if len(opciones) > 6:
+                return await ctx.send("⚠️ Máximo 6 opciones permitidas.")
+            if tiempo_minutos <= 0:
+                return await ctx.send("❌ El tiempo debe ser mayor a 0 minutos.")
+
+        except IndexError:
+            return await ctx.send("❌ Formato incorrecto. Ejemplos:\n"
+                                "`¡votar \"¿Pregunta?\" op1 op2`\n"
+                                "`¡votar 3 \"¿Pregunta?\" op1 op2`")
+
+        # Crear embed
+        embed = discord.Embed(
+            title=f"📊 {pregunta}",
+            description="\n".join([f"{emojis[i]} {op}" for i, op in enumerate(opciones)]),
+            color=discord.Color.gold()
+        )
+        embed.set_footer(text=f"⏳ Votación abierta por {tiempo_minutos} minuto(s)")
+
+        # Enviar y registrar antes de añadir reacciones, para no perder los primeros votos
+        mensaje = await ctx.send(embed=embed)
+        await self.engine.open(mensaje, pregunta, opciones, tiempo_minutos * 60)
+        for i in range(len(opciones)):
+            await mensaje.add_reaction(emojis[i])
+
+
+async def setup(bot):
+    await bot.add_cog(Encuestas(bot))
@@ -0,0 +1,397 @@
+"""IA: ¡charla con memoria por usuario y respuestas en streaming."""
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+import discord
+from discord.ext import commands
+
+from core.llm import LLMError, LLMOverloaded, RateLimited, limiter, llm
+from core.metrics import registry
+from core.state import state
+
+logger = logging.getLogger(__name__)
+
+
+# Respuestas de la IA en streaming
+CHARLA_STREAMING = os.getenv("CHARLA_STREAMING", "1") != "0"
+DISCORD_MESSAGE_LIMIT = 2000
+CURSOR = " ▌"  # Al final del mensaje mientras llega el texto
+STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", 1.2))  # Discord limita las ediciones por canal
+
+ttft_charla = deque(maxlen=500)  # Segundos hasta que el usuario ve el primer texto
+TTFT_CHARLA = registry.histogram(
+    'archeon_charla_first_text_seconds', "Tiempo hasta que el usuario ve el primer texto de ¡charla"
+)
+
+
+def _partir_mensaje(texto, limite=DISCORD_MESSAGE_LIMIT):
+    """Corta `texto` en (cabeza, resto) por un salto de línea o espacio antes del límite."""
+    corte = texto.rfind('\n', 0, limite)
+    if corte < limite // 2:
+        corte = texto.rfind(' ', 0, limite)
+    if corte <= 0:
+        corte = limite
+    return texto[:corte], texto[corte:].lstrip()
+
+
+class StreamingReply:
+    """Muestra una respuesta en streaming editando un mensaje de Discord.
+
+    Las ediciones se agrupan cada STREAM_EDIT_INTERVAL segundos y, si el texto
+    pasa de 2000 caracteres, la respuesta continúa en un mensaje nuevo.
+    """
+
+    def __init__(self, channel, prefijo=''):
+        self.channel = channel
+        self.prefijo = prefijo
+        self.mensaje = None
+        self.texto = ''
+        self.completo = []
+        self._ultima_edicion = 0.0
+        self._inicio = time.perf_counter()
+        self._primer_texto_visible = False
+
+    async def start(self):
+        self.mensaje = await self.channel.send(f"{self.prefijo} ✍️ ...")
+        self.texto = f"{self.prefijo} "
+
+    async def feed(self, fragmento):
+        if not fragmento:
+            return
+        self.completo.append(fragmento)
+        self.texto += fragmento
+        if time.perf_counter() - self._ultima_edicion >= STREAM_EDIT_INTERVAL:
+            await self.flush()
+
+    async def flush(self, final=False):
+        # Mientras escribe, el cursor también cuenta para el límite de Discord
+        limite = DISCORD_MESSAGE_LIMIT if final else DISCORD_MESSAGE_LIMIT - len(CURSOR)
+        while len(self.texto) > limite:
+            cabeza, self.texto = _partir_mensaje(self.texto, limite)
+            await self.mensaje.edit(content=cabeza)
+            self.mensaje = await self.channel.send("✍️ ...")
+
+        await self.mensaje.edit(content=self.texto if final else self.texto + CURSOR)
+        self._ultima_edicion = time.perf_counter()
+        if not self._primer_texto_visible and self.completo:
+            self._primer_texto_visible = True
+            ttft_charla.append(self._ultima_edicion - self._inicio)
+            TTFT_CHARLA.observe(self._ultima_edicion - self._inicio)
+
+    async def finish(self):
+        await self.flush(final=True)
+        return ''.join(self.completo).strip()
+
+    async def abort(self):
+        """Si falló antes de escribir nada, quita el mensaje provisional."""
+        if self.mensaje is not None and not self.completo:
+            try:
+                await self.mensaje.delete()
+            except discord.HTTPException:
+                pass
+
+
+# Memoria de ¡charla: presupuesto en tokens por usuario y global
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", 1500))  # Turnos recientes que entran en el prompt
+CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", 250))   # Resumen de los turnos anteriores
+CHAT_MEMORY_TOKENS = int(os.getenv("CHAT_MEMORY_TOKENS", 500_000))  # Tope global entre todos los usuarios
+CHAT_IDLE_TTL = float(os.getenv("CHAT_IDLE_TTL", 6 * 3600))
+
+
+def estimar_tokens(texto):
+    """Aproximación barata (~4 caracteres por token); suficiente para presupuestar."""
+    return len(texto) // 4 + 1
+
+
+class Conversation:
+    __slots__ = ('turns', 'summary', 'pending', 'tokens', 'last_used', 'compacting', 'version')
+
+    def __init__(self):
+        self.turns = deque()    # (texto, tokens)
+        self.summary = ''
+        self.pending = []       # Turnos que salieron del presupuesto y aún no están en el resumen
+        self.tokens = 0
+        self.last_used = time.monotonic()
+        self.compacting = False
+        self.version = 0.0      # time.time() del último cambio, para sincronizar entre clusters
+
+
+class ConversationStore:
+    """Historial de ¡charla por usuario, acotado por tokens.
+
+    Cada usuario guarda sus turnos recientes hasta CHAT_HISTORY_TOKENS; los que
+    sobran se compactan en un resumen acumulado, así el prompt no crece por
+    mucho que se charle. Los usuarios inactivos se olvidan tras CHAT_IDLE_TTL y,
+    si se supera CHAT_MEMORY_TOKENS entre todos, se desalojan los menos recientes.
+    """
+
+    def __init__(self, budget=CHAT_HISTORY_TOKENS, summary_budget=CHAT_SUMMARY_TOKENS,
+                 memory_budget=CHAT_MEMORY_TOKENS, idle_ttl=CHAT_IDLE_TTL):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.memory_budget = memory_budget
+        self.idle_ttl = idle_ttl
+        self._conversaciones = OrderedDict()
+        self.total_tokens = 0
+        self.evictions = 0
+        self.summaries = 0
+
+    def context(self, user_id):
+        """(resumen, [líneas recientes]) para construir el prompt."""
+        conv = self._conversaciones.get(user_id)
+        if conv is None:
+            return '', []
+        self._tocar(user_id, conv)
+        return conv.summary, [texto for texto, _ in conv.turns]
+
+    def add(self, user_id, *lineas):
+        conv = self._conversaciones.get(user_id)
+        if conv is None:
+            conv = self._conversaciones[user_id] = Conversation()
+        self._tocar(user_id, conv)
+
+        for texto in lineas:
+            tokens = estimar_tokens(texto)
+            conv.turns.append((texto, tokens))
+            self._sumar(conv, tokens)
+
+        conv.version = time.time()
+        # Lo que no cabe en el presupuesto pasa a la cola de resumen
+        while conv.tokens > self.budget and len(conv.turns) > 1:
+            texto, tokens = conv.turns.popleft()
+            conv.pending.append(texto)
+            self._sumar(conv, -tokens)
+
+        self._desalojar()
+
+    def needs_compaction(self, user_id):
+        conv = self._conversaciones.get(user_id)
+        return conv is not None and bool(conv.pending) and not conv.compacting
+
+    async def compact(self, user_id):
+        """Funde los turnos pendientes en el resumen (con la IA; si falla, recortando)."""
+        conv = self._conversaciones.get(user_id)
+        if conv is None or not conv.pending or conv.compacting:
+            return
+        conv.compacting = True
+        pendientes = conv.pending
+        conv.pending = []
+        limite_chars = self.summary_budget * 4
+
+        try:
+            resumen = await llm.generate(
+                f"Resume en menos de {self.summary_budget // 2} palabras la conversación entre un usuario "
+                "y Archeon, conservando datos del usuario y temas pendientes.\n\n"
+                f"Resumen previo:\n{conv.summary or '(ninguno)'}\n\n"
+                "Nuevos mensajes:\n" + "\n".join(pendientes),
+                timeout=20
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo resumir la conversación de {user_id}: {e}")
+            resumen = "\n".join([conv.summary, *pendientes]).strip()[-limite_chars:]
+        finally:
+            conv.compacting = False
+
+        if self._conversaciones.get(user_id) is not conv:
+            return  # Se olvidó mientras se resumía
+        self._sumar(conv, estimar_tokens(resumen[:limite_chars]) - estimar_tokens(conv.summary))
+        conv.summary = resumen[:limite_chars]
+        conv.version = time.time()
+        self.summaries += 1
+
+    def export(self, user_id):
+        """Copia serializable de la conversación (None si no hay), para el estado compartido."""
+        conv = self._conversaciones.get(user_id)
+        if conv is None:
+            return None
+        return {
+            'summary': conv.summary,
+            'turns': [texto for texto, _ in conv.turns],
+            'pending': list(conv.pending),
+            'version': conv.version
+        }
+
+    def load(self, user_id, datos):
+        """Sustituye la conversación local si `datos` (de otro cluster) es más reciente."""
+        if not datos:
+            return
+        conv = self._conversaciones.get(user_id)
+        if conv is not None and (conv.version >= datos['version'] or conv.compacting):
+            return
+        self.forget(user_id)
+        if not (datos['summary'] or datos['turns'] or datos['pending']):
+            return  # Se usó ¡olvidar en otro cluster
+        conv = self._conversaciones[user_id] = Conversation()
+        conv.summary = datos['summary']
+        conv.pending = list(datos['pending'])
+        conv.version = datos['version']
+        self._sumar(conv, estimar_tokens(conv.summary) if conv.summary else 0)
+        for texto in datos['turns']:
+            tokens = estimar_tokens(texto)
+            conv.turns.append((texto, tokens))
+            self._sumar(conv, tokens)
+        self._desalojar()
+
+    def forget(self, user_id):
+        conv = self._conversaciones.pop(user_id, None)
+        if conv is not None:
+            self.total_tokens -= conv.tokens
+
+    def _tocar(self, user_id, conv):
+        conv.last_used = time.monotonic()
+        self._conversaciones.move_to_end(user_id)
+
+    def _sumar(self, conv, tokens):
+        conv.tokens += tokens
+        self.total_tokens += tokens
+
+    def _desalojar(self):
+        limite_inactividad = time.monotonic() - self.idle_ttl
+        while self._conversaciones:
+            user_id, conv = next(iter(self._conversaciones.items()))
+            if conv.last_used > limite_inactividad and self.total_tokens <= self.memory_budget:
+                break
+            self.forget(user_id)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            'users': len(self._conversaciones),
+            'tokens': self.total_tokens,
+            'evictions': self.evictions,
+            'summaries': self.summaries
+        }
+
+
+conversaciones = ConversationStore()
+
+
+# Un usuario puede charlar en servidores de distintos clusters: la memoria se comparte por el estado común
+async def sincronizar_conversacion(user_id):
+    """Trae la conversación del estado compartido si otro cluster la cambió."""
+    try:
+        conversaciones.load(user_id, await state.get('charla', user_id))
+    except Exception as e:
+        logger.warning(f"No se pudo leer la conversación compartida de {user_id}: {e}")
+
+
+async def publicar_conversacion(user_id):
+    try:
+        # Tras ¡olvidar se publica una conversación vacía, para que los demás clusters también la olviden
+        datos = conversaciones.export(user_id) or {'summary': '', 'turns': [], 'pending': [], 'version': time.time()}
+        await state.set('charla', user_id, datos, ttl=CHAT_IDLE_TTL)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la conversación compartida de {user_id}: {e}")
+
+
+async def compactar_y_publicar(user_id):
+    await conversaciones.compact(user_id)
+    await publicar_conversacion(user_id)
+
+
+class IA(commands.Cog):
+    """Comandos de IA."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command()
+    async def charla(self, ctx, *, mensaje: str):
+        """Interactúa con la IA de Google Gemini con memoria contextual mejorada."""
+        user_id = str(ctx.author.id)
+
+        # Respuestas rápidas
+        quick_responses = {
+            "¿cómo te llamas?": "🤖 ¡Soy Archeon, tu asistente de Discord! ✨",
+            "¿quién eres?": "🤖 ¡Soy Archeon, tu asistente de Discord! ✨",
+            "¿cuál es tu nombre?": "🤖 ¡Soy Archeon, tu asistente de Discord! ✨",
+            "¿quién soy?": f"🤖 ¡Claro que te conozco, {ctx.author.mention}! Eres {ctx.author.name} 😊",
+            "¿cómo me llamo?": f"🤖 ¡Claro que te conozco, {ctx.author.mention}! Eres {ctx.author.name} 😊",
+            "¿me conoces?": f"🤖 ¡Claro que te conozco, {ctx.author.mention}! Eres {ctx.author.name} 😊"
+        }
+
+        lower_msg = mensaje.lower().strip()
+        if lower_msg in quick_responses:
+            return await ctx.send(quick_responses[lower_msg])
+
+        try:
+            # Construir contexto (resumen de lo antiguo + turnos recientes dentro del presupuesto)
+            await sincronizar_conversacion(user_id)
+            resumen, historial = conversaciones.context(user_id)
+            context = {
+                "resumen": f"Resumen de la conversación anterior:\n{resumen}\n\n" if resumen else "",
+                "historial": "\n".join(historial),
+                "nuevo_mensaje": mensaje,
+                "usuario": ctx.author.name
+            }
+
+            prompt = (
+                "Eres un asistente de Discord llamado Archeon. "
+                "{resumen}"
+                "Aquí está el historial de conversación reciente:\n"
+                "{historial}\n\n"
+                "Nuevo mensaje de {usuario}: {nuevo_mensaje}\n\n"
+                "Responde de manera concisa y amigable."
+            ).format(**context)
+
+            # Generar respuesta (en streaming, editando el mensaje a medida que llega el texto)
+            if CHARLA_STREAMING:
+                reply = StreamingReply(ctx.channel, ctx.author.mention)
+                # Admitir antes de enviar nada: una petición rechazada solo cuesta el mensaje de ⏳
+                fragmentos_llm = await llm.stream(prompt, user_id=ctx.author.id, guild_id=getattr(ctx.guild, 'id', None))
+                try:
+                    await reply.start()
+                    async with contextlib.aclosing(fragmentos_llm) as fragmentos:
+                        async for fragmento in fragmentos:
+                            await reply.feed(fragmento)
+                    respuesta = await reply.finish()
+                except BaseException:
+                    await reply.abort()
+                    raise
+            else:
+                respuesta = await llm.generate(prompt, user_id=ctx.author.id, guild_id=getattr(ctx.guild, 'id', None))
+
+            # Actualizar historial; el resumen de lo que sobra se hace en segundo plano
+            conversaciones.add(user_id, f"{ctx.author.name}: {mensaje}", f"Archeon: {respuesta}")
+            if conversaciones.needs_compaction(user_id):
+                asyncio.create_task(compactar_y_publicar(user_id))
+            else:
+                asyncio.create_task(publicar_conversacion(user_id))
+
+            # Enviar respuesta
+            if not CHARLA_STREAMING:
+                await ctx.send(f"{ctx.author.mention} {respuesta}")
+
+        except RateLimited as e:
+            await ctx.send(f"⏳ {ctx.author.mention} demasiadas peticiones a la IA ({e.scope}). Intenta en {e.retry_after:.0f} s.")
+
+        except LLMOverloaded:
+            espera = limiter.blocked_for()
+            await ctx.send(f"⏳ La IA está saturada ahora mismo. Intenta en {max(1, espera):.0f} s.")
+
+        except LLMError as api_error:
+            await ctx.send("🔴 Error con la API de Google. Por favor, reporta esto al administrador.")
+            logger.error(f"Google API Error: {api_error}")
+
+        except asyncio.TimeoutError:
+            await ctx.send("⏱️ La IA tardó demasiado en responder. Intenta nuevamente.")
+
+        except Exception as e:
+            logger.error(f"Error inesperado: {e}", exc_info=True)
+            await ctx.send("⚠️ Ocurrió un error inesperado. Por favor, intenta nuevamente más tarde.")
+
+    @commands.command()
+    async def olvidar(self, ctx):
+        """Reinicia el historial de conversación contigo"""
+        user_id = str(ctx.author.id)
+        conversaciones.forget(user_id)
+        await publicar_conversacion(user_id)
+        await ctx.send("🔄 ¡He reiniciado nuestra conversación! ¿En qué puedo ayudarte ahora?")
+
+
+async def setup(bot):
+    await bot.add_cog(IA(bot))
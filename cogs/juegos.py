@@ -0,0 +1,265 @@
+"""Juegos: ¡separar reparte a los jugadores en canales de voz temporales por juego."""
+import asyncio
+import json
+import logging
+import os
+import time
+import traceback
+
+import discord
+from discord.ext import commands
+
+from core.cache import prompt_cache
+from core.llm import llm
+from core.scheduler import scheduler
+from core.storage import db
+
+TEMP_CATEGORY_NAME = "Juegos Temporales"
+TEMP_CHANNEL_IDLE = float(os.getenv("TEMP_CHANNEL_IDLE", 300))   # Canal recién creado al que nadie entró
+TEMP_CHANNEL_GRACE = float(os.getenv("TEMP_CHANNEL_GRACE", 60))  # Canal que se acaba de quedar vacío
+
+
+class TempChannelRegistry:
+    """Canales de voz temporales de ¡separar, guardados en SQLite para sobrevivir a reinicios.
+
+    El borrado lo dispara on_voice_state_update cuando un canal se queda vacío
+    (tras un periodo de gracia), no una corrutina dormida por cada comando.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS temp_channels (
+            channel_id INTEGER PRIMARY KEY,
+            guild_id INTEGER NOT NULL,
+            juego TEXT,
+            creado REAL NOT NULL
+        );
+    """
+
+    def __init__(self, bot, db):
+        self.bot = bot
+        self.db = db
+        db.executescript(self.SCHEMA)
+        self._ids = dict(db.execute("SELECT channel_id, guild_id FROM temp_channels"))  # channel_id -> guild_id
+        self._temporizadores = {}
+
+    def __contains__(self, channel_id):
+        return channel_id in self._ids
+
+    async def add(self, channel, juego):
+        self._ids[channel.id] = channel.guild.id
+        await self.db.run(
+            self.db.execute,
+            "INSERT OR REPLACE INTO temp_channels VALUES (?, ?, ?, ?)",
+            (channel.id, channel.guild.id, juego, time.time())
+        )
+
+    async def remove(self, channel_id):
+        self._ids.pop(channel_id, None)
+        self.cancel_check(channel_id)
+        await self.db.run(self.db.execute, "DELETE FROM temp_channels WHERE channel_id = ?", (channel_id,))
+
+    def schedule_check(self, channel_id, delay):
+        """Borra el canal dentro de `delay` segundos si para entonces sigue vacío."""
+        self.cancel_check(channel_id)
+        loop = asyncio.get_running_loop()
+        self._temporizadores[channel_id] = loop.call_later(
+            delay, lambda: asyncio.create_task(self._borrar_si_vacio(channel_id))
+        )
+
+    def cancel_check(self, channel_id):
+        temporizador = self._temporizadores.pop(channel_id, None)
+        if temporizador is not None:
+            temporizador.cancel()
+
+    async def _borrar_si_vacio(self, channel_id):
+        self._temporizadores.pop(channel_id, None)
+        canal = self.bot.get_channel(channel_id)
+        if canal is not None and canal.members:
+            return
+
+        categoria = canal.category if canal is not None else None
+        if canal is not None:
+            try:
+                await scheduler.run(
+                    'delete_channel', canal.guild.id,
+                    lambda: canal.delete(reason="Canal temporal de juego vacío")
+                )
+            except discord.NotFound:
+                pass
+            except Exception as e:
+                logging.error(f"Error al eliminar canal {canal.name}: {str(e)}")
+                return
+        await self.remove(channel_id)
+
+        # Si la categoría temporal quedó vacía, también se elimina
+        if categoria is not None and categoria.name == TEMP_CATEGORY_NAME and not [
+            c for c in categoria.channels if c.id != channel_id
+        ]:
+            try:
+                await categoria.delete(reason="Categoría temporal vacía")
+            except discord.HTTPException:
+                pass
+
+    def reconcile(self):
+        """Al arrancar: olvida canales que ya no existen y programa el borrado de los vacíos.
+
+        Solo revisa los servidores de este cluster; los demás no están en su caché.
+        """
+        for channel_id, guild_id in list(self._ids.items()):
+            if not self.bot.owns_guild(guild_id):
+                continue
+            canal = self.bot.get_channel(channel_id)
+            if canal is None:
+                asyncio.create_task(self.remove(channel_id))
+            elif not canal.members:
+                self.schedule_check(channel_id, TEMP_CHANNEL_GRACE)
+
+
+class Juegos(commands.Cog):
+    """Comandos de juegos."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.temp_channels = TempChannelRegistry(bot, db)
+
+    @commands.command(name='separar', aliases=['gamevoice'])
+    async def separar_jugadores(self, ctx, opcion: str = None):
+        """Separa a los usuarios en canales de voz según el juego que están jugando.
+        Con `¡separar nuevo` se piden nombres nuevos a la IA en lugar de reutilizar los anteriores."""
+        try:
+            # Verificar que el comando se ejecuta en un servidor
+            if not ctx.guild:
+                await ctx.send("❌ Este comando solo funciona en servidores.")
+                return
+
+            # Verificar que el usuario está en un canal de voz
+            if not ctx.author.voice or not ctx.author.voice.channel:
+                await ctx.send("❌ Debes estar en un canal de voz para usar este comando.")
+                return
+
+            voice_channel = ctx.author.voice.channel
+            members = voice_channel.members
+
+            # Obtener los juegos activos entre los miembros
+            juegos_activos = {}
+            for member in members:
+                if member.activity and member.activity.type == discord.ActivityType.playing:
+                    juego = member.activity.name
+                    if juego not in juegos_activos:
+                        juegos_activos[juego] = []
+                    juegos_activos[juego].append(member)
+
+            # Si no hay suficientes juegos diferentes
+            if len(juegos_activos) < 2:
+                await ctx.send("🔍 No hay suficientes juegos diferentes para separar (se necesitan al menos 2).")
+                return
+
+            # Consultar a la IA para nombres creativos de canales
+            prompt = (
+                f"Dame nombres creativos para canales de Discord basados en estos juegos: {', '.join(juegos_activos.keys())}. "
+                "Los nombres deben ser cortos, relevantes al juego y entre 3-5 palabras. "
+                "Formato: Juego: Nombre sugerido (uno por juego)"
+            )
+
+            async def generar_nombres():
+                texto = await llm.generate(prompt, user_id=ctx.author.id, guild_id=ctx.guild.id)
+                nombres = {}
+
+                # Parsear la respuesta de la IA
+                for line in texto.split('\n'):
+                    if ':' in line:
+                        juego, nombre = line.split(':', 1)
+                        juego = juego.strip()
+                        nombre = nombre.strip()
+                        if juego in juegos_activos:
+                            nombres[juego] = nombre
+                # Los juegos que la IA no nombró usan el nombre por defecto
+                for juego in juegos_activos:
+                    nombres.setdefault(juego, f"🎮 {juego}")
+                return nombres
+
+            try:
+                # Mismo conjunto de juegos -> mismos nombres, sin volver a preguntar a la IA
+                clave = "separar:" + json.dumps(sorted(juegos_activos), ensure_ascii=False)
+                nombres_canales = await prompt_cache.get_or_generate(
+                    clave, generar_nombres, bypass=opcion in ('nuevo', 'nuevos')
+                )
+            except Exception as e:
+                logging.error(f"Error al generar nombres con IA: {str(e)}")
+                # Usar nombres por defecto si falla la IA
+                nombres_canales = {juego: f"🎮 {juego}" for juego in juegos_activos}
+
+            # Crear categoría temporal si no existe
+            categoria = discord.utils.get(ctx.guild.categories, name=TEMP_CATEGORY_NAME)
+            if not categoria:
+                categoria = await ctx.guild.create_category_channel(TEMP_CATEGORY_NAME)
+
+            # Crear canales de voz temporales (en paralelo, acotado por ruta)
+            juegos = [juego for juego in juegos_activos if juego in nombres_canales]
+            creados = await scheduler.gather('create_channel', ctx.guild.id, [
+                # Limitar longitud del nombre a 100 caracteres (límite de Discord)
+                lambda juego=juego: ctx.guild.create_voice_channel(
+                    name=nombres_canales[juego][:100],
+                    category=categoria,
+                    reason=f"Separación automática por juego: {juego}"
+                )
+                for juego in juegos
+            ])
+
+            canales_creados = {}
+            for juego, resultado in zip(juegos, creados):
+                if isinstance(resultado, Exception):
+                    logging.error(f"Error al crear canal para {juego}: {str(resultado)}")
+                    continue
+                canales_creados[juego] = resultado
+                await self.temp_channels.add(resultado, juego)
+
+            # Mover usuarios a los canales correspondientes (también en paralelo)
+            traslados = [
+                (juego, miembro)
+                for juego, miembros in juegos_activos.items() if juego in canales_creados
+                for miembro in miembros
+            ]
+            resultados = await scheduler.gather('move_member', ctx.guild.id, [
+                lambda juego=juego, miembro=miembro: miembro.move_to(canales_creados[juego])
+                for juego, miembro in traslados
+            ])
+
+            movimientos = {}
+            for (juego, miembro), resultado in zip(traslados, resultados):
+                if isinstance(resultado, Exception):
+                    logging.error(f"Error al mover {miembro.display_name}: {str(resultado)}")
+                    continue
+                movimientos[juego] = movimientos.get(juego, 0) + 1
+
+            # Enviar resumen
+            resumen = "✅ Separación completada:\n"
+            for juego, count in movimientos.items():
+                resumen += f"- {juego}: {count} jugadores movidos a {canales_creados[juego].mention}\n"
+
+            await ctx.send(resumen)
+
+            # Si nadie llega a entrar, los canales se borran tras un rato; el resto lo gestiona on_voice_state_update
+            for canal in canales_creados.values():
+                if not canal.members:
+                    self.temp_channels.schedule_check(canal.id, TEMP_CHANNEL_IDLE)
+
+        except Exception as e:
+            logging.error(f"Error en comando separar: {str(e)}\n{traceback.format_exc()}")
+            await ctx.send("❌ Ocurrió un error al procesar el comando. Por favor intenta nuevamente.")
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        # Canales temporales de ¡separar: borrar al quedarse vacíos, conservar si alguien entra
+        if before.channel and before.channel.id in self.temp_channels and not before.channel.members:
+            self.temp_channels.schedule_check(before.channel.id, TEMP_CHANNEL_GRACE)
+        if after.channel and after.channel.id in self.temp_channels:
+            self.temp_channels.cancel_check(after.channel.id)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        self.temp_channels.reconcile()
+
+
+async def setup(bot):
+    await bot.add_cog(Juegos(bot))
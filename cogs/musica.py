@@ -0,0 +1,1274 @@
+"""Música: búsqueda con yt-dlp, cola por servidor, precarga, playlists guardadas y sesiones que sobreviven a reinicios.
+
+yt-dlp se importa en los hilos del resolver la primera vez que se busca algo.
+Con AUDIO_BACKEND=remote la extracción y ffmpeg van en los nodos de audio
+(audio_node.py) y este proceso solo maneja colas y la conexión de voz.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import urlparse, parse_qs
+
+import discord
+from discord.ext import commands
+
+from core.audio import AUDIO_BACKEND, RemoteAudioSource, audio_nodes
+from core.cache import TTLCache
+from core.cache_audio import audio_cache
+from core.extraccion import OPUS_PASSTHROUGH, URL_REGEX, extraer_cancion, extraer_playlist
+from core.metrics import medir_llamada, registry
+from core.storage import db
+from core.volumen import DEFAULT_VOLUME, GainTransformer, loudness_store
+
+logger = logging.getLogger(__name__)
+
+players = {}
+
+#configuracion glbal de FFmpeg (el volumen no va aquí: lo aplica GainTransformer por servidor)
+FFMPEG_OPTIONS = {
+    'before_options': '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -loglevel warning',
+    'options': '-vn',
+    'executable': 'ffmpeg'
+}
+
+fuentes_creadas = {'passthrough': 0, 'transcode': 0, 'cache': 0}
+
+# Pool de resolución: yt-dlp nunca debe correr dentro del event loop
+RESOLVER_WORKERS = int(os.getenv("RESOLVER_WORKERS", min(32, (os.cpu_count() or 1) * 4)))
+RESOLVER_TIMEOUT = float(os.getenv("RESOLVER_TIMEOUT", 20))
+
+
+class ResolveCancelled(Exception):
+    """La búsqueda se canceló (el usuario salió del canal o se usó ¡skip/¡stop)."""
+
+
+class SinStream(ValueError):
+    """La canción no tiene URL de stream: se resolvió desde la caché de audio y ya no está en ella."""
+
+
+def es_playlist(busqueda):
+    """URL de una playlist completa (no un video que viene con ?list=)."""
+    if not URL_REGEX.match(busqueda):
+        return False
+    url = urlparse(busqueda)
+    query = parse_qs(url.query)
+    return url.path.rstrip('/') == '/playlist' or ('list' in query and 'v' not in query)
+
+
+# Caché de canciones resueltas
+RESOLVE_CACHE_SIZE = int(os.getenv("RESOLVE_CACHE_SIZE", 512))
+RESOLVE_CACHE_TTL = float(os.getenv("RESOLVE_CACHE_TTL", 1800))  # Si la URL no trae 'expire'
+STREAM_EXPIRY_MARGIN = 600  # La URL tiene que seguir viva mientras la canción espera y suena
+
+YOUTUBE_ID_REGEX = re.compile(r'(?:v=|youtu\.be/|/shorts/|/embed/)([\w-]{11})')
+
+
+def normalizar_busqueda(busqueda):
+    """Clave de caché: URLs de YouTube canónicas, texto en minúsculas y sin espacios repetidos."""
+    busqueda = busqueda.strip()
+    if URL_REGEX.match(busqueda):
+        match = YOUTUBE_ID_REGEX.search(busqueda)
+        if match and 'list=' not in busqueda:
+            return f"https://www.youtube.com/watch?v={match.group(1)}"
+        return busqueda
+    return ' '.join(busqueda.lower().split())
+
+
+def ttl_de_stream(url, duration):
+    """Segundos que la canción puede esperar antes de que caduque la URL de googlevideo."""
+    expire = parse_qs(urlparse(url).query).get('expire')
+    if not expire:
+        return RESOLVE_CACHE_TTL
+    try:
+        restante = int(expire[0]) - time.time()
+    except ValueError:
+        return RESOLVE_CACHE_TTL
+    return restante - duration - STREAM_EXPIRY_MARGIN
+
+
+class TrackResolver:
+    """Resuelve búsquedas con yt-dlp en un pool acotado de hilos.
+
+    Cada petición tiene timeout propio y queda registrada por (servidor, usuario)
+    para poder cancelarla si el usuario se va del canal o se salta la canción.
+    Los resultados se guardan en una caché TTL/LRU y las búsquedas idénticas
+    simultáneas comparten una sola extracción.
+    """
+
+    def __init__(self, workers=RESOLVER_WORKERS, timeout=RESOLVER_TIMEOUT):
+        self.workers = workers
+        self.timeout = timeout
+        self.cache = TTLCache(RESOLVE_CACHE_SIZE, RESOLVE_CACHE_TTL)
+        self.coalesced = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='resolver')
+        self._pendientes = {}
+        self._canceladas = set()
+        self._en_vuelo = {}  # clave -> [future compartido, nº de esperas]
+
+    async def resolve(self, busqueda, *, guild_id=None, user_id=None, timeout=None, audio_en_disco=True):
+        """Devuelve los campos de la canción (title, url, web_url, duration, thumbnail).
+
+        Con `audio_en_disco` una canción de la caché de audio vuelve sin URL de
+        stream (url None); sin él siempre se obtiene la URL.
+        """
+        clave_cache = normalizar_busqueda(busqueda)
+        track = self.cache.get(clave_cache)
+        if track is not None:
+            return dict(track)
+        # Si el audio ya está en disco no hace falta yt-dlp: la URL del stream no se va a usar
+        track = audio_cache.track(clave_cache) if audio_en_disco else None
+        if track is not None:
+            return track
+
+        loop = asyncio.get_running_loop()
+        vuelo = self._en_vuelo.get(clave_cache)
+        if vuelo is None:
+            compartido = self._extraer(loop, busqueda)
+            compartido.add_done_callback(lambda f: self._terminar_vuelo(clave_cache, f))
+            vuelo = self._en_vuelo[clave_cache] = [compartido, 0]
+        else:
+            self.coalesced += 1
+        vuelo[1] += 1
+
+        # Cada llamada espera su propio future: cancelar a un usuario no cancela a los demás
+        future = loop.create_future()
+        vuelo[0].add_done_callback(lambda f: _copiar_resultado(f, future))
+        clave = (guild_id, user_id)
+        self._pendientes.setdefault(clave, set()).add(future)
+
+        try:
+            return dict(await asyncio.wait_for(future, timeout or self.timeout))
+        except asyncio.CancelledError:
+            # Si la cancelación vino de cancel() (y no de la tarea que espera), avisar al comando
+            if future in self._canceladas:
+                raise ResolveCancelled(busqueda) from None
+            raise
+        finally:
+            self._canceladas.discard(future)
+            pendientes = self._pendientes.get(clave)
+            if pendientes is not None:
+                pendientes.discard(future)
+                if not pendientes:
+                    del self._pendientes[clave]
+            vuelo[1] -= 1
+            if vuelo[1] == 0 and not vuelo[0].done():
+                # Nadie espera ya esta extracción
+                vuelo[0].cancel()
+
+    async def iter_playlist(self, url, *, guild_id=None, user_id=None):
+        """Genera lotes de entradas planas de la playlist a medida que yt-dlp las va leyendo."""
+        loop = asyncio.get_running_loop()
+        lotes = asyncio.Queue()
+        cancelado = threading.Event()
+
+        def emitir(lote):
+            loop.call_soon_threadsafe(lotes.put_nowait, lote)
+
+        if AUDIO_BACKEND == 'remote':
+            extraccion = audio_nodes.playlist(url, lotes.put_nowait)
+        else:
+            extraccion = loop.run_in_executor(self._executor, extraer_playlist, url, emitir, cancelado)
+        future = asyncio.ensure_future(medir_llamada('extract_playlist', extraccion))
+        future.add_done_callback(lambda f: lotes.put_nowait(None))
+        clave = (guild_id, user_id)
+        self._pendientes.setdefault(clave, set()).add(future)
+
+        try:
+            while True:
+                lote = await asyncio.wait_for(lotes.get(), self.timeout)
+                if lote is None:
+                    break
+                yield lote
+            if future.cancelled():
+                raise ResolveCancelled(url)
+            future.result()
+        finally:
+            # Si quien itera paró antes (cola llena, timeout...), parar también la extracción:
+            # en local avisa `cancelado`; con un nodo, cancelar el future le envía 'cancel'
+            cancelado.set()
+            if not future.done():
+                future.cancel()
+            self._canceladas.discard(future)
+            pendientes = self._pendientes.get(clave)
+            if pendientes is not None:
+                pendientes.discard(future)
+                if not pendientes:
+                    del self._pendientes[clave]
+
+    def _extraer(self, loop, busqueda):
+        if AUDIO_BACKEND == 'remote':
+            extraccion = audio_nodes.resolve(busqueda)
+        else:
+            extraccion = loop.run_in_executor(self._executor, extraer_cancion, busqueda)
+        return asyncio.ensure_future(medir_llamada('extract_info', extraccion))
+
+    def _terminar_vuelo(self, clave_cache, compartido):
+        vuelo = self._en_vuelo.get(clave_cache)
+        if vuelo is not None and vuelo[0] is compartido:
+            del self._en_vuelo[clave_cache]
+        if compartido.cancelled() or compartido.exception() is not None:
+            return
+
+        track = compartido.result()
+        ttl = ttl_de_stream(track['url'], track['duration'])
+        self.cache.set(clave_cache, track, ttl)
+        # También por URL canónica, para que ¡play <url> reutilice una búsqueda de texto
+        clave_url = normalizar_busqueda(track['web_url'])
+        if clave_url != clave_cache:
+            self.cache.set(clave_url, track, ttl)
+
+    def invalidate(self, track):
+        """Olvida una canción (por ejemplo, si su URL de stream dejó de funcionar)."""
+        self.cache.pop(normalizar_busqueda(track['web_url']))
+
+    def cancel(self, guild_id, user_id=None):
+        """Cancela las búsquedas en curso de un servidor (o solo de un usuario)."""
+        canceladas = 0
+        for (gid, uid), futures in list(self._pendientes.items()):
+            if gid != guild_id or (user_id is not None and uid != user_id):
+                continue
+            for future in futures:
+                if future.cancel():
+                    self._canceladas.add(future)
+                    canceladas += 1
+        return canceladas
+
+    def pending(self, guild_id):
+        return sum(len(f) for (gid, _), f in self._pendientes.items() if gid == guild_id)
+
+    def stats(self):
+        return dict(self.cache.stats(), coalesced=self.coalesced, in_flight=len(self._en_vuelo))
+
+
+def _copiar_resultado(origen, destino):
+    if destino.done():
+        return
+    if origen.cancelled():
+        destino.cancel()
+    elif origen.exception() is not None:
+        destino.set_exception(origen.exception())
+    else:
+        destino.set_result(origen.result())
+
+
+resolver = TrackResolver()
+
+
+# Estado por servidor
+MAX_QUEUE_SIZE = int(os.getenv("MAX_QUEUE_SIZE", 1000))
+LOOP_MODES = ('off', 'cancion', 'cola')
+
+
+class QueueFull(Exception):
+    """La cola del servidor alcanzó MAX_QUEUE_SIZE."""
+
+
+class Track:
+    """Canción en cola. Guarda el ID de quien la pidió, no el objeto Member."""
+
+    __slots__ = ('title', 'url', 'web_url', 'duration', 'thumbnail', 'codec', 'bitrate', 'requester_id')
+
+    def __init__(self, title, url, web_url, duration=0, thumbnail='', codec=None, bitrate=None, requester_id=None):
+        self.title = title
+        self.url = url
+        self.web_url = web_url
+        self.duration = duration
+        self.thumbnail = thumbnail
+        self.codec = codec
+        self.bitrate = bitrate
+        self.requester_id = requester_id
+
+    @classmethod
+    def from_resolved(cls, track, requester_id):
+        """Crea el registro a partir de lo que devuelve TrackResolver.resolve()."""
+        return cls(requester_id=requester_id, **track)
+
+    def needs_resolve(self):
+        """True si es un marcador de playlist o si su URL de stream caducará antes de terminar
+        (salvo que vaya a sonar desde la caché de audio, que no la usa)."""
+        if en_cache_de_audio(self):
+            return False
+        return self.url is None or ttl_de_stream(self.url, self.duration) <= 0
+
+    def update(self, track):
+        """Actualiza los datos del stream tras volver a resolver la canción."""
+        for campo, valor in track.items():
+            setattr(self, campo, valor)
+
+    def requester_name(self, guild):
+        member = guild.get_member(self.requester_id) if guild else None
+        return member.display_name if member else "alguien"
+
+
+class GuildPlayer:
+    """Estado de reproducción de un servidor: canción actual, cola, modo de repetición y volumen."""
+
+    def __init__(self, guild_id):
+        self.guild_id = guild_id
+        self.queue = deque()
+        self.current = None
+        self.loop_mode = 'off'
+        self.volume = DEFAULT_VOLUME  # 1.0 = 100 %; se aplica en tiempo real a lo que suena
+        self.skip_requested = False
+        self.text_channel_id = None  # Donde se anuncian las canciones (también al retomar la sesión)
+        self.cambios = 0  # Sube con cada cambio de la cola: la sesión solo se reescribe entera si cambió
+
+    def enqueue(self, track, top=False):
+        """Añade una canción y devuelve su posición (1 = la siguiente)."""
+        if len(self.queue) >= MAX_QUEUE_SIZE:
+            raise QueueFull(MAX_QUEUE_SIZE)
+        self.cambios += 1
+        if top:
+            self.queue.appendleft(track)
+            return 1
+        self.queue.append(track)
+        return len(self.queue)
+
+    def peek(self):
+        """La canción que sonará después de la actual, sin sacarla de la cola."""
+        if self.loop_mode == 'cancion' and self.current:
+            return self.current
+        if self.queue:
+            return self.queue[0]
+        if self.loop_mode == 'cola':
+            return self.current
+        return None
+
+    def next_track(self):
+        """Saca la siguiente canción respetando el modo de repetición."""
+        saltar, self.skip_requested = self.skip_requested, False
+        self.cambios += 1
+        if self.current is not None:
+            if self.loop_mode == 'cancion' and not saltar:
+                return self.current
+            if self.loop_mode == 'cola':
+                self.queue.append(self.current)
+        self.current = self.queue.popleft() if self.queue else None
+        return self.current
+
+    def upcoming(self, limit):
+        return list(islice(self.queue, limit))
+
+    def remove(self, index):
+        track = self.queue[index]
+        del self.queue[index]
+        self.cambios += 1
+        return track
+
+    def shuffle(self):
+        canciones = list(self.queue)
+        random.shuffle(canciones)
+        self.queue = deque(canciones)
+        self.cambios += 1
+
+    def clear(self):
+        self.queue.clear()
+        self.cambios += 1
+
+    def stop(self):
+        self.cambios += 1
+        self.queue.clear()
+        self.current = None
+        self.skip_requested = False
+
+
+def get_player(guild_id):
+    player = players.get(guild_id)
+    if player is None:
+        player = players[guild_id] = GuildPlayer(guild_id)
+    return player
+
+
+class PlaylistStore:
+    """Playlists guardadas por servidor.
+
+    Solo se guardan identificadores estables (web_url, título, duración); las URLs
+    de stream caducan y se vuelven a resolver al reproducir. Cada playlist es una
+    fila con sus canciones en JSON, así que cargarla es una sola lectura por clave.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS playlists (
+            guild_id INTEGER NOT NULL,
+            nombre TEXT NOT NULL,
+            creador_id INTEGER,
+            track_count INTEGER NOT NULL,
+            tracks TEXT NOT NULL,
+            actualizada REAL NOT NULL,
+            PRIMARY KEY (guild_id, nombre)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db):
+        self.db = db
+        db.executescript(self.SCHEMA)
+
+    async def save(self, guild_id, nombre, tracks, creador_id=None):
+        filas = [[t.web_url, t.title, t.duration] for t in tracks]
+        datos = json.dumps(filas, ensure_ascii=False, separators=(',', ':'))
+        await self.db.run(
+            self.db.execute,
+            "INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?, ?, ?)",
+            (guild_id, nombre, creador_id, len(filas), datos, time.time())
+        )
+
+    async def load(self, guild_id, nombre, requester_id=None):
+        """Devuelve la playlist como marcadores sin resolver, o None si no existe."""
+        filas = await self.db.run(
+            self.db.execute,
+            "SELECT tracks FROM playlists WHERE guild_id = ? AND nombre = ?",
+            (guild_id, nombre)
+        )
+        if not filas:
+            return None
+        return [
+            Track(title, None, web_url, duration, requester_id=requester_id)
+            for web_url, title, duration in json.loads(filas[0][0])
+        ]
+
+    async def list(self, guild_id):
+        """[(nombre, nº de canciones)] sin decodificar las canciones."""
+        return await self.db.run(
+            self.db.execute,
+            "SELECT nombre, track_count FROM playlists WHERE guild_id = ? ORDER BY nombre",
+            (guild_id,)
+        )
+
+
+playlist_store = PlaylistStore(db)
+
+
+def en_cache_de_audio(song):
+    """True si la canción puede sonar desde la caché de audio."""
+    return normalizar_busqueda(song.web_url) in audio_cache
+
+
+def crear_fuente(song, player, posicion=0.0):
+    """Crea la fuente de audio con el volumen del servidor y la normalización de la canción.
+
+    Ffprobe no hace falta: el códec ya viene en los metadatos de yt-dlp. Si la
+    canción está en la caché de audio se lee de disco, sin ffmpeg. Si el stream
+    es Opus, ffmpeg solo re-empaqueta los paquetes; si no, se transcodifica a
+    Opus. Con el backend remoto ffmpeg corre en un nodo de audio con las mismas
+    opciones. La ganancia se aplica después, en GainTransformer, o en el nodo
+    de audio con el backend remoto. `posicion` (segundos) empieza a mitad de
+    canción: ffmpeg con -ss, o saltando paquetes en la caché.
+    """
+    normalizacion = loudness_store.ganancia(normalizar_busqueda(song.web_url))
+    ganancia = lambda: player.volume * normalizacion
+    return GainTransformer(abrir_stream(song, posicion, ganancia()), ganancia, posicion)
+
+
+async def preparar_fuente(song, player, posicion=0.0):
+    """crear_fuente(); si la canción venía de la caché de audio y se desalojó (o se descartó
+    por corrupta) antes de sonar, la vuelve a resolver con yt-dlp en lugar de fallar."""
+    await loudness_store.cargar(normalizar_busqueda(song.web_url))
+    try:
+        return crear_fuente(song, player, posicion)
+    except SinStream:
+        song.update(await resolver.resolve(song.web_url, guild_id=player.guild_id, audio_en_disco=False))
+        return crear_fuente(song, player, posicion)
+
+
+def abrir_stream(song, posicion=0.0, ganancia=1.0):
+    """La fuente Opus de la canción, sin ganancia (salvo en los nodos de audio, que la aplican ellos)."""
+    if en_cache_de_audio(song):
+        source = audio_cache.source(normalizar_busqueda(song.web_url), posicion)
+        if source is not None:
+            fuentes_creadas['cache'] += 1
+            return source
+    if not song.url:
+        raise SinStream(f"'{song.title}' no tiene URL de stream")
+
+    before_options = FFMPEG_OPTIONS['before_options']
+    if posicion:
+        before_options += f' -ss {posicion:.2f}'  # Antes de -i: ffmpeg salta sin decodificar lo anterior
+    if OPUS_PASSTHROUGH and song.codec == 'opus':
+        fuentes_creadas['passthrough'] += 1
+        if AUDIO_BACKEND == 'remote':
+            return audio_nodes.source(
+                song.url, 'opus', song.bitrate, FFMPEG_OPTIONS['before_options'], '-vn', posicion, ganancia
+            )
+        return discord.FFmpegOpusAudio(
+            song.url,
+            codec='opus',
+            bitrate=int(song.bitrate or 128),
+            before_options=before_options,
+            options='-vn',
+            executable=FFMPEG_OPTIONS['executable']
+        )
+
+    fuentes_creadas['transcode'] += 1
+    if AUDIO_BACKEND == 'remote':
+        return audio_nodes.source(
+            song.url, None, song.bitrate, FFMPEG_OPTIONS['before_options'], FFMPEG_OPTIONS['options'], posicion, ganancia
+        )
+    return discord.FFmpegOpusAudio(song.url, **dict(FFMPEG_OPTIONS, before_options=before_options))
+
+
+# Precarga de la siguiente canción
+PREFETCH_WARMUP = float(os.getenv("PREFETCH_WARMUP", 20))  # Segundos antes del final para abrir el stream
+
+transition_gaps = deque(maxlen=500)  # Silencio entre canciones (segundos)
+TRANSITION_GAP = registry.histogram(
+    'archeon_music_transition_gap_seconds', "Silencio entre el final de una canción y el inicio de la siguiente"
+)
+fin_de_cancion = {}  # guild_id -> perf_counter() del momento en que terminó la última canción
+
+
+class Prefetcher:
+    """Prepara la siguiente canción de la cola mientras suena la actual.
+
+    Refresca la URL del stream si va a caducar y, unos segundos antes de que
+    acabe la canción actual, arranca ffmpeg con la fuente de audio para
+    que el cambio de canción sea inmediato.
+    """
+
+    def __init__(self, warmup=PREFETCH_WARMUP):
+        self.warmup = warmup
+        self._tareas = {}      # guild_id -> (song, asyncio.Task)
+        self._listas = {}      # guild_id -> (song, source)
+        self._fin_previsto = {}  # guild_id -> loop.time() en que termina la canción actual
+
+    def schedule(self, ctx, duration):
+        """Llamar al empezar una canción: programa la precarga de la siguiente."""
+        loop = asyncio.get_running_loop()
+        self._fin_previsto[ctx.guild.id] = loop.time() + duration if duration else None
+        self.cancel(ctx.guild.id)
+        self._programar(ctx.guild.id)
+
+    def reschedule(self, ctx):
+        """Llamar cuando cambia la cola: solo rehace la precarga si cambió la siguiente canción."""
+        guild_id = ctx.guild.id
+        if guild_id not in self._fin_previsto:
+            return  # No hay nada sonando
+        siguiente = get_player(guild_id).peek()
+        objetivo = self._listas.get(guild_id) or self._tareas.get(guild_id)
+        if objetivo is not None and objetivo[0] is siguiente:
+            return
+        self.cancel(guild_id)
+        self._programar(guild_id)
+
+    def _programar(self, guild_id):
+        song = get_player(guild_id).peek()
+        if song is None:
+            return
+        tarea = asyncio.create_task(self._preparar(guild_id, song))
+        self._tareas[guild_id] = (song, tarea)
+
+    async def _preparar(self, guild_id, song):
+        try:
+            # Marcadores de playlist, o URLs de googlevideo que no llegarán vivas al final
+            if song.needs_resolve():
+                track = await resolver.resolve(song.web_url, guild_id=guild_id)
+                song.update(track)
+
+            fin = self._fin_previsto.get(guild_id)
+            if fin is None:
+                return  # Duración desconocida (directos): no tiene sentido abrir el stream antes
+            await asyncio.sleep(max(0, fin - asyncio.get_running_loop().time() - self.warmup))
+
+            self._listas[guild_id] = (song, await preparar_fuente(song, get_player(guild_id)))
+        except (ResolveCancelled, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            logger.warning(f"No se pudo precargar '{song.title}': {e}")
+        finally:
+            tarea = self._tareas.get(guild_id)
+            if tarea is not None and tarea[1] is asyncio.current_task():
+                del self._tareas[guild_id]
+
+    def take(self, guild_id, song):
+        """Devuelve la fuente precargada para `song`, o None si no está lista."""
+        tarea = self._tareas.pop(guild_id, None)
+        if tarea is not None:
+            tarea[1].cancel()
+        lista = self._listas.pop(guild_id, None)
+        if lista is None:
+            return None
+        if lista[0] is song:
+            return lista[1]
+        lista[1].cleanup()
+        return None
+
+    def cancel(self, guild_id):
+        self.take(guild_id, None)
+
+    def ready_sources(self):
+        """Fuentes ya abiertas (con su ffmpeg en marcha) esperando a sonar."""
+        return [source for _, source in self._listas.values()]
+
+    def stop(self, guild_id):
+        """Llamar al detener la música en el servidor."""
+        self.cancel(guild_id)
+        self._fin_previsto.pop(guild_id, None)
+
+
+prefetcher = Prefetcher()
+
+
+def _al_terminar(ctx, error):
+    """Callback `after` del reproductor (se ejecuta en el hilo de audio)"""
+    if error is not None:
+        print(f'Error: {error}')
+        return
+    fin_de_cancion[ctx.guild.id] = time.perf_counter()
+    asyncio.run_coroutine_threadsafe(check_queue(ctx), ctx.bot.loop)
+
+
+def iniciar_reproduccion(ctx, voice_client, source, song, posicion=0.0):
+    """Reproduce `source` (que empieza en `posicion`) y programa la precarga de la siguiente canción."""
+    voice_client.play(source, after=lambda e: _al_terminar(ctx, e))
+    get_player(ctx.guild.id).text_channel_id = ctx.channel.id
+    prefetcher.schedule(ctx, max(song.duration - posicion, 1) if song.duration else 0)
+    # Tras la primera reproducción se guarda en disco y se mide su sonoridad para las siguientes
+    clave = normalizar_busqueda(song.web_url)
+    audio_cache.reproducida(clave, song, FFMPEG_OPTIONS['before_options'], FFMPEG_OPTIONS['executable'])
+    loudness_store.reproducida(clave, song, FFMPEG_OPTIONS['before_options'], FFMPEG_OPTIONS['executable'])
+
+
+async def check_queue(ctx):
+    """Pasa a la siguiente canción de la cola, usando la fuente precargada si está lista"""
+    terminada = fin_de_cancion.pop(ctx.guild.id, None)
+    voice_client = ctx.voice_client
+    if voice_client is None or not voice_client.is_connected():
+        # Expulsado o desconectado: `after` se dispara igual, pero ya no hay dónde sonar
+        prefetcher.stop(ctx.guild.id)
+        return
+    player = players.get(ctx.guild.id)
+    next_song = player.next_track() if player else None
+    intentos = len(player.queue) + 1 if player else 0
+
+    while next_song is not None:
+        try:
+            source = prefetcher.take(ctx.guild.id, next_song)
+            if source is None:
+                # La precarga no llegó a tiempo (o es un marcador de playlist): resolver ahora
+                if next_song.needs_resolve():
+                    next_song.update(await resolver.resolve(next_song.web_url, guild_id=ctx.guild.id))
+                source = await preparar_fuente(next_song, player)
+        except ResolveCancelled:
+            return
+        except Exception as e:
+            print(f"Error en check_queue: {e}")
+            intentos -= 1
+            if intentos <= 0:
+                await ctx.send("⚠️ Error al pasar a la siguiente canción")
+                break
+            # Videos borrados o privados de una playlist: saltar a la siguiente
+            await ctx.send(f"⚠️ No se pudo reproducir **{next_song.title}**, pasando a la siguiente")
+            player.current = None
+            next_song = player.next_track()
+            continue
+
+        try:
+            iniciar_reproduccion(ctx, voice_client, source, next_song)
+        except Exception as e:
+            # El fallo es del VoiceClient, no de la canción: las siguientes fallarían igual
+            source.cleanup()
+            logger.warning(f"No se pudo reproducir en {ctx.guild.id}: {e}")
+            break
+        if terminada is not None:
+            transition_gaps.append(time.perf_counter() - terminada)
+            TRANSITION_GAP.observe(transition_gaps[-1])
+
+        embed = discord.Embed(
+            title="🎵 Reproduciendo ahora (desde cola)",
+            description=f"[{next_song.title}]({next_song.web_url})",
+            color=discord.Color.blurple()
+        )
+
+        if next_song.duration > 0:
+            mins, secs = divmod(next_song.duration, 60)
+            embed.add_field(name="Duración", value=f"{mins}:{secs:02d}")
+
+        embed.set_thumbnail(url=next_song.thumbnail)
+        embed.set_footer(text=f"Solicitado por {next_song.requester_name(ctx.guild)}")
+
+        await ctx.send(embed=embed)
+        return
+
+    prefetcher.stop(ctx.guild.id)
+            
+        
+async def encolar_playlist(ctx, voice_client, url):
+    """Encola una playlist por lotes; cada canción se resuelve cuando le toca sonar."""
+    player = get_player(ctx.guild.id)
+    mensaje = await ctx.send("📃 Cargando playlist...")
+    total = 0
+    
+    try:
+        async for lote in resolver.iter_playlist(url, guild_id=ctx.guild.id, user_id=ctx.author.id):
+            for entry in lote:
+                player.enqueue(Track.from_resolved(entry, ctx.author.id))
+                total += 1
+            
+            # Con el primer lote ya se puede empezar a sonar
+            if not voice_client.is_playing() and not voice_client.is_paused():
+                await check_queue(ctx)
+            else:
+                prefetcher.reschedule(ctx)
+    except ResolveCancelled:
+        return await mensaje.edit(content=f"🚫 Carga cancelada ({total} canciones añadidas).")
+    except asyncio.TimeoutError:
+        return await mensaje.edit(content=f"⏱️ La playlist tardó demasiado ({total} canciones añadidas).")
+    except QueueFull:
+        return await mensaje.edit(content=f"⚠️ La cola se llenó: se añadieron {total} canciones (máximo {MAX_QUEUE_SIZE}).")
+    except Exception as e:
+        logger.error(f"Error al cargar playlist: {e}", exc_info=True)
+        return await mensaje.edit(content=f"❌ Error al cargar la playlist ({total} canciones añadidas).")
+    
+    if total == 0:
+        return await mensaje.edit(content="📭 La playlist está vacía o no está disponible.")
+    await mensaje.edit(content=f"📃 Playlist añadida: **{total}** canciones.")
+
+
+# Sesiones: lo que está sonando en cada servidor, para retomarlo tras un reinicio
+SESSION_SNAPSHOT_INTERVAL = float(os.getenv("SESSION_SNAPSHOT_INTERVAL", 5))
+SESSION_MAX_AGE = float(os.getenv("SESSION_MAX_AGE", 1800))  # Tras una caída más larga no se retoma
+SESSION_RESUME_CONCURRENCY = int(os.getenv("SESSION_RESUME_CONCURRENCY", 5))
+
+
+class ContextoRestaurado:
+    """Lo que check_queue y el prefetcher usan de un Context, para sesiones retomadas sin mensaje."""
+
+    def __init__(self, bot, guild, channel):
+        self.bot = bot
+        self.guild = guild
+        self.channel = channel
+
+    @property
+    def voice_client(self):
+        return self.guild.voice_client
+
+    async def send(self, *args, **kwargs):
+        if self.channel is not None:
+            return await self.channel.send(*args, **kwargs)
+
+
+class SessionStore:
+    """Guarda cada pocos segundos el estado de reproducción de cada servidor y lo retoma al arrancar.
+
+    Solo se reescribe la fila entera de un servidor cuando cambia su cola, su
+    canción, el canal o el modo; si no, solo se actualiza la posición. Se
+    guardan identificadores (web_url, título, duración), no URLs de stream:
+    al retomar, la canción actual se resuelve (o sale de la caché de audio) y
+    suena desde la posición guardada; la cola se resuelve al llegarle el turno.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sesiones (
+            guild_id INTEGER PRIMARY KEY,
+            voice_channel_id INTEGER NOT NULL,
+            text_channel_id INTEGER,
+            actual TEXT NOT NULL,
+            posicion REAL NOT NULL,
+            cola TEXT NOT NULL,
+            loop_mode TEXT NOT NULL,
+            volumen REAL NOT NULL,
+            actualizada REAL NOT NULL
+        );
+    """
+
+    def __init__(self, bot, db):
+        self.bot = bot
+        self.db = db
+        db.executescript(self.SCHEMA)
+        self.restored = 0
+        self._firmas = {}  # guild_id -> lo que se guardó la última vez (para saber si cambió)
+        self._tarea = None
+
+    def start(self):
+        """Retoma las sesiones guardadas y arranca el guardado periódico (idempotente)."""
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._restaurar_y_guardar())
+
+    async def stop(self):
+        """Detiene el guardado periódico y guarda por última vez."""
+        if self._tarea is None:
+            return
+        self._tarea.cancel()
+        self._tarea = None
+        await self.flush()
+
+    async def _restaurar_y_guardar(self):
+        try:
+            await self.restore()
+        except Exception as e:
+            logger.error(f"No se pudieron retomar las sesiones: {e}", exc_info=True)
+        # Hasta aquí no se guarda nada: borraría las sesiones que aún no se han retomado
+        while True:
+            await asyncio.sleep(SESSION_SNAPSHOT_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"No se pudo guardar el estado de la música: {e}")
+
+    async def flush(self):
+        nuevas, posiciones = [], []
+        vigentes = set()
+        ahora = time.time()
+        for voice_client in self.bot.voice_clients:
+            guild_id = voice_client.guild.id
+            player = players.get(guild_id)
+            if player is None or player.current is None:
+                continue
+            vigentes.add(guild_id)
+            source = voice_client.source
+            if not isinstance(source, GainTransformer):
+                continue  # Entre dos canciones: se guarda en la siguiente pasada
+            firma = (player.cambios, player.current, voice_client.channel.id, player.text_channel_id,
+                     player.loop_mode, player.volume)
+            if self._firmas.get(guild_id) == firma:
+                posiciones.append((source.posicion, ahora, guild_id))
+                continue
+            self._firmas[guild_id] = firma
+            nuevas.append((
+                guild_id, voice_client.channel.id, player.text_channel_id,
+                json.dumps(_fila_track(player.current), ensure_ascii=False, separators=(',', ':')), source.posicion,
+                json.dumps([_fila_track(t) for t in player.queue], ensure_ascii=False, separators=(',', ':')),
+                player.loop_mode, player.volume, ahora
+            ))
+        terminadas = [(guild_id,) for guild_id in self._firmas if guild_id not in vigentes]
+        for (guild_id,) in terminadas:
+            del self._firmas[guild_id]
+        if nuevas or posiciones or terminadas:
+            await self.db.run(self._escribir, nuevas, posiciones, terminadas)
+
+    def _escribir(self, nuevas, posiciones, terminadas):
+        self.db.executemany("INSERT OR REPLACE INTO sesiones VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", nuevas)
+        self.db.executemany("UPDATE sesiones SET posicion = ?, actualizada = ? WHERE guild_id = ?", posiciones)
+        self.db.executemany("DELETE FROM sesiones WHERE guild_id = ?", terminadas)
+
+    async def restore(self):
+        """Vuelve a los canales de voz de las sesiones de este cluster y sigue donde iba cada una."""
+        filas = await self.db.run(self.db.execute, "SELECT * FROM sesiones")
+        limite = time.time() - SESSION_MAX_AGE
+        viejas = [(fila[0],) for fila in filas if fila[-1] < limite]
+        if viejas:
+            await self.db.run(self.db.executemany, "DELETE FROM sesiones WHERE guild_id = ?", viejas)
+        propias = [fila for fila in filas if fila[-1] >= limite and self.bot.owns_guild(fila[0])]
+        for fila in propias:
+            self._firmas[fila[0]] = None  # Si no se llega a retomar, el siguiente guardado la borra
+        turnos = asyncio.Semaphore(SESSION_RESUME_CONCURRENCY)
+        await asyncio.gather(*(self._retomar(turnos, *fila) for fila in propias))
+
+    async def _retomar(self, turnos, guild_id, voice_channel_id, text_channel_id, actual, posicion,
+                       cola, loop_mode, volumen, actualizada):
+        guild = self.bot.get_guild(guild_id)
+        canal = guild.get_channel(voice_channel_id) if guild else None
+        # Nadie escuchando (o el canal ya no existe): no se vuelve a entrar
+        if canal is None or not any(not miembro.bot for miembro in canal.members):
+            await self.db.run(self.db.execute, "DELETE FROM sesiones WHERE guild_id = ?", (guild_id,))
+            return
+        player = get_player(guild_id)
+        if guild.voice_client is not None or player.current is not None or player.queue:
+            return  # Alguien ya usó ¡play desde el arranque
+
+        player.loop_mode = loop_mode
+        player.volume = volumen
+        player.text_channel_id = text_channel_id
+        for fila in json.loads(cola)[:MAX_QUEUE_SIZE]:
+            player.enqueue(_track_de_fila(fila))
+        song = player.current = _track_de_fila(json.loads(actual))
+        ctx = ContextoRestaurado(self.bot, guild, guild.get_channel(text_channel_id) if text_channel_id else None)
+
+        async with turnos:
+            # Conectar y resolver a la vez; si está en la caché de audio, resolver es inmediato
+            voice_client, track = await asyncio.gather(
+                canal.connect(), resolver.resolve(song.web_url, guild_id=guild_id), return_exceptions=True
+            )
+            if isinstance(voice_client, Exception):
+                logger.warning(f"No se pudo volver al canal de voz en {guild_id}: {voice_client}")
+                players.pop(guild_id, None)
+                return
+            try:
+                if isinstance(track, Exception):
+                    raise track
+                song.update(track)
+                source = await preparar_fuente(song, player, posicion)
+            except Exception as e:
+                logger.warning(f"No se pudo retomar '{song.title}' en {guild_id}: {e}")
+                # Sigue con el resto de la cola (check_queue salta las que no se puedan reproducir)
+                player.current = None
+                return await check_queue(ctx)
+            try:
+                iniciar_reproduccion(ctx, voice_client, source, song, posicion)
+            except Exception as e:
+                source.cleanup()
+                logger.warning(f"No se pudo retomar la música en {guild_id}: {e}")
+                players.pop(guild_id, None)
+                return
+
+        self.restored += 1
+        mins, secs = divmod(int(posicion), 60)
+        await ctx.send(
+            f"▶️ Sesión retomada: **{song.title}** desde {mins}:{secs:02d} "
+            f"({len(player.queue)} canciones en cola)"
+        )
+
+
+def _fila_track(track):
+    return [track.web_url, track.title, track.duration, track.requester_id]
+
+
+def _track_de_fila(fila):
+    web_url, title, duration, requester_id = fila
+    return Track(title, None, web_url, duration, requester_id=requester_id)
+
+
+class Musica(commands.Cog):
+    """Comandos de música."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.sesiones = SessionStore(bot, db)
+
+    async def cog_load(self):
+        if AUDIO_BACKEND == 'remote':
+            audio_nodes.start()
+        asyncio.create_task(audio_cache.start())
+
+    async def cog_unload(self):
+        await self.sesiones.stop()
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # Tras un reinicio, de vuelta a los canales de voz donde sonaba algo
+        self.sesiones.start()
+
+    @commands.command(name='join', help='Hace que el bot se una al canal de voz')
+    async def join(self, ctx):
+        if ctx.author.voice is None:
+            await ctx.send("¡No estás en un canal de voz!")
+            return
+
+        channel = ctx.author.voice.channel
+        if ctx.voice_client is None:
+            await channel.connect()
+        else:
+            await ctx.voice_client.move_to(channel)
+
+    @commands.command(name='play')
+    async def play(self, ctx, *, busqueda: str):
+        if not ctx.author.voice:
+            return await ctx.send("¡No estás en un canal de voz!")
+
+        voice_client = ctx.voice_client or await ctx.author.voice.channel.connect()
+
+        if es_playlist(busqueda):
+            return await encolar_playlist(ctx, voice_client, busqueda)
+
+        try:
+            # Extraer información del audio (en el pool, sin bloquear el bot)
+            track = await resolver.resolve(busqueda, guild_id=ctx.guild.id, user_id=ctx.author.id)
+
+            # Crear registro de la canción para la cola
+            song = Track.from_resolved(track, ctx.author.id)
+            player = get_player(ctx.guild.id)
+
+            # Si ya hay música reproduciéndose, añadir a la cola
+            if voice_client.is_playing() or voice_client.is_paused():
+                posicion = player.enqueue(song)
+                prefetcher.reschedule(ctx)
+
+                embed = discord.Embed(
+                    title="🎵 Añadido a la cola",
+                    description=f"[{song.title}]({song.web_url})",
+                    color=discord.Color.green()
+                )
+                embed.add_field(name="Posición en cola", value=str(posicion))
+                embed.set_thumbnail(url=song.thumbnail)
+                embed.set_footer(text=f"Solicitado por {ctx.author.display_name}")
+                return await ctx.send(embed=embed)
+
+            # Si no hay música reproduciéndose, crear fuente y reproducir
+            source = await preparar_fuente(song, player)
+
+            # Actualizar estado del servidor
+            player.current = song
+
+            # Reproducir
+            iniciar_reproduccion(ctx, voice_client, source, song)
+
+            # Mostrar embed
+            embed = discord.Embed(
+                title="🎵 Reproduciendo ahora",
+                description=f"[{song.title}]({song.web_url})",
+                color=discord.Color.blurple()
+            )
+            duration = song.duration
+            embed.add_field(name="Duración", value=f"{duration//60}:{duration%60:02d}" if duration else "Desconocida")
+            embed.set_thumbnail(url=song.thumbnail)
+            embed.set_footer(text=f"Solicitado por {ctx.author.display_name}")
+
+            await ctx.send(embed=embed)
+
+        except ResolveCancelled:
+            await ctx.send("🚫 Búsqueda cancelada.")
+        except asyncio.TimeoutError:
+            await ctx.send("⏱️ La búsqueda tardó demasiado. Intenta nuevamente.")
+        except QueueFull:
+            await ctx.send(f"❌ La cola está llena (máximo {MAX_QUEUE_SIZE} canciones).")
+        except Exception as e:
+            error_msg = f"❌ Error al reproducir: {str(e)}"
+            if "formats" in str(e):
+                error_msg += "\n⚠️ Problema al obtener formatos de audio. Intenta con otro video."
+            await ctx.send(error_msg[:2000])
+            traceback.print_exc()
+
+    @commands.command(name='skip')
+    async def skip(self, ctx):
+        """Salta la canción actual y pasa a la siguiente en la cola."""
+        voice = ctx.voice_client
+
+        if not voice or not voice.is_playing():
+            # Si todavía se está buscando la canción, saltar equivale a cancelar la búsqueda
+            if resolver.cancel(ctx.guild.id):
+                return await ctx.send("⏭️ Búsqueda cancelada")
+            await ctx.send("⚠️ No hay música reproduciéndose.")
+            return
+
+        get_player(ctx.guild.id).skip_requested = True  # En modo repetir canción, saltar sí avanza
+        voice.stop()  # Esto activará automáticamente el callback `after` (que llama a check_queue)
+        await ctx.send("⏭️ Canción saltada")
+
+    @commands.command(name='pause')
+    async def pause(self, ctx):
+        """Pausar la música"""
+        voice = ctx.voice_client
+        if voice and voice.is_playing():
+            voice.pause()
+            if isinstance(voice.source.original, RemoteAudioSource):
+                voice.source.original.pause()
+            await ctx.send("⏸️ Música pausada")
+        else:
+            await ctx.send("⚠️ No hay música reproduciéndose")
+
+    @commands.command(name='resume')
+    async def resume(self, ctx):
+        """Reanudar la música"""
+        voice = ctx.voice_client
+        if voice and voice.is_paused():
+            if isinstance(voice.source.original, RemoteAudioSource):
+                voice.source.original.resume()
+            voice.resume()
+            await ctx.send("▶️ Música reanudada")
+        else:
+            await ctx.send("⚠️ La música no está pausada")
+
+    @commands.command(name='lista')
+    async def queue(self, ctx):
+        """Mostrar la cola de reproducción"""
+        player = get_player(ctx.guild.id)
+        if not player.queue and not player.current:
+            await ctx.send("📭 La cola está vacía")
+        else:
+            embed = discord.Embed(title="🎶 Cola de reproducción", color=discord.Color.purple())
+
+            if player.current:
+                duration = ""
+                if player.current.duration > 0:
+                    mins, secs = divmod(player.current.duration, 60)
+                    duration = f" [{mins}:{secs:02d}]"
+
+                embed.add_field(
+                    name="🔊 Reproduciendo ahora",
+                    value=f"**{player.current.title}**{duration}\nSolicitado por: <@{player.current.requester_id}>",
+                    inline=False
+                )
+
+            if player.queue:
+                for i, item in enumerate(player.upcoming(10)):
+                    embed.add_field(name=f"{i+1}.", value=item.title, inline=False)
+
+                if len(player.queue) > 10:
+                    embed.set_footer(text=f"Y {len(player.queue)-10} canciones más en la cola...")
+
+            if player.loop_mode != 'off':
+                embed.description = f"🔁 Repetir: **{player.loop_mode}**"
+
+            await ctx.send(embed=embed)
+
+    @commands.command(name='disconnect')
+    async def disconnect(self, ctx):
+        """Desconecta al bot del canal de voz"""
+        resolver.cancel(ctx.guild.id)
+        prefetcher.stop(ctx.guild.id)
+        player = players.pop(ctx.guild.id, None)
+        if player is not None:
+            player.stop()
+        if ctx.voice_client:
+            await ctx.voice_client.disconnect()
+            await ctx.send("Desconectado del canal de voz")
+        else:
+            await ctx.send("No estoy conectado a ningún canal de voz")
+
+    @commands.command(name='shuffle')
+    async def shuffle_queue(self, ctx):
+        player = get_player(ctx.guild.id)
+        if len(player.queue) < 2:
+            return await ctx.send("🔀 Necesitas al menos 2 canciones en la cola para mezclar.")
+
+        player.shuffle()
+        prefetcher.reschedule(ctx)
+        await ctx.send("🔀 Cola mezclada aleatoriamente.")
+
+    @commands.command(name='remove')
+    async def remove_song(self, ctx, index: int):
+        player = get_player(ctx.guild.id)
+        if index < 1 or index > len(player.queue):
+            return await ctx.send("❌ Índice inválido o cola vacía.")
+
+        removed = player.remove(index - 1)
+        prefetcher.reschedule(ctx)
+        await ctx.send(f"🗑️ Canción **{removed.title}** eliminada de la cola.")
+
+    @commands.command(name='loop', aliases=['repetir'])
+    async def loop(self, ctx, modo: str = None):
+        """Cambia el modo de repetición: off, cancion o cola (sin argumento, rota entre ellos)"""
+        player = get_player(ctx.guild.id)
+        if modo is None:
+            modo = LOOP_MODES[(LOOP_MODES.index(player.loop_mode) + 1) % len(LOOP_MODES)]
+        modo = modo.lower().replace('ó', 'o')
+        if modo not in LOOP_MODES:
+            return await ctx.send("❌ Modo inválido. Usa `off`, `cancion` o `cola`.")
+
+        player.loop_mode = modo
+        prefetcher.reschedule(ctx)
+        iconos = {'off': "➡️ Repetición desactivada", 'cancion': "🔂 Repitiendo la canción actual", 'cola': "🔁 Repitiendo la cola"}
+        await ctx.send(iconos[modo])
+
+    @commands.command(name='volume')
+    async def volume(self, ctx, vol: int = None):
+        """Volumen de este servidor (0-200 %); se aplica en la siguiente trama de lo que suena"""
+        player = get_player(ctx.guild.id)
+        if vol is None:
+            return await ctx.send(f"🔊 Volumen actual: **{round(player.volume * 100)}%**")
+
+        if vol < 0 or vol > 200:
+            return await ctx.send("❌ El volumen debe estar entre 0 y 200%.")
+
+        # GainTransformer lee el volumen del player en cada trama: no hay que tocar la fuente
+        player.volume = vol / 100
+        await ctx.send(f"🔊 Volumen ajustado a **{vol}%**")
+
+    @commands.command(name='borrar_cola')
+    async def clear_queue(self, ctx):
+        player = get_player(ctx.guild.id)
+        if player.queue:
+            player.clear()
+            prefetcher.reschedule(ctx)
+            await ctx.send("🗑️ Cola de reproducción borrada.")
+        else:
+            await ctx.send("📭 La cola ya está vacía.")
+
+    @commands.command(name='stop', aliases=['parar'])
+    async def stop(self, ctx):
+        """Detiene la música y limpia la cola"""
+        voice = ctx.voice_client
+        resolver.cancel(ctx.guild.id)
+
+        if not voice or not voice.is_playing():
+            return await ctx.send("⚠️ No hay música reproduciéndose")
+
+        # Limpiar la cola y resetear la canción actual
+        get_player(ctx.guild.id).stop()
+        prefetcher.stop(ctx.guild.id)
+
+        # Detener la reproducción
+        voice.stop()
+
+        await ctx.send("⏹️ Música detenida y cola limpiada")
+
+    @commands.command(name='playtop')
+    async def playtop(self, ctx, *, busqueda: str):
+        # Primero obtenemos la canción igual que en el comando play normal
+        if not ctx.author.voice:
+            return await ctx.send("¡No estás en un canal de voz!")
+
+        if es_playlist(busqueda):
+            return await ctx.send("❌ Para añadir playlists usa `¡play`.")
+
+        voice_client = ctx.voice_client or await ctx.author.voice.channel.connect()
+
+        try:
+            track = await resolver.resolve(busqueda, guild_id=ctx.guild.id, user_id=ctx.author.id)
+            song = Track.from_resolved(track, ctx.author.id)
+
+            # Añadir al principio de la cola
+            get_player(ctx.guild.id).enqueue(song, top=True)
+            prefetcher.reschedule(ctx)
+
+            # Si no hay nada reproduciéndose, iniciar reproducción
+            if not voice_client.is_playing() and not voice_client.is_paused():
+                await check_queue(ctx)
+                return
+
+            await ctx.send(f"⏫ Canción añadida al inicio de la cola: **{song.title}**")
+
+        except ResolveCancelled:
+            await ctx.send("🚫 Búsqueda cancelada.")
+        except asyncio.TimeoutError:
+            await ctx.send("⏱️ La búsqueda tardó demasiado. Intenta nuevamente.")
+        except QueueFull:
+            await ctx.send(f"❌ La cola está llena (máximo {MAX_QUEUE_SIZE} canciones).")
+        except Exception as e:
+            await ctx.send(f"❌ Error: {str(e)[:200]}")
+
+    @commands.command(name='save')
+    async def save_playlist(self, ctx, nombre: str):
+        player = get_player(ctx.guild.id)
+        if not player.queue:
+            return await ctx.send("❌ No hay canciones en la cola para guardar.")
+
+        await playlist_store.save(ctx.guild.id, nombre, list(player.queue), ctx.author.id)
+        await ctx.send(f"💾 Playlist guardada como **{nombre}**.")
+
+    @commands.command(name='cargar')
+    async def cargar_playlist(self, ctx, nombre: str):
+        """Carga una playlist guardada a la cola actual"""
+        canciones = await playlist_store.load(ctx.guild.id, nombre, ctx.author.id)
+        if canciones is None:
+            return await ctx.send(f"❌ No existe la playlist '{nombre}'")
+
+        player = get_player(ctx.guild.id)
+        try:
+            for track in canciones:
+                player.enqueue(track)
+        except QueueFull:
+            await ctx.send(f"⚠️ La cola se llenó (máximo {MAX_QUEUE_SIZE} canciones); algunas no se cargaron.")
+        prefetcher.reschedule(ctx)
+        await ctx.send(f"🎵 Playlist '{nombre}' cargada ({len(canciones)} canciones)")
+
+    @commands.command(name='listar_playlists')
+    async def listar_playlists(self, ctx):
+        """Muestra todas las playlists guardadas"""
+        playlists = await playlist_store.list(ctx.guild.id)
+        if not playlists:
+            return await ctx.send("📭 No hay playlists guardadas")
+
+        embed = discord.Embed(title="📋 Playlists Guardadas", color=discord.Color.blue())
+        for nombre, total in playlists[:25]:
+            embed.add_field(name=nombre, value=f"{total} canciones", inline=False)
+
+        await ctx.send(embed=embed)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        # Si el usuario sale del canal de voz, sus búsquedas pendientes ya no sirven
+        if before.channel and after.channel is None:
+            resolver.cancel(member.guild.id, member.id)
+
+
+async def setup(bot):
+    await bot.add_cog(Musica(bot))
@@ -0,0 +1,229 @@
+"""Tickets confidenciales: se envían por DM al admin y se registran en SQLite."""
+import os
+import time
+import traceback
+
+import discord
+from discord.ext import commands
+
+from core.storage import db
+
+ADMIN_ID = int(os.getenv("TICKET_ADMIN_ID", 607681770422534144))
+TICKET_ABIERTO = 'abierto'
+TICKET_LEIDO = 'leido'
+
+
+class TicketRegistry:
+    """Tickets enviados al admin por DM, indexados por el ID del mensaje del DM.
+
+    Los tickets abiertos se mantienen en memoria para filtrar reacciones sin
+    llamadas a la API; SQLite guarda el historial y permite consultarlo.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tickets (
+            message_id INTEGER PRIMARY KEY,
+            requester_id INTEGER NOT NULL,
+            guild_id INTEGER,
+            channel_id INTEGER,
+            motivo TEXT NOT NULL,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS tickets_guild_status ON tickets (guild_id, status);
+    """
+
+    def __init__(self, db):
+        self.db = db
+        db.executescript(self.SCHEMA)
+        self._abiertos = dict(db.execute(
+            "SELECT message_id, requester_id FROM tickets WHERE status = ?", (TICKET_ABIERTO,)
+        ))
+
+    async def requester(self, message_id):
+        """ID del usuario que abrió el ticket, o None si el mensaje no es un ticket abierto.
+
+        Los DMs llegan por el shard 0, pero el ticket pudo abrirse en otro cluster:
+        si no está en memoria se consulta la base local (sin llamadas a la API).
+        """
+        requester = self._abiertos.get(message_id)
+        if requester is None:
+            filas = await self.db.run(
+                self.db.execute,
+                "SELECT requester_id FROM tickets WHERE message_id = ? AND status = ?",
+                (message_id, TICKET_ABIERTO)
+            )
+            if filas:
+                requester = self._abiertos[message_id] = filas[0][0]
+        return requester
+
+    async def open(self, message_id, requester_id, guild_id, channel_id, motivo):
+        self._abiertos[message_id] = requester_id
+        await self.db.run(
+            self.db.execute,
+            "INSERT OR REPLACE INTO tickets VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (message_id, requester_id, guild_id, channel_id, motivo, TICKET_ABIERTO, time.time())
+        )
+
+    async def set_status(self, message_id, status):
+        if status == TICKET_ABIERTO:
+            requester = await self.db.run(
+                self.db.execute, "SELECT requester_id FROM tickets WHERE message_id = ?", (message_id,)
+            )
+            if requester:
+                self._abiertos[message_id] = requester[0][0]
+        else:
+            self._abiertos.pop(message_id, None)
+        await self.db.run(
+            self.db.execute, "UPDATE tickets SET status = ? WHERE message_id = ?", (status, message_id)
+        )
+
+    async def list(self, guild_id=None, status=TICKET_ABIERTO, limit=20):
+        """Tickets con un estado dado, opcionalmente de un solo servidor (más recientes primero)."""
+        if guild_id is None:
+            sql = "SELECT * FROM tickets WHERE status = ? ORDER BY created_at DESC LIMIT ?"
+            params = (status, limit)
+        else:
+            sql = "SELECT * FROM tickets WHERE guild_id = ? AND status = ? ORDER BY created_at DESC LIMIT ?"
+            params = (guild_id, status, limit)
+        return await self.db.run(self.db.execute, sql, params)
+
+    async def count_by_guild(self, status=TICKET_ABIERTO):
+        return dict(await self.db.run(
+            self.db.execute,
+            "SELECT guild_id, COUNT(*) FROM tickets WHERE status = ? GROUP BY guild_id", (status,)
+        ))
+
+
+class Tickets(commands.Cog):
+    """Comandos de tickets."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.registry = TicketRegistry(db)
+        self._admin = None
+
+    async def admin(self):
+        """Usuario administrador de tickets; solo se pide a la API la primera vez."""
+        if self._admin is None:
+            self._admin = self.bot.get_user(ADMIN_ID) or await self.bot.fetch_user(ADMIN_ID)
+        return self._admin
+
+
+    @commands.command(name='ticket')
+    async def crear_ticket(self, ctx, *, motivo: str = "Sin motivo especificado"):
+        """Sistema confidencial de tickets por DM"""
+
+        try:
+            # 1. Borrar inmediatamente el mensaje del usuario
+            try:
+                await ctx.message.delete()
+            except:
+                pass
+
+            # 2. Enviar confirmación temporal al usuario
+            confirmacion = await ctx.send(f"{ctx.author.mention} 📩 Ticket recibido, procesando...", delete_after=5)
+
+            # 3. Crear embed del ticket
+            embed = discord.Embed(
+                title="🚨 TICKET CONFIDENCIAL",
+                description=(
+                    f"**Usuario:** {ctx.author.mention} (`{ctx.author.id}`)\n"
+                    f"**Servidor:** `{ctx.guild.name}`\n"
+                    f"**Canal:** <#{ctx.channel.id}>\n"
+                    f"**Motivo:** {motivo}\n"
+                    f"**Hora:** {ctx.message.created_at.strftime('%d/%m %H:%M')}"
+                ),
+                color=0xFF0000
+            )
+            embed.set_footer(text="Reacciona con 🔒 para confirmar lectura")
+
+            # 4. Enviar DM al admin (tú)
+            try:
+                admin = await self.admin()
+                ticket_msg = await admin.send(embed=embed)  # Este es el mensaje IMPORTANTE que debes recibir
+                await self.registry.open(
+                    ticket_msg.id, ctx.author.id, getattr(ctx.guild, 'id', None), ctx.channel.id, motivo
+                )
+                await ticket_msg.add_reaction('🔒')
+
+                # 5. Enviar confirmación final al usuario (por DM)
+                try:
+                    await ctx.author.send(
+                        "📬 **Ticket recibido**\n"
+                        f"Motivo: {motivo}\n\n"
+                        "Un administrador te responderá pronto por este medio.\n"
+                        "⚠️ Por favor no elimines este mensaje."
+                    )
+                except:
+                    await ctx.send(f"{ctx.author.mention} No pude enviarte DM. Por favor activa tus mensajes directos.", delete_after=15)
+
+            except discord.Forbidden:
+                await ctx.send(f"{ctx.author.mention} ❌ No pude notificar al soporte", delete_after=10)
+
+        except Exception as e:
+            print(f"Error en ticket: {traceback.format_exc()}")
+            try:
+                await ctx.author.send("❌ Error al procesar tu ticket")
+            except:
+                pass
+
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload):
+        # Solo interesa el 🔒 del admin sobre un ticket abierto: se decide sin llamar a la API
+        if str(payload.emoji) != '🔒' or payload.guild_id is not None or payload.user_id != ADMIN_ID:
+            return
+        user_id = await self.registry.requester(payload.message_id)
+        if user_id is None:
+            return
+
+        try:
+            await self.registry.set_status(payload.message_id, TICKET_LEIDO)
+
+            # Notificar al usuario
+            try:
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+                await user.send(
+                    "🔔 **Notificación de soporte**\n"
+                    "Hemos recibido tu ticket y lo estamos revisando.\n"
+                    "Gracias por tu paciencia."
+                )
+            except Exception as user_error:
+                print(f"No se pudo notificar al usuario {user_id}: {user_error}")
+        except Exception as e:
+            print(f"Error en reacción de ticket: {traceback.format_exc()}")
+
+    @commands.command(name='tickets', hidden=True)
+    @commands.check(lambda ctx: ctx.author.id == ADMIN_ID)
+    async def listar_tickets(self, ctx, estado: str = TICKET_ABIERTO):
+        """Lista tickets por estado (abierto/leido). En un servidor, solo los de ese servidor. Respuesta por DM."""
+        estado = estado.lower()
+        if estado not in (TICKET_ABIERTO, TICKET_LEIDO):
+            return await ctx.send(f"❌ Estado inválido. Usa `{TICKET_ABIERTO}` o `{TICKET_LEIDO}`.")
+
+        guild_id = ctx.guild.id if ctx.guild else None
+        filas = await self.registry.list(guild_id, estado)
+        if not filas:
+            return await ctx.author.send(f"📭 No hay tickets con estado `{estado}`.")
+
+        lineas = []
+        for message_id, requester_id, ticket_guild, channel_id, motivo, _, creado in filas:
+            servidor = self.bot.get_guild(ticket_guild) if ticket_guild else None
+            lineas.append(
+                f"• <t:{int(creado)}:R> <@{requester_id}> en `{servidor.name if servidor else ticket_guild}`: "
+                f"{motivo[:80]}"
+            )
+
+        embed = discord.Embed(
+            title=f"🎫 Tickets ({estado})",
+            description="\n".join(lineas),
+            color=0xFF0000
+        )
+        if guild_id is None:
+            por_servidor = await self.registry.count_by_guild(estado)
+            embed.set_footer(text=f"{sum(por_servidor.values())} en total, en {len(por_servidor)} servidor(es)")
+        await ctx.author.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Tickets(bot))
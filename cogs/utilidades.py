@@ -0,0 +1,208 @@
+"""Utilidades de moderación (¡limpiar, ¡silenciar) y el menú de ¡ayuda."""
+import asyncio
+import contextlib
+import logging
+import time
+
+import discord
+from discord.ext import commands
+
+from core.config import PREFIX
+from core.scheduler import scheduler
+
+MUTE_ROLE_NAME = "Silenciado"
+PERMISSION_PROGRESS_INTERVAL = 2.0  # Segundos entre ediciones del mensaje de progreso
+
+roles_silenciado = {}     # guild_id -> role_id
+permisos_en_curso = {}    # guild_id -> tarea que aplica los overwrites
+
+
+async def obtener_rol_silenciado(guild):
+    """Devuelve el rol de silenciado del servidor, creándolo si hace falta (cacheado por servidor)."""
+    role = guild.get_role(roles_silenciado.get(guild.id, 0))
+    if role is None:
+        role = discord.utils.get(guild.roles, name=MUTE_ROLE_NAME)
+        if role is None:
+            role = await guild.create_role(name=MUTE_ROLE_NAME, reason="Rol para ¡silenciar")
+        roles_silenciado[guild.id] = role.id
+    return role
+
+
+def canales_sin_silenciar(guild, role):
+    """Canales a los que les falta el overwrite del rol: primero categorías, luego el resto.
+
+    Los canales que ya niegan send_messages al rol se omiten, así que volver a
+    ejecutar ¡silenciar solo toca canales nuevos. Del resto no se puede omitir
+    ninguno: la API no propaga el overwrite de una categoría a sus canales
+    (sincronizar un canal también es un PATCH suyo), así que son una llamada
+    por canal pendiente.
+    """
+    pendientes = [c for c in guild.channels if c.overwrites_for(role).send_messages is not False]
+    # Con la categoría ya cambiada, el canal sincronizado que recibe el mismo
+    # overwrite sigue sincronizado con ella.
+    pendientes.sort(key=lambda c: not isinstance(c, discord.CategoryChannel))
+    return pendientes
+
+
+async def aplicar_permisos_silenciado(guild, role, progreso=None):
+    """Aplica el overwrite del rol en paralelo (acotado) e informa del avance en `progreso`."""
+    pendientes = canales_sin_silenciar(guild, role)
+    total = len(pendientes)
+    if not total:
+        return 0, 0
+
+    hechos = 0
+    fallos = 0
+    ultima_edicion = time.monotonic()
+
+    async def aplicar(canal):
+        nonlocal hechos, fallos, ultima_edicion
+        overwrite = canal.overwrites_for(role)
+        overwrite.send_messages = False
+        try:
+            await scheduler.run(
+                'set_permissions', guild.id,
+                lambda: canal.set_permissions(role, overwrite=overwrite, reason="Rol de silenciado")
+            )
+        except discord.NotFound:
+            pass
+        except discord.HTTPException as e:
+            fallos += 1
+            logging.error(f"Error al aplicar permisos en {canal.name}: {str(e)}")
+        hechos += 1
+
+        ahora = time.monotonic()
+        if progreso and ahora - ultima_edicion >= PERMISSION_PROGRESS_INTERVAL:
+            ultima_edicion = ahora
+            try:
+                await progreso.edit(content=f"🔧 Aplicando permisos de silenciado: {hechos}/{total} canales")
+            except discord.HTTPException:
+                pass
+
+    categorias = [c for c in pendientes if isinstance(c, discord.CategoryChannel)]
+    canales = [c for c in pendientes if not isinstance(c, discord.CategoryChannel)]
+    await asyncio.gather(*(aplicar(c) for c in categorias))
+    await asyncio.gather(*(aplicar(c) for c in canales))
+
+    if progreso:
+        texto = f"✅ Permisos de silenciado aplicados en {total - fallos}/{total} canales"
+        if fallos:
+            texto += f" ({fallos} con error, revisa los permisos del bot)"
+        with contextlib.suppress(discord.HTTPException):
+            await progreso.edit(content=texto)
+    return total, fallos
+
+
+class Utilidades(commands.Cog):
+    """Comandos de utilidades."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.command(name='limpiar')
+    @commands.has_permissions(manage_messages=True)
+    async def limpiar(self, ctx, cantidad: int = 10):
+        """Elimina mensajes (máx 100)"""
+        if 1 <= cantidad <= 100:
+            await ctx.channel.purge(limit=cantidad + 1)
+            msg = await ctx.send(f"🧹 Eliminados {cantidad} mensajes", delete_after=5)
+        else:
+            await ctx.send("❌ Cantidad inválida (1-100)", delete_after=5)
+
+    @commands.command(name='silenciar')
+    @commands.has_permissions(kick_members=True)
+    async def silenciar(self, ctx, miembro: discord.Member, *, razón: str = "Sin razón"):
+        """Silencia a un usuario"""
+        role = await obtener_rol_silenciado(ctx.guild)
+
+        # El rol se asigna ya; los overwrites que falten se aplican en segundo plano
+        await miembro.add_roles(role, reason=razón)
+        embed = discord.Embed(
+            title=f"🔇 {miembro.display_name} silenciado",
+            description=f"Razón: {razón}",
+            color=discord.Color.red()
+        )
+        await ctx.send(embed=embed)
+
+        tarea = permisos_en_curso.get(ctx.guild.id)
+        if (tarea is None or tarea.done()) and canales_sin_silenciar(ctx.guild, role):
+            progreso = await ctx.send("🔧 Aplicando permisos de silenciado...")
+            tarea = asyncio.create_task(aplicar_permisos_silenciado(ctx.guild, role, progreso))
+            permisos_en_curso[ctx.guild.id] = tarea
+            tarea.add_done_callback(lambda t, gid=ctx.guild.id: permisos_en_curso.pop(gid, None))
+
+    @commands.command(name="ayuda")
+    async def mostrar_ayuda(self, ctx):
+        """Mostrar un menú con los comandos disponibles."""
+        prefix = PREFIX
+
+        embed = discord.Embed(
+            title="📖 Comandos disponibles",
+            description="Aquí tienes una lista completa de comandos:",
+            color=discord.Color.blurple()
+        )
+
+        embed.add_field(
+            name="🎵 Música",
+            value=(
+                f"`{prefix}play [url/búsqueda/playlist]` - Reproduce música\n"
+                f"`{prefix}pause` - Pausa la música\n"
+                f"`{prefix}resume` - Reanuda\n"
+                f"`{prefix}skip` - Salta la canción\n"
+                f"`{prefix}stop` - Detiene y limpia la cola\n"
+                f"`{prefix}lista` - Muestra la cola\n"
+                f"`{prefix}shuffle` - Mezcla la cola\n"
+                f"`{prefix}remove [posición]` - Elimina una canción\n"
+                f"`{prefix}loop [off/cancion/cola]` - Modo de repetición\n"
+                f"`{prefix}volume [0-200]` - Ajusta el volumen\n"
+                f"`{prefix}playtop [url/búsqueda]` - Añade al inicio\n"
+                f"`{prefix}borrar_cola` - Limpia la cola\n"
+                f"`{prefix}save [nombre]` - Guarda la cola como playlist\n"
+                f"`{prefix}cargar [nombre]` - Carga una playlist guardada\n"
+                f"`{prefix}listar_playlists` - Muestra las playlists guardadas\n"
+                f"`{prefix}disconnect` - Desconecta al bot"
+            ),
+            inline=False
+        )
+
+        embed.add_field(
+            name="🧠 IA",
+            value=(
+                f"`{prefix}charla [mensaje]` - Chatea con la IA\n"
+                f"`{prefix}olvidar` - Reinicia la conversación"
+            ),
+            inline=False
+        )
+
+        embed.add_field(
+            name="🎮 Juegos",
+            value=(
+                f"`{prefix}separar` o `{prefix}gamevoice`\n"
+                "Separa jugadores por juego (`nuevo` para pedir otros nombres)"
+            ),
+            inline=False
+        )
+
+        embed.add_field(
+            name="📊 Utilidades",
+            value=(
+                f"`{prefix}votar [tiempo] \"pregunta\" op1 op2`\n"
+                "Crea encuestas con tiempo opcional (ej: `¡votar 5 \"¿Pizza?\" Sí No`)\n"
+                f"`{prefix}votar \"pregunta\" op1 op2` - 1 minuto por defecto\n"
+                "📌 Máx. 6 opciones | 🎉 Muestra resultados automáticos"
+            ),
+            inline=False
+        )
+
+        embed.add_field(
+        name="🎫 Tickets",
+        value=(f"`{prefix}ticket [motivo]`"),
+            inline=False
+        )
+
+        embed.set_footer(text=f"Prefijo: '{prefix}' • Usa comillas para frases largas")
+        await ctx.send(embed=embed)
+
+
+async def setup(bot):
+    await bot.add_cog(Utilidades(bot))
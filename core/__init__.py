@@ -0,0 +1 @@
+"""Piezas compartidas del bot: configuración, almacenamiento, IA y el bot en sí."""
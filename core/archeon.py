@@ -0,0 +1,187 @@
+"""El bot: carga de extensiones, sincronización del árbol de comandos y eventos generales."""
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import time
+
+import discord
+from discord.ext import commands
+
+from core.config import CLUSTER_COUNT, CLUSTER_ID, DATA_DIR, PREFIX, SHARD_COUNT, SHARD_IDS
+from core.metrics import COMMAND_SECONDS, COMMANDS_TOTAL, METRICS_PORT, muestrear, servir, trace_discord_rest
+from core.profiling import LoopWatchdog, tareas_comando
+from core.state import state
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = (
+    'cogs.musica',
+    'cogs.ia',
+    'cogs.juegos',
+    'cogs.encuestas',
+    'cogs.tickets',
+    'cogs.utilidades',
+    'cogs.diagnostico',
+)
+
+TREE_HASH_FILE = os.path.join(DATA_DIR, "tree_sync.hash")
+CLUSTER_HEARTBEAT = float(os.getenv("CLUSTER_HEARTBEAT", 15))  # Segundos entre latidos al estado compartido
+
+
+class Archeon(commands.AutoShardedBot):
+    """Bot de Archeon. `inicio` es el perf_counter() del arranque del proceso;
+    `tiempos_import` el desglose de imports medido por el script de arranque.
+
+    Con launcher.py cada proceso (cluster) lleva solo los shards de SHARD_IDS.
+    """
+
+    def __init__(self, inicio=None, tiempos_import=None, shard_ids=SHARD_IDS, shard_count=SHARD_COUNT):
+        intents = discord.Intents.default()
+        intents.message_content = True
+        super().__init__(
+            command_prefix=PREFIX,
+            intents=intents,
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            # La presencia va en el IDENTIFY: no hace falta cambiarla en cada on_ready
+            activity=discord.Game(name="¡ayuda para comandos"),
+            http_trace=trace_discord_rest()
+        )
+        self.cluster_id = CLUSTER_ID
+        self.cluster_count = CLUSTER_COUNT
+        self.inicio = inicio or time.perf_counter()
+        self.tiempos_import = dict(tiempos_import or {})
+        self.tiempos_extensiones = {}
+        self._arranque_reportado = False
+        self._latidos = None
+        self._muestreo = None
+        self._servidor_metricas = None
+        self.watchdog = LoopWatchdog()
+        self.before_invoke(self._antes_de_comando)
+        self.after_invoke(self._despues_de_comando)
+
+    def owns_guild(self, guild_id):
+        """True si el servidor (o los DMs, con guild_id None) va por un shard de este cluster."""
+        if self.shard_ids is None or not self.shard_count:
+            return True
+        shard_id = 0 if guild_id is None else (guild_id >> 22) % self.shard_count
+        return shard_id in self.shard_ids
+
+    async def setup_hook(self):
+        for extension in EXTENSIONS:
+            t0 = time.perf_counter()
+            await self.load_extension(extension)
+            self.tiempos_extensiones[extension.rsplit('.', 1)[-1]] = time.perf_counter() - t0
+        # En segundo plano: no retrasa la conexión al gateway. Con varios clusters sincroniza solo el primero.
+        if self.cluster_id == 0:
+            asyncio.create_task(self.sync_tree_if_changed())
+        self._latidos = asyncio.create_task(self._latir())
+        self._muestreo = asyncio.create_task(muestrear())
+        self.watchdog.start()
+        if METRICS_PORT:
+            try:
+                self._servidor_metricas = servir(port=METRICS_PORT + self.cluster_id)
+            except OSError as e:
+                logger.error(f"No se pudo abrir el puerto de métricas: {e}")
+
+    async def close(self):
+        self.watchdog.stop()
+        for tarea in (self._latidos, self._muestreo):
+            if tarea is not None:
+                tarea.cancel()
+        if self._servidor_metricas is not None:
+            await asyncio.to_thread(self._servidor_metricas.shutdown)
+        with contextlib.suppress(Exception):
+            await state.delete('clusters', self.cluster_id)
+        await super().close()
+
+    def cluster_stats(self):
+        """Resumen de este cluster para los comandos que agregan entre clusters."""
+        latencias = [latencia for _, latencia in self.latencies if latencia == latencia]  # Sin NaN
+        return {
+            'cluster': self.cluster_id,
+            'pid': os.getpid(),
+            'shards': sorted(self.shards),
+            'guilds': len(self.guilds),
+            'users': sum(guild.member_count or 0 for guild in self.guilds),
+            'voice': len(self.voice_clients),
+            'latency_ms': round(1000 * sum(latencias) / len(latencias)) if latencias else None,
+            'uptime': round(time.perf_counter() - self.inicio),
+            'updated': time.time(),
+        }
+
+    async def _latir(self):
+        """Publica periódicamente el estado del cluster en el almacén compartido."""
+        await self.wait_until_ready()
+        while not self.is_closed():
+            try:
+                await state.set('clusters', self.cluster_id, self.cluster_stats(), ttl=CLUSTER_HEARTBEAT * 3)
+                if self.cluster_id == 0:
+                    await state.purge()
+            except Exception as e:
+                logger.warning(f"No se pudo publicar el latido del cluster: {e}")
+            await asyncio.sleep(CLUSTER_HEARTBEAT)
+
+    def tree_hash(self):
+        """Hash de la definición del árbol de slash commands (y de la aplicación)."""
+        comandos = sorted(
+            (comando.to_dict(self.tree) for comando in self.tree.get_commands()),
+            key=lambda c: c['name']
+        )
+        datos = json.dumps([self.application_id, comandos], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(datos.encode('utf-8')).hexdigest()
+
+    async def sync_tree_if_changed(self):
+        """Sincroniza el árbol con Discord solo si cambió desde la última vez."""
+        actual = self.tree_hash()
+        try:
+            with open(TREE_HASH_FILE, encoding='utf-8') as f:
+                anterior = f.read().strip()
+        except OSError:
+            anterior = None
+        if actual == anterior:
+            logger.info("Árbol de comandos sin cambios: no se sincroniza")
+            return
+
+        try:
+            await self.tree.sync()
+        except discord.HTTPException as e:
+            logger.error(f"No se pudo sincronizar el árbol de comandos: {e}")
+            return
+        os.makedirs(DATA_DIR, exist_ok=True)
+        with open(TREE_HASH_FILE, 'w', encoding='utf-8') as f:
+            f.write(actual)
+        logger.info("Árbol de comandos sincronizado")
+
+    async def on_connect(self):
+        if self._arranque_reportado:
+            return
+        self._arranque_reportado = True
+        gateway = time.perf_counter() - self.inicio
+        imports = ', '.join(f"{nombre} {t * 1000:.0f} ms" for nombre, t in self.tiempos_import.items())
+        extensiones = ', '.join(f"{nombre} {t * 1000:.0f} ms" for nombre, t in self.tiempos_extensiones.items())
+        logger.info(f"Arranque: imports [{imports}] | extensiones [{extensiones}] | gateway a los {gateway * 1000:.0f} ms")
+
+    async def on_ready(self):
+        print(f'Bot conectado como {self.user.name} (cluster {self.cluster_id}, shards {sorted(self.shards)})')
+
+    async def _antes_de_comando(self, ctx):
+        ctx.inicio_comando = time.perf_counter()
+        # Para que el watchdog y ¡perfilar sepan qué comando ocupa el loop
+        tareas_comando[asyncio.current_task()] = ctx.command.qualified_name
+
+    async def _despues_de_comando(self, ctx):
+        # after_invoke también se llama si el comando lanzó una excepción
+        tareas_comando.pop(asyncio.current_task(), None)
+        nombre = ctx.command.qualified_name
+        COMMAND_SECONDS.observe(time.perf_counter() - ctx.inicio_comando, command=nombre)
+        COMMANDS_TOTAL.inc(command=nombre, status='error' if ctx.command_failed else 'ok')
+
+    async def on_command_error(self, ctx, error):
+        if isinstance(error, commands.CommandNotFound):
+            return
+        logger.error(f'Error en comando {ctx.command}: {error}')
+        await ctx.send(f'⚠️ Ocurrió un error: {str(error)}')
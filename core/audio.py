@@ -0,0 +1,319 @@
+"""Cliente de los nodos de audio (audio_node.py).
+
+Con AUDIO_BACKEND=remote la resolución con yt-dlp, ffmpeg y el troceado en
+paquetes Opus ocurren en procesos aparte; el bot solo recibe paquetes de 20 ms
+listos para enviar a Discord. Si un nodo (o su ffmpeg) se cae, las canciones
+que servía terminan y el bot sigue con la cola en otro nodo.
+
+Protocolo: mensajes con cabecera !BII (tipo, id, longitud). Los de control
+llevan JSON con un campo 'op'; los de paquete llevan un paquete Opus del
+stream `id`. El nodo solo envía paquetes mientras el bot le dé créditos.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import os
+import struct
+import threading
+from collections import deque
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+AUDIO_BACKEND = os.getenv("AUDIO_BACKEND", "local")  # local | remote
+AUDIO_NODES = [n.strip() for n in os.getenv("AUDIO_NODES", "127.0.0.1:7070").split(',') if n.strip()]
+AUDIO_CREDITS = int(os.getenv("AUDIO_CREDITS", 250))  # Paquetes que el nodo puede adelantar (250 = 5 s)
+AUDIO_STALL_TIMEOUT = float(os.getenv("AUDIO_STALL_TIMEOUT", 10))  # Sin paquetes en este tiempo, la canción termina
+AUDIO_RECONNECT = 2.0
+
+CABECERA = struct.Struct('!BII')
+CONTROL, PAQUETE = 0, 1
+
+
+class AudioNodeError(Exception):
+    """El nodo de audio respondió con un error o no hay ninguno disponible."""
+
+
+async def leer_mensaje(reader):
+    """(tipo, id, datos) del siguiente mensaje; los de control ya decodificados."""
+    tipo, ident, longitud = CABECERA.unpack(await reader.readexactly(CABECERA.size))
+    datos = await reader.readexactly(longitud)
+    return tipo, ident, json.loads(datos) if tipo == CONTROL else datos
+
+
+def escribir_control(writer, mensaje):
+    datos = json.dumps(mensaje, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    writer.write(CABECERA.pack(CONTROL, 0, len(datos)) + datos)
+
+
+def escribir_paquete(writer, stream_id, paquete):
+    writer.write(CABECERA.pack(PAQUETE, stream_id, len(paquete)) + paquete)
+
+
+async def abrir_conexion(direccion):
+    """'host:puerto' por TCP o una ruta para un socket Unix."""
+    if '/' in direccion:
+        return await asyncio.open_unix_connection(direccion)
+    host, puerto = direccion.rsplit(':', 1)
+    return await asyncio.open_connection(host, int(puerto))
+
+
+class RemoteAudioSource(discord.AudioSource):
+    """Paquetes Opus que llegan de un nodo. read() corre en el hilo de audio de discord.py."""
+
+    def __init__(self, node, stream_id, loop, ganancia=1.0):
+        self.node = node
+        self.stream_id = stream_id
+        self.loop = loop
+        self.error = None
+        self._ganancia = ganancia
+        self._paquetes = deque()
+        self._cond = threading.Condition()
+        self._fin = False
+        self._consumidos = 0
+
+    def is_opus(self):
+        return True
+
+    def read(self):
+        with self._cond:
+            self._cond.wait_for(lambda: self._paquetes or self._fin, AUDIO_STALL_TIMEOUT)
+            if not self._paquetes:
+                return b''
+            paquete = self._paquetes.popleft()
+            self._consumidos += 1
+            if self._consumidos >= AUDIO_CREDITS // 2:
+                creditos, self._consumidos = self._consumidos, 0
+                self._enviar('credit', n=creditos)
+        return paquete
+
+    @property
+    def ganancia(self):
+        return self._ganancia
+
+    @ganancia.setter
+    def ganancia(self, valor):
+        """La aplica el nodo (core.ganancia) a los paquetes que aún no ha enviado."""
+        if valor != self._ganancia:
+            self._ganancia = valor
+            self._enviar('gain', gain=valor)
+
+    def pause(self):
+        """El nodo para ffmpeg y guarda la posición; lo ya recibido sigue en el búfer."""
+        self._enviar('pause')
+
+    def resume(self):
+        self._enviar('resume')
+
+    def cleanup(self):
+        if self.node.streams.pop(self.stream_id, None) is not None:
+            self._enviar('close')
+        self._terminar()
+
+    def _enviar(self, op, **datos):
+        # Se llama desde el hilo de audio o desde el loop: siempre por call_soon_threadsafe
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.node.send, dict(datos, op=op, id=self.stream_id))
+
+    def _recibir(self, paquete):
+        with self._cond:
+            self._paquetes.append(paquete)
+            self._cond.notify()
+
+    def _terminar(self, error=None):
+        with self._cond:
+            self.error = self.error or error
+            self._fin = True
+            self._cond.notify()
+
+
+class NodeConnection:
+    """Conexión con un nodo; se reconecta sola mientras el bot esté vivo."""
+
+    def __init__(self, direccion):
+        self.direccion = direccion
+        self.streams = {}       # stream_id -> RemoteAudioSource
+        self._peticiones = {}   # id -> asyncio.Future
+        self._playlists = {}    # id -> asyncio.Queue de lotes (None al terminar)
+        self._writer = None
+        self._ids = itertools.count(1)
+        self._tarea = None
+
+    @property
+    def connected(self):
+        return self._writer is not None
+
+    def load(self):
+        return len(self.streams) + len(self._peticiones) + len(self._playlists)
+
+    def start(self):
+        if self._tarea is None:
+            self._tarea = asyncio.create_task(self._mantener())
+
+    async def _mantener(self):
+        while True:
+            try:
+                reader, writer = await abrir_conexion(self.direccion)
+            except OSError as e:
+                logger.debug(f"Nodo de audio {self.direccion} no disponible: {e}")
+                await asyncio.sleep(AUDIO_RECONNECT)
+                continue
+
+            self._writer = writer
+            logger.info(f"Conectado al nodo de audio {self.direccion}")
+            try:
+                while True:
+                    self._despachar(*await leer_mensaje(reader))
+            except (asyncio.IncompleteReadError, ConnectionError) as e:
+                logger.warning(f"Se perdió el nodo de audio {self.direccion}: {e!r}")
+            finally:
+                self._writer = None
+                writer.close()
+                self._fallar_todo(AudioNodeError(f"se perdió el nodo de audio {self.direccion}"))
+            await asyncio.sleep(AUDIO_RECONNECT)
+
+    def _despachar(self, tipo, ident, datos):
+        if tipo == PAQUETE:
+            source = self.streams.get(ident)
+            if source is not None:
+                source._recibir(datos)
+            return
+
+        ident = datos.get('id')
+        op = datos.get('op')
+        if op == 'end':
+            source = self.streams.pop(ident, None)
+            if source is not None:
+                if datos.get('error'):
+                    logger.warning(f"ffmpeg terminó con error en {self.direccion}: {datos['error']}")
+                source._terminar(datos.get('error'))
+        elif op == 'batch':
+            lotes = self._playlists.get(ident)
+            if lotes is not None:
+                lotes.put_nowait(datos['entries'])
+        else:
+            future = self._peticiones.pop(ident, None)
+            lotes = self._playlists.pop(ident, None)
+            error = AudioNodeError(datos['error']) if 'error' in datos else None
+            if future is not None and not future.done():
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(datos.get('result'))
+            if lotes is not None:
+                lotes.put_nowait(error)
+
+    def _fallar_todo(self, error):
+        for future in self._peticiones.values():
+            if not future.done():
+                future.set_exception(error)
+        for lotes in self._playlists.values():
+            lotes.put_nowait(error)
+        for source in self.streams.values():
+            source._terminar(str(error))
+        self._peticiones.clear()
+        self._playlists.clear()
+        self.streams.clear()
+
+    def send(self, mensaje):
+        if self._writer is not None:
+            escribir_control(self._writer, mensaje)
+
+    async def call(self, op, **datos):
+        ident = next(self._ids)
+        future = self._peticiones[ident] = asyncio.get_running_loop().create_future()
+        self.send(dict(datos, op=op, id=ident))
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if self._peticiones.pop(ident, None) is not None:
+                self.send({'op': 'cancel', 'id': ident})
+            raise
+
+    async def playlist(self, url, emitir):
+        ident = next(self._ids)
+        lotes = self._playlists[ident] = asyncio.Queue()
+        self.send({'op': 'playlist', 'id': ident, 'url': url})
+        terminada = False
+        try:
+            while True:
+                lote = await lotes.get()
+                if lote is None:
+                    terminada = True
+                    return
+                if isinstance(lote, Exception):
+                    terminada = True
+                    raise lote
+                emitir(lote)
+        finally:
+            if not terminada and self._playlists.pop(ident, None) is not None:
+                self.send({'op': 'cancel', 'id': ident})
+
+    def open(self, url, codec, bitrate, before_options, options, posicion=0.0, ganancia=1.0):
+        ident = next(self._ids)
+        source = self.streams[ident] = RemoteAudioSource(self, ident, asyncio.get_running_loop(), ganancia)
+        self.send({
+            'op': 'open',
+            'id': ident,
+            'url': url,
+            'codec': codec,
+            'bitrate': bitrate,
+            'before_options': before_options,
+            'options': options,
+            'position': posicion,
+            'gain': ganancia,
+            'credits': AUDIO_CREDITS,
+        })
+        return source
+
+
+class AudioNodePool:
+    """Reparte resoluciones y streams entre los nodos conectados (el de menos carga)."""
+
+    def __init__(self, direcciones=AUDIO_NODES):
+        self.nodes = [NodeConnection(d) for d in direcciones]
+
+    def start(self):
+        for node in self.nodes:
+            node.start()
+
+    def _elegir(self):
+        conectados = [node for node in self.nodes if node.connected]
+        if not conectados:
+            raise AudioNodeError("No hay nodos de audio conectados")
+        return min(conectados, key=NodeConnection.load)
+
+    async def _esperar_nodo(self):
+        """Da a los nodos un intento de reconexión antes de rendirse (arranque, reinicio de un nodo)."""
+        self.start()
+        for _ in range(int(AUDIO_RECONNECT * 10) + 10):
+            if any(node.connected for node in self.nodes):
+                break
+            await asyncio.sleep(0.1)
+        return self._elegir()
+
+    async def resolve(self, busqueda):
+        track = await (await self._esperar_nodo()).call('resolve', busqueda=busqueda)
+        if not track:
+            raise ValueError("No se encontraron resultados")
+        return track
+
+    async def playlist(self, url, emitir):
+        """Como extraer_playlist(), pero en un nodo: emitir(lote) por cada lote recibido."""
+        await (await self._esperar_nodo()).playlist(url, emitir)
+
+    def source(self, url, codec, bitrate, before_options, options, posicion=0.0, ganancia=1.0):
+        """RemoteAudioSource con los mismos parámetros que discord.FFmpegOpusAudio (y desde `posicion` segundos)."""
+        return self._elegir().open(url, codec, bitrate, before_options, options, posicion, ganancia)
+
+    def stats(self):
+        return {
+            'nodes': len(self.nodes),
+            'connected': sum(node.connected for node in self.nodes),
+            'streams': sum(len(node.streams) for node in self.nodes),
+        }
+
+
+audio_nodes = AudioNodePool()
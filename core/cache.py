@@ -0,0 +1,138 @@
+"""Cachés en memoria con expiración (canciones resueltas, respuestas de la IA)."""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Caché LRU con expiración por entrada y contadores de aciertos/fallos/desalojos."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_ratio': self.hits / total if total else 0.0
+        }
+
+
+# Caché de resultados para prompts deterministas (nombres de canales, comentarios de votaciones)
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "1") != "0"
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", 512))
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", 7 * 24 * 3600))
+PROMPT_CACHE_FILE = os.getenv("PROMPT_CACHE_FILE", os.path.join(DATA_DIR, "prompt_cache.json"))
+
+
+class PromptCache(TTLCache):
+    """TTLCache para respuestas de la IA, opcionalmente persistida en un JSON."""
+
+    def __init__(self, maxsize=PROMPT_CACHE_SIZE, ttl=PROMPT_CACHE_TTL, path=PROMPT_CACHE_FILE):
+        super().__init__(maxsize, ttl)
+        self.path = path or None
+        self.bypassed = 0
+        self._lock_disco = threading.Lock()
+        self._cargar()
+
+    async def get_or_generate(self, key, generar, *, ttl=None, bypass=False):
+        """Devuelve el valor guardado o llama a `generar()` (corrutina) y lo guarda."""
+        if bypass or not PROMPT_CACHE_ENABLED:
+            self.bypassed += 1
+        else:
+            valor = self.get(key)
+            if valor is not None:
+                return valor
+
+        valor = await generar()
+        self.set(key, valor, ttl)
+        if self.path:
+            await asyncio.to_thread(self.save)
+        return valor
+
+    def save(self):
+        """Escribe la caché en disco (de forma atómica). Las expiraciones se guardan en hora real."""
+        ahora, ahora_mono = time.time(), time.monotonic()
+        datos = {
+            key: [ahora + (expires_at - ahora_mono), valor]
+            for key, (expires_at, valor) in list(self._data.items())
+        }
+        with self._lock_disco:
+            tmp = f"{self.path}.{os.getpid()}.tmp"  # Un temporal por cluster
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp, self.path)
+
+    def _cargar(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"No se pudo leer la caché de prompts: {e}")
+            return
+        ahora = time.time()
+        for key, (expira, valor) in datos.items():
+            self.set(key, valor, expira - ahora)
+
+    def stats(self):
+        return dict(super().stats(), bypassed=self.bypassed)
+
+
+prompt_cache = PromptCache()
@@ -0,0 +1,449 @@
+"""Caché en disco de canciones como paquetes Opus ya troceados.
+
+Una canción que ya sonó se vuelve a descargar en segundo plano (ffmpeg con
+`-c:a copy` si YouTube la sirve en Opus) y se guarda en un contenedor propio:
+
+    cabecera: MAGIC, versión, nº de paquetes, CRC32 y longitud de los datos
+    datos:    [longitud (2 bytes)][paquete Opus de 20 ms] ...
+
+Las siguientes veces se reproduce leyendo el archivo mapeado en memoria, sin
+yt-dlp ni ffmpeg. El índice (y los contadores de uso para desalojar por LRU o
+LFU) está en SQLite; los archivos se escriben en un temporal y se renombran,
+así que un archivo con nombre final siempre está completo. Al abrirlo se
+comprueban cabecera y tamaño, y el CRC se va calculando mientras suena: si no
+cuadra al final, la entrada se descarta.
+"""
+import asyncio
+import contextlib
+import hashlib
+import logging
+import mmap
+import os
+import shlex
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import discord
+from discord.oggparse import OggError, OggStream
+
+from core.audio import AUDIO_BACKEND
+from core.config import DATA_DIR
+from core.storage import db
+
+logger = logging.getLogger(__name__)
+
+# Con el backend remoto ffmpeg no debe correr en el proceso del bot: por defecto, sin caché
+AUDIO_CACHE = os.getenv("AUDIO_CACHE", "1" if AUDIO_BACKEND == 'local' else "0") != "0"
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", os.path.join(DATA_DIR, "audio_cache"))
+AUDIO_CACHE_MAX_MB = float(os.getenv("AUDIO_CACHE_MAX_MB", 2048))
+AUDIO_CACHE_POLICY = os.getenv("AUDIO_CACHE_POLICY", "lfu")  # lfu: menos reproducidas primero; lru: más antiguas
+AUDIO_CACHE_MAX_TRACK = float(os.getenv("AUDIO_CACHE_MAX_TRACK", 1200))  # Ni directos ni mezclas de horas
+AUDIO_CACHE_WORKERS = int(os.getenv("AUDIO_CACHE_WORKERS", 1))
+# Una canción recién guardada empieza con 1 reproducción: sin este margen, con LFU sería la primera en irse
+AUDIO_CACHE_PROTECT = float(os.getenv("AUDIO_CACHE_PROTECT", 3600))
+AUDIO_CACHE_QUEUE = 100  # Descargas pendientes como máximo
+
+MAGIC = b'ARCHOPUS'
+VERSION = 1
+CABECERA = struct.Struct('!8sB3xIIQ')  # magic, versión, paquetes, crc32, bytes de datos
+LONGITUD = struct.Struct('!H')
+FRAME_SECONDS = 0.02
+MIN_COMPLETO = 0.9  # Fracción de la duración que tiene que traer ffmpeg para dar la descarga por buena
+
+ORDEN_DESALOJO = {
+    'lfu': "reproducciones ASC, ultimo_uso ASC",
+    'lru': "ultimo_uso ASC",
+}
+
+
+class CacheCorrupta(Exception):
+    pass
+
+
+def escribir_contenedor(path, paquetes):
+    """Escribe los paquetes en `path` (vía un temporal) y devuelve (nº de paquetes, bytes del archivo)."""
+    temporal = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    n = longitud = crc = 0
+    try:
+        with open(temporal, 'wb') as f:
+            f.write(CABECERA.pack(MAGIC, VERSION, 0, 0, 0))
+            for paquete in paquetes:
+                bloque = LONGITUD.pack(len(paquete)) + paquete
+                f.write(bloque)
+                crc = zlib.crc32(bloque, crc)
+                longitud += len(bloque)
+                n += 1
+            f.seek(0)
+            f.write(CABECERA.pack(MAGIC, VERSION, n, crc, longitud))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temporal)
+        raise
+    return n, CABECERA.size + longitud
+
+
+def leer_cabecera(datos, tamaño):
+    """(paquetes, crc, longitud) de un contenedor; CacheCorrupta si no es válido."""
+    if tamaño < CABECERA.size:
+        raise CacheCorrupta("archivo truncado")
+    magic, version, paquetes, crc, longitud = CABECERA.unpack_from(datos, 0)
+    if magic != MAGIC or version != VERSION:
+        raise CacheCorrupta(f"cabecera desconocida {magic!r} v{version}")
+    if CABECERA.size + longitud != tamaño:
+        raise CacheCorrupta(f"tamaño {tamaño}, la cabecera dice {CABECERA.size + longitud}")
+    return paquetes, crc, longitud
+
+
+class CachedOpusSource(discord.AudioSource):
+    """Reproduce un contenedor de la caché leyendo los paquetes del archivo mapeado en memoria.
+
+    `posicion` (segundos) salta los primeros paquetes; el salto y el CRC se
+    hacen en el hilo de audio, en la primera lectura.
+    """
+
+    def __init__(self, path, posicion=0.0, al_cerrar=None):
+        self.path = path
+        self._al_cerrar = al_cerrar
+        self._archivo = open(path, 'rb')
+        try:
+            tamaño = os.fstat(self._archivo.fileno()).st_size
+            self._mm = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ) if tamaño else b''
+            self.paquetes, self._crc_esperado, _ = leer_cabecera(self._mm, tamaño)
+        except BaseException:
+            self._al_cerrar = None  # Quien la crea se entera por la excepción
+            self.cleanup()
+            raise
+        self._tamaño = tamaño
+        self._pos = CABECERA.size
+        self._crc = 0
+        self._saltar = int(posicion / FRAME_SECONDS)
+        self.leidos = 0
+        self.corrupta = False
+
+    def _siguiente(self):
+        if self._pos + LONGITUD.size > self._tamaño:
+            return b''
+        (n,) = LONGITUD.unpack_from(self._mm, self._pos)
+        fin = self._pos + LONGITUD.size + n
+        if fin > self._tamaño:
+            self.corrupta = True
+            return b''
+        self._crc = zlib.crc32(self._mm[self._pos:fin], self._crc)
+        paquete = self._mm[self._pos + LONGITUD.size:fin]
+        self._pos = fin
+        self.leidos += 1
+        return paquete
+
+    def read(self):
+        while self._saltar:
+            self._saltar -= 1
+            if not self._siguiente():
+                break
+        paquete = self._siguiente()
+        if not paquete and self._pos >= self._tamaño and self._crc != self._crc_esperado:
+            self.corrupta = True
+        return paquete
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        mm, self._mm = getattr(self, '_mm', None), None
+        if isinstance(mm, mmap.mmap):
+            mm.close()
+        archivo, self._archivo = getattr(self, '_archivo', None), None
+        if archivo is not None:
+            archivo.close()
+            if self._al_cerrar is not None:
+                self._al_cerrar(getattr(self, 'corrupta', True))
+
+
+def argumentos_ffmpeg(url, codec, before_options, executable):
+    return [
+        executable, *shlex.split(before_options or ''),
+        '-i', url,
+        '-vn', '-map_metadata', '-1',
+        '-f', 'opus',
+        '-c:a', 'copy' if codec == 'opus' else 'libopus',
+        '-ar', '48000', '-ac', '2', '-b:a', '128k',
+        '-loglevel', 'error',
+        'pipe:1',
+    ]
+
+
+def lanzar_ffmpeg(args):
+    """El ffmpeg de una descarga, con el Ogg por stdout (el benchmark lo sustituye)."""
+    return subprocess.Popen(
+        args,
+        stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+    )
+
+
+class AudioCache:
+    """Índice de la caché de audio y descargas en segundo plano.
+
+    Las claves son las URLs canónicas de las canciones. `source()` y
+    `reproducida()` se llaman desde el event loop y no tocan el disco más allá
+    de abrir el archivo; descargas, desalojos y escrituras en SQLite van en
+    hilos aparte.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS audio_cache (
+            clave TEXT PRIMARY KEY,
+            archivo TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            paquetes INTEGER NOT NULL,
+            titulo TEXT,
+            duracion INTEGER,
+            miniatura TEXT,
+            reproducciones INTEGER NOT NULL DEFAULT 1,
+            ultimo_uso REAL NOT NULL,
+            creado REAL NOT NULL
+        );
+    """
+
+    def __init__(self, db, directorio=AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_MB * 2 ** 20,
+                 politica=AUDIO_CACHE_POLICY, workers=AUDIO_CACHE_WORKERS, enabled=AUDIO_CACHE):
+        if politica not in ORDEN_DESALOJO:
+            raise ValueError(f"AUDIO_CACHE_POLICY desconocida: {politica!r} (usa 'lfu' o 'lru')")
+        self.db = db
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.politica = politica
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.populated = 0
+        self.failed = 0
+        self.evictions = 0
+        self.corrupt = 0
+        self._lock = threading.Lock()
+        self._entradas = {}   # clave -> (archivo, bytes, paquetes, titulo, duracion, miniatura)
+        self._en_uso = {}     # clave -> fuentes abiertas (no se desalojan)
+        self._descargando = set()
+        self.al_guardar = []  # Funciones (clave, path) que se llaman en el hilo de descarga al guardar una canción
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-cache')
+        if enabled:
+            os.makedirs(directorio, exist_ok=True)
+            db.executescript(self.SCHEMA)
+            for clave, *entrada in db.execute(
+                "SELECT clave, archivo, bytes, paquetes, titulo, duracion, miniatura FROM audio_cache"
+            ):
+                self._entradas[clave] = tuple(entrada)
+
+    def __contains__(self, clave):
+        return clave in self._entradas
+
+    def archivo(self, clave):
+        """Ruta del contenedor de la canción, o None si no está en caché."""
+        entrada = self._entradas.get(clave)
+        return os.path.join(self.directorio, entrada[0]) if entrada is not None else None
+
+    def admite(self, cancion):
+        """True si la canción se guardará en caché tras sonar (tiene URL y no es un directo ni demasiado larga)."""
+        return self.enabled and bool(cancion.url) and 0 < cancion.duration <= AUDIO_CACHE_MAX_TRACK
+
+    def track(self, clave):
+        """Campos de la canción guardados con el audio (sin URL de stream), o None."""
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        _, _, paquetes, titulo, duracion, miniatura = entrada
+        return {
+            'title': titulo or clave, 'url': None, 'web_url': clave,
+            'duration': duracion or round(paquetes * FRAME_SECONDS), 'thumbnail': miniatura or '',
+            'codec': 'opus', 'bitrate': None
+        }
+
+    def source(self, clave, posicion=0.0):
+        """CachedOpusSource de la canción, o None si no está (o el archivo no es válido)."""
+        entrada = self._entradas.get(clave)
+        if entrada is None:
+            return None
+        with self._lock:
+            self._en_uso[clave] = self._en_uso.get(clave, 0) + 1
+        try:
+            fuente = CachedOpusSource(
+                os.path.join(self.directorio, entrada[0]), posicion,
+                al_cerrar=lambda corrupta: self._cerrada(clave, corrupta)
+            )
+        except (OSError, ValueError, CacheCorrupta) as e:
+            logger.warning(f"Caché de audio: {clave} no es válida ({e}), se descarta")
+            self._cerrada(clave, True)
+            return None
+        self.hits += 1
+        return fuente
+
+    def _cerrada(self, clave, corrupta):
+        with self._lock:
+            restantes = self._en_uso.get(clave, 1) - 1
+            if restantes:
+                self._en_uso[clave] = restantes
+            else:
+                self._en_uso.pop(clave, None)
+        if corrupta:
+            logger.warning(f"Caché de audio: el CRC de {clave} no cuadra, se descarta")
+            self.corrupt += 1
+            self._executor.submit(self._borrar, clave)
+
+    def reproducida(self, clave, cancion, before_options, executable):
+        """Llamar al empezar a sonar una canción (en el loop).
+
+        Si ya está en caché cuenta el uso; si no, y es cacheable, programa su
+        descarga. `cancion` necesita url, codec, duration, title y thumbnail.
+        """
+        if not self.enabled:
+            return
+        if clave in self._entradas:
+            self._executor.submit(
+                self.db.execute,
+                "UPDATE audio_cache SET reproducciones = reproducciones + 1, ultimo_uso = ? WHERE clave = ?",
+                (time.time(), clave)
+            )
+            return
+        self.misses += 1
+        if (
+            not self.admite(cancion)
+            or clave in self._descargando
+            or len(self._descargando) >= AUDIO_CACHE_QUEUE
+        ):
+            return
+        self._descargando.add(clave)
+        metadatos = (cancion.title, cancion.duration, cancion.thumbnail)
+        futuro = self._executor.submit(
+            self._poblar, clave, cancion.url, cancion.codec, metadatos, before_options, executable
+        )
+        futuro.add_done_callback(lambda f: self._descargando.discard(clave))
+
+    def _poblar(self, clave, url, codec, metadatos, before_options, executable):
+        """Descarga la canción y la guarda en la caché (en un hilo del pool)."""
+        # Otro cluster puede haberla guardado ya
+        fila = self.db.execute(
+            "SELECT archivo, bytes, paquetes, titulo, duracion, miniatura FROM audio_cache WHERE clave = ?", (clave,)
+        )
+        if fila and os.path.exists(os.path.join(self.directorio, fila[0][0])):
+            self._entradas[clave] = tuple(fila[0])
+            return
+
+        archivo = hashlib.sha1(clave.encode('utf-8')).hexdigest() + '.opk'
+        path = os.path.join(self.directorio, archivo)
+        titulo, duracion, miniatura = metadatos
+        proceso = lanzar_ffmpeg(argumentos_ffmpeg(url, codec, before_options, executable))
+        try:
+            paquetes = (
+                p for p in OggStream(proceso.stdout).iter_packets()
+                if not p.startswith((b'OpusHead', b'OpusTags'))
+            )
+            n, tamaño = escribir_contenedor(path, paquetes)
+            codigo = proceso.wait(timeout=10)
+        except (OSError, OggError, subprocess.TimeoutExpired) as e:
+            self.failed += 1
+            logger.warning(f"Caché de audio: no se pudo descargar {clave}: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return
+        finally:
+            if proceso.poll() is None:
+                proceso.kill()
+                proceso.wait()
+
+        # Un corte de red a mitad deja a ffmpeg con un archivo válido pero incompleto
+        if codigo != 0 or n * FRAME_SECONDS < duracion * MIN_COMPLETO:
+            self.failed += 1
+            logger.warning(f"Caché de audio: descarga incompleta de {clave} (ffmpeg {codigo}, {n} paquetes)")
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return
+
+        ahora = time.time()
+        self.db.execute(
+            "INSERT OR REPLACE INTO audio_cache VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)",
+            (clave, archivo, tamaño, n, titulo, duracion, miniatura, ahora, ahora)
+        )
+        self._entradas[clave] = (archivo, tamaño, n, titulo, duracion, miniatura)
+        self.populated += 1
+        for callback in self.al_guardar:
+            callback(clave, path)
+        self._desalojar()
+
+    def _desalojar(self):
+        """Borra entradas (según la política) hasta quedar bajo el límite de tamaño.
+
+        Las guardadas hace menos de AUDIO_CACHE_PROTECT segundos van al final:
+        solo se desalojan si no queda ninguna más antigua.
+        """
+        total = sum(entrada[1] for entrada in list(self._entradas.values()))
+        if total <= self.max_bytes:
+            return
+        for clave, tamaño in self.db.execute(
+            f"SELECT clave, bytes FROM audio_cache ORDER BY creado > ?, {ORDEN_DESALOJO[self.politica]}",
+            (time.time() - AUDIO_CACHE_PROTECT,)
+        ):
+            if total <= self.max_bytes:
+                break
+            if clave in self._en_uso:
+                continue
+            self._borrar(clave)
+            self.evictions += 1
+            total -= tamaño
+
+    def _borrar(self, clave):
+        with self._lock:
+            if clave in self._en_uso:
+                return  # Se borrará cuando deje de sonar, si vuelve a fallar
+            entrada = self._entradas.pop(clave, None)
+        self.db.execute("DELETE FROM audio_cache WHERE clave = ?", (clave,))
+        if entrada is not None:
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(self.directorio, entrada[0]))
+
+    def _revisar(self):
+        """Al arrancar: descarta entradas sin archivo o con cabecera/tamaño inválidos y temporales huérfanos."""
+        for clave, entrada in list(self._entradas.items()):
+            path = os.path.join(self.directorio, entrada[0])
+            try:
+                with open(path, 'rb') as f:
+                    leer_cabecera(f.read(CABECERA.size), os.fstat(f.fileno()).st_size)
+            except (OSError, CacheCorrupta) as e:
+                logger.warning(f"Caché de audio: {clave} no es válida ({e}), se descarta")
+                self.corrupt += 1
+                self._borrar(clave)
+        limite = time.time() - 3600
+        for nombre in os.listdir(self.directorio):
+            path = os.path.join(self.directorio, nombre)
+            if nombre.endswith('.part') and os.path.getmtime(path) < limite:
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+
+    async def start(self):
+        """Revisa la caché en segundo plano (no retrasa el arranque)."""
+        if self.enabled:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._revisar)
+
+    def stats(self):
+        consultas = self.hits + self.misses
+        return {
+            'entries': len(self._entradas),
+            'bytes': sum(entrada[1] for entrada in list(self._entradas.values())),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / consultas if consultas else 0.0,
+            'populated': self.populated,
+            'downloading': len(self._descargando),
+            'failed': self.failed,
+            'evictions': self.evictions,
+            'corrupt': self.corrupt,
+        }
+
+
+audio_cache = AudioCache(db)
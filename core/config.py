@@ -0,0 +1,21 @@
+"""Configuración leída del entorno (y del archivo .env si existe)."""
+import os
+
+from dotenv import load_dotenv
+
+# Confirmacion de key
+load_dotenv()
+TOKEN = os.getenv("DISCORD_TOKEN")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+
+PREFIX = '¡'
+
+# Almacenamiento local (SQLite, cachés en disco)
+DATA_DIR = os.getenv("ARCHEON_DATA_DIR", "data")
+
+# Sharding: launcher.py reparte los shards entre procesos (clusters) y pasa estas variables.
+# Sin ellas, un solo proceso con todos los shards que recomiende Discord.
+SHARD_COUNT = int(os.getenv("ARCHEON_SHARD_COUNT", 0)) or None
+SHARD_IDS = [int(s) for s in os.getenv("ARCHEON_SHARD_IDS", "").split(',') if s.strip()] or None
+CLUSTER_ID = int(os.getenv("ARCHEON_CLUSTER_ID", 0))
+CLUSTER_COUNT = int(os.getenv("ARCHEON_CLUSTER_COUNT", 1))
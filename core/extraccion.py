@@ -0,0 +1,139 @@
+"""Extracción con yt-dlp, compartida por el bot y por audio_node.py.
+
+yt-dlp se importa dentro de las funciones la primera vez que se extrae algo,
+así que solo lo carga el proceso que de verdad resuelve canciones.
+"""
+import os
+import re
+
+# Define la expresión regular al inicio del código (fuera de la función)
+URL_REGEX = re.compile(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+')
+
+# Si YouTube ya sirve Opus se copian los paquetes tal cual (sin decodificar ni recodificar)
+OPUS_PASSTHROUGH = os.getenv("OPUS_PASSTHROUGH", "1") != "0"
+
+# Opciones para youtube_dl
+ydl_opts = {
+    'format': 'bestaudio/best',
+    'default_search': 'ytsearch',
+    'noplaylist': True,
+    'quiet': True,
+    'no_warnings': True,
+    'ignoreerrors': True,
+    'extract_flat': False,
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': 'opus',
+        'preferredquality': '192',
+    }],
+    'outtmpl': '%(extractor)s-%(id)s-%(title)s.%(ext)s',
+    'restrictfilenames': True,
+    'nocheckcertificate': True,
+    'source_address': '0.0.0.0'
+}
+
+
+def extraer_cancion(busqueda):
+    """Ejecuta yt-dlp de forma bloqueante. Nunca desde el event loop."""
+    import yt_dlp as youtube_dl
+
+    is_url = bool(URL_REGEX.match(busqueda))
+
+    with youtube_dl.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(
+            busqueda if is_url else f"ytsearch:{busqueda}",
+            download=False
+        )
+
+    if not info:
+        raise ValueError("No se encontraron resultados")
+
+    # Si es una búsqueda, tomar el primer resultado
+    if 'entries' in info:
+        entries = [entry for entry in info['entries'] if entry]
+        if not entries:
+            raise ValueError("No se encontraron resultados")
+        info = entries[0]
+
+    format = _elegir_formato(info)
+
+    return {
+        'title': info.get('title', busqueda),
+        'url': format['url'],
+        'web_url': info.get('webpage_url', busqueda),
+        'duration': int(info.get('duration') or 0),
+        'thumbnail': info.get('thumbnail', ''),
+        'codec': format.get('acodec'),
+        'bitrate': format.get('abr')
+    }
+
+
+# Playlists: extracción plana, se encolan marcadores y cada canción se resuelve justo antes de sonar
+PLAYLIST_CHUNK = int(os.getenv("PLAYLIST_CHUNK", 50))
+
+
+def extraer_playlist(url, emitir, cancelado):
+    """Recorre la playlist con extracción plana y emite lotes de entradas (bloqueante)."""
+    import yt_dlp as youtube_dl
+
+    opts = dict(ydl_opts, noplaylist=False, extract_flat='in_playlist', lazy_playlist=True)
+
+    with youtube_dl.YoutubeDL(opts) as ydl:
+        # process=False deja 'entries' como generador: las páginas se piden a medida que se recorren
+        info = ydl.extract_info(url, download=False, process=False)
+        if not info:
+            raise ValueError("No se encontró la playlist")
+
+        lote = []
+        for entry in info.get('entries') or []:
+            if cancelado.is_set():
+                return
+            if not entry or not (entry.get('url') or entry.get('id')):
+                continue
+            lote.append(_entrada_plana(entry))
+            if len(lote) >= PLAYLIST_CHUNK:
+                emitir(lote)
+                lote = []
+        if lote:
+            emitir(lote)
+
+
+def _entrada_plana(entry):
+    """Campos mínimos de una entrada plana; 'url' queda en None hasta resolverla."""
+    web_url = entry.get('url') or ''
+    if not web_url.startswith('http'):
+        web_url = f"https://www.youtube.com/watch?v={entry['id']}"
+    thumbnails = entry.get('thumbnails') or [{}]
+    return {
+        'title': entry.get('title') or web_url,
+        'url': None,
+        'web_url': web_url,
+        'duration': int(entry.get('duration') or 0),
+        'thumbnail': thumbnails[-1].get('url', '')
+    }
+
+
+def _elegir_formato(info):
+    """Elige el stream de audio. Con passthrough activo se prefiere Opus (itag 251 en YouTube)."""
+    formats = info.get('formats') or []
+
+    if OPUS_PASSTHROUGH:
+        if info.get('url') and info.get('acodec') == 'opus':
+            return info
+        opus = [
+            f for f in formats
+            if f.get('url') and f.get('acodec') == 'opus' and f.get('vcodec') in (None, 'none')
+        ]
+        if opus:
+            return max(opus, key=lambda f: f.get('abr') or 0)
+
+    # Obtener la URL de audio directamente
+    if 'url' in info:
+        return info
+
+    # Buscar el mejor formato de audio
+    return next(
+        (f for f in formats
+        if f.get('acodec') != 'none'),
+        formats[0]
+    )
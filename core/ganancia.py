@@ -0,0 +1,67 @@
+"""Ganancia sobre paquetes Opus: la usan GainTransformer en el bot y los nodos de audio.
+
+Mientras la ganancia es neutra los paquetes pasan tal cual. Si no, cada uno se
+decodifica con libopus, se multiplica con numpy y se vuelve a codificar: una
+transcodificación Opus por canción, a cargo del proceso que la aplique.
+"""
+import logging
+import math
+
+import discord
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GANANCIA_NEUTRA_DB = 0.25  # Por debajo de esto no compensa decodificar y volver a codificar
+
+
+def es_neutra(ganancia):
+    return ganancia > 0 and abs(20 * math.log10(ganancia)) < GANANCIA_NEUTRA_DB
+
+
+def aplicar_ganancia(pcm, ganancia, anterior):
+    """PCM s16le estéreo multiplicado por `ganancia`, con una rampa desde `anterior` para que no haga clic."""
+    muestras = np.frombuffer(pcm, dtype='<i2').astype(np.float32).reshape(-1, 2)
+    if ganancia == anterior:
+        muestras *= ganancia
+    else:
+        muestras *= np.linspace(anterior, ganancia, len(muestras), dtype=np.float32)[:, None]
+    np.clip(muestras, -32768, 32767, out=muestras)
+    return muestras.astype('<i2').tobytes()
+
+
+class GainStage:
+    """Estado de la ganancia de un stream: decoder y encoder de libopus y la última ganancia aplicada."""
+
+    sin_opus = False  # libopus no está disponible: se reproduce sin ganancia
+
+    def __init__(self):
+        self._anterior = None
+        self._decoder = None
+        self._encoder = None
+
+    def procesar(self, paquete, ganancia):
+        """El paquete con `ganancia` aplicada (el mismo paquete si es neutra)."""
+        if self._anterior is None:
+            if es_neutra(ganancia) or not self._preparar():
+                return paquete
+            # Decoder nuevo: los paquetes que pasaron tal cual no dejaron estado en él
+            self._decoder = discord.opus.Decoder()
+            self._anterior = 1.0
+        pcm = self._decoder.decode(paquete)
+        salida = aplicar_ganancia(pcm, ganancia, self._anterior)
+        self._anterior = None if es_neutra(ganancia) else ganancia
+        return self._encoder.encode(salida, len(pcm) // 4)
+
+    def _preparar(self):
+        if self._encoder is not None:
+            return True
+        if GainStage.sin_opus:
+            return False
+        try:
+            self._encoder = discord.opus.Encoder()
+        except discord.opus.OpusNotLoaded:
+            GainStage.sin_opus = True
+            logger.warning("libopus no está cargada: el volumen y la normalización no se pueden aplicar")
+            return False
+        return True
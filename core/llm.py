@@ -0,0 +1,336 @@
+"""Cliente de Gemini compartido y control de admisión de las llamadas a la IA.
+
+El SDK de Google se importa la primera vez que se usa la IA, no al arrancar el bot.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import OrderedDict
+
+from core.config import CLUSTER_COUNT, GOOGLE_API_KEY
+from core.metrics import llamada_externa
+
+logger = logging.getLogger(__name__)
+
+# Configuración de la IA
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", 8))
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 3))
+
+# Límites de uso de la IA (peticiones por segundo y ráfaga)
+AI_USER_RATE = float(os.getenv("AI_USER_RATE", 0.1))
+AI_USER_BURST = float(os.getenv("AI_USER_BURST", 3))
+AI_GUILD_RATE = float(os.getenv("AI_GUILD_RATE", 0.5))
+AI_GUILD_BURST = float(os.getenv("AI_GUILD_BURST", 10))
+AI_GLOBAL_RATE = float(os.getenv("AI_GLOBAL_RATE", 1))
+AI_GLOBAL_BURST = float(os.getenv("AI_GLOBAL_BURST", 15))
+AI_MAX_QUEUE_WAIT = float(os.getenv("AI_MAX_QUEUE_WAIT", 10))
+
+
+class LLMError(Exception):
+    """Error de la API de la IA que no se resolvió reintentando."""
+
+
+class LLMOverloaded(LLMError):
+    """La API rechazó la petición por cuota (429 / recurso agotado)."""
+
+
+class RateLimited(Exception):
+    """Petición rechazada por los limitadores; `retry_after` en segundos."""
+
+    def __init__(self, retry_after, scope):
+        super().__init__(f"Límite de {scope}: reintentar en {retry_after:.1f}s")
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+class TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, now):
+        """Segundos hasta que haya una ficha disponible (0 si ya la hay)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+    def drain(self, seconds):
+        """Deja el cubo en deuda durante `seconds` (respuesta 429 de la API)."""
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+
+class AdmissionController:
+    """Control de admisión de la IA con token buckets por usuario, por servidor y global.
+
+    Un usuario que supera su cupo se rechaza al instante con retry-after (no
+    ocupa la cola de los demás). Si el límite es del servidor o el global, la
+    petición espera como mucho AI_MAX_QUEUE_WAIT segundos. Los 429 de Gemini
+    vacían el cubo global durante el tiempo que indique la API.
+    """
+
+    MAX_BUCKETS = 10_000
+
+    def __init__(self):
+        self._usuarios = OrderedDict()
+        self._servidores = OrderedDict()
+        # Cada cluster tiene su parte de la cuota global de Gemini
+        self._global = TokenBucket(AI_GLOBAL_RATE / CLUSTER_COUNT, max(1, AI_GLOBAL_BURST / CLUSTER_COUNT))
+        self.rejected = 0
+        self.queued = 0
+
+    async def acquire(self, user_id=None, guild_id=None, max_wait=AI_MAX_QUEUE_WAIT):
+        usuario = self._cubo(self._usuarios, user_id, AI_USER_RATE, AI_USER_BURST)
+        servidor = self._cubo(self._servidores, guild_id, AI_GUILD_RATE, AI_GUILD_BURST)
+        limite = time.monotonic() + max_wait
+        en_cola = False
+
+        while True:
+            ahora = time.monotonic()
+            if usuario is not None:
+                espera = usuario.wait_time(ahora)
+                if espera > 0:
+                    self.rejected += 1
+                    raise RateLimited(espera, 'usuario')
+
+            espera = self._global.wait_time(ahora)
+            scope = 'global'
+            if servidor is not None and servidor.wait_time(ahora) > espera:
+                espera, scope = servidor.wait_time(ahora), 'servidor'
+
+            if espera == 0:
+                for cubo in (usuario, servidor, self._global):
+                    if cubo is not None:
+                        cubo.consume()
+                return
+            if ahora + espera > limite:
+                self.rejected += 1
+                raise RateLimited(espera, scope)
+            if not en_cola:
+                en_cola = True
+                self.queued += 1
+            await asyncio.sleep(espera)
+
+    def penalize(self, retry_after):
+        self._global.drain(retry_after)
+
+    def blocked_for(self):
+        return self._global.wait_time(time.monotonic())
+
+    def _cubo(self, cubos, clave, rate, burst):
+        if clave is None:
+            return None
+        cubo = cubos.get(clave)
+        if cubo is None:
+            cubo = cubos[clave] = TokenBucket(rate, burst)
+            if len(cubos) > self.MAX_BUCKETS:
+                cubos.popitem(last=False)
+        else:
+            cubos.move_to_end(clave)
+        return cubo
+
+    def stats(self):
+        return {'rejected': self.rejected, 'queued': self.queued, 'blocked_for': self.blocked_for()}
+
+
+def retry_after_de(error):
+    """Lee el tiempo de espera que sugiere un 429 (cabecera Retry-After o RetryInfo)."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is not None and headers.get('Retry-After'):
+        try:
+            return float(headers['Retry-After'])
+        except ValueError:
+            pass
+    for detalle in getattr(error, 'details', None) or []:
+        delay = getattr(detalle, 'retry_delay', None)
+        if delay is None:
+            continue
+        if hasattr(delay, 'total_seconds'):
+            return delay.total_seconds()
+        return delay.seconds + delay.nanos / 1e9
+    return None
+
+
+limiter = AdmissionController()
+
+
+class LLMClient:
+    """Cliente asíncrono de Gemini compartido por todos los comandos de IA.
+
+    Usa la API asíncrona del modelo (nunca bloquea el event loop), limita las
+    llamadas simultáneas y reintenta con backoff exponencial con jitter ante
+    errores 429/5xx. El timeout cubre la llamada completa, reintentos incluidos.
+    Los errores del SDK que quedan tras reintentar se lanzan como LLMError.
+    """
+
+    def __init__(self, model_name, limiter, timeout=LLM_TIMEOUT, concurrency=LLM_CONCURRENCY, retries=LLM_RETRIES):
+        self.model_name = model_name
+        self.model = None
+        self.limiter = limiter
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = 0.5
+        self.backoff_max = 8.0
+        self._semaforo = asyncio.Semaphore(concurrency)
+        self._carga = None
+        self._saturacion = ()
+        self._reintentables = ()
+        self._error_api = ()
+
+    async def generate(self, prompt, *, user_id=None, guild_id=None, timeout=None):
+        """Genera una respuesta y devuelve su texto.
+
+        Lanza RateLimited si los limitadores no la admiten y asyncio.TimeoutError
+        si se agota el tiempo.
+        """
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + (timeout or self.timeout)
+        intento = 0
+        await self.limiter.acquire(user_id, guild_id, min(AI_MAX_QUEUE_WAIT, self._restante(limite)))
+        await asyncio.wait_for(self._cargar(), self._restante(limite))
+
+        try:
+            while True:
+                try:
+                    response = await asyncio.wait_for(self._llamar(prompt), self._restante(limite))
+                    return response.text.strip()
+                except self._reintentables as e:
+                    intento += 1
+                    await self._esperar_reintento(e, intento, limite)
+        except Exception as e:
+            raise self._traducir(e)
+
+    async def stream(self, prompt, *, user_id=None, guild_id=None, timeout=None):
+        """Admite la petición y devuelve un iterador asíncrono con los fragmentos de texto.
+
+        La admisión ocurre al esperar esta llamada: RateLimited salta antes de
+        que quien llama haya enviado nada a Discord. Solo se reintenta antes del
+        primer fragmento; el timeout cubre toda la respuesta y el cupo de
+        concurrencia se mantiene hasta terminar.
+        """
+        loop = asyncio.get_running_loop()
+        limite = loop.time() + (timeout or self.timeout)
+        await self.limiter.acquire(user_id, guild_id, min(AI_MAX_QUEUE_WAIT, self._restante(limite)))
+        await asyncio.wait_for(self._cargar(), self._restante(limite))
+        return self._fragmentos(prompt, limite)
+
+    async def _fragmentos(self, prompt, limite):
+        intento = 0
+        await asyncio.wait_for(self._semaforo.acquire(), self._restante(limite))
+        try:
+            while True:
+                try:
+                    # Lo que se mide es la espera hasta el primer fragmento
+                    with llamada_externa('gemini_stream_first_chunk'):
+                        response = await asyncio.wait_for(
+                            self.model.generate_content_async(prompt, stream=True),
+                            self._restante(limite)
+                        )
+                        fragmentos = response.__aiter__()
+                        primero = await asyncio.wait_for(fragmentos.__anext__(), self._restante(limite))
+                    break
+                except StopAsyncIteration:
+                    return
+                except self._reintentables as e:
+                    intento += 1
+                    await self._esperar_reintento(e, intento, limite)
+
+            yield _texto_fragmento(primero)
+            while True:
+                try:
+                    fragmento = await asyncio.wait_for(fragmentos.__anext__(), self._restante(limite))
+                except StopAsyncIteration:
+                    return
+                yield _texto_fragmento(fragmento)
+        except Exception as e:
+            raise self._traducir(e)
+        finally:
+            self._semaforo.release()
+
+    async def _cargar(self):
+        """Importa el SDK y crea el modelo la primera vez (en un hilo, sin bloquear el loop)."""
+        if self.model is not None:
+            return
+        if self._carga is None:
+            self._carga = asyncio.ensure_future(asyncio.to_thread(self._crear_modelo))
+        try:
+            # shield: si se cancela quien espera, la carga sigue para los demás
+            await asyncio.shield(self._carga)
+        except Exception:
+            self._carga = None
+            raise
+
+    def _crear_modelo(self):
+        import google.generativeai as genai
+        from google.api_core import exceptions as google_exceptions
+
+        genai.configure(api_key=GOOGLE_API_KEY)
+        self._saturacion = (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted)
+        self._reintentables = self._saturacion + (
+            google_exceptions.InternalServerError,
+            google_exceptions.BadGateway,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.GatewayTimeout,
+            google_exceptions.DeadlineExceeded,
+        )
+        self._error_api = google_exceptions.GoogleAPIError
+        self.model = genai.GenerativeModel(self.model_name)
+
+    def _traducir(self, error):
+        """Convierte los errores del SDK de Google en LLMOverloaded/LLMError."""
+        if isinstance(error, self._saturacion):
+            traducido = LLMOverloaded(str(error))
+        elif isinstance(error, self._error_api):
+            traducido = LLMError(str(error))
+        else:
+            return error
+        traducido.__cause__ = error
+        return traducido
+
+    async def _llamar(self, prompt):
+        async with self._semaforo:
+            with llamada_externa('gemini_generate'):
+                return await self.model.generate_content_async(prompt)
+
+    @staticmethod
+    def _restante(limite):
+        restante = limite - asyncio.get_running_loop().time()
+        if restante <= 0:
+            raise asyncio.TimeoutError()
+        return restante
+
+    async def _esperar_reintento(self, error, intento, limite):
+        """Backoff exponencial con jitter; relanza el error si no quedan intentos o tiempo."""
+        if isinstance(error, self._saturacion):
+            # La cuota es de todo el bot: frenar también al resto de peticiones
+            self.limiter.penalize(retry_after_de(error) or self.backoff_max)
+        espera = max(
+            random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** intento)),
+            self.limiter.blocked_for()
+        )
+        if intento > self.retries or asyncio.get_running_loop().time() + espera >= limite:
+            raise error
+        logger.warning(f"Gemini respondió {error.__class__.__name__}, reintento {intento} en {espera:.1f}s")
+        await asyncio.sleep(espera)
+
+
+def _texto_fragmento(fragmento):
+    # Los fragmentos sin texto (p. ej. el cierre por filtros de seguridad) lanzan ValueError en .text
+    try:
+        return fragmento.text
+    except ValueError:
+        return ''
+
+
+llm = LLMClient(LLM_MODEL, limiter)
@@ -0,0 +1,297 @@
+"""Métricas en formato de texto de Prometheus, servidas por HTTP en un hilo aparte.
+
+Los instrumentos se actualizan desde el event loop y el servidor (Flask) solo
+los lee. Los gauges que dependen del estado del bot (clientes de voz, colas,
+cachés...) los calculan los colectores que registra cada cog, en el loop y cada
+METRICS_INTERVAL segundos, para no tocar ese estado desde otro hilo.
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9464))  # 0 = sin servidor; cada cluster usa puerto + su id
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", 5))
+LOOP_LAG_PROBE = 0.5  # Cada cuánto se mide el retraso del event loop
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _etiquetas(nombres, valores, extra=''):
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor))
+
+
+class Metric:
+    tipo = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def _clave(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} espera las etiquetas {self.labelnames}, no {tuple(labels)}")
+        return tuple(str(labels[nombre]) for nombre in self.labelnames)
+
+    def clear(self):
+        with self._lock:
+            self._valores.clear()
+
+    def render(self):
+        lineas = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.tipo}']
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.extend(self._muestras(clave, valor))
+        return lineas
+
+    def _muestras(self, clave, valor):
+        return [f'{self.name}{_etiquetas(self.labelnames, clave)} {_numero(valor)}']
+
+
+class Counter(Metric):
+    tipo = 'counter'
+
+    def inc(self, amount=1, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + amount
+
+
+class Gauge(Metric):
+    tipo = 'gauge'
+
+    def set(self, value, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._valores[clave] = value
+
+    def inc(self, amount=1, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    tipo = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        clave = self._clave(labels)
+        with self._lock:
+            datos = self._valores.get(clave)
+            if datos is None:
+                datos = self._valores[clave] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if value <= limite:
+                    datos[0][i] += 1
+                    break
+            datos[1] += value
+            datos[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observa la duración del bloque (también si lanza una excepción)."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **labels)
+
+    def _muestras(self, clave, datos):
+        conteos, suma, total = datos
+        lineas, acumulado = [], 0
+        for limite, conteo in zip(self.buckets, conteos):
+            acumulado += conteo
+            le = _etiquetas(self.labelnames, clave, f'le="{_numero(limite)}"')
+            lineas.append(f'{self.name}_bucket{le} {acumulado}')
+        etiquetas = _etiquetas(self.labelnames, clave)
+        lineas.append(f'{self.name}_sum{etiquetas} {_numero(suma)}')
+        lineas.append(f'{self.name}_count{etiquetas} {total}')
+        return lineas
+
+
+class MetricsRegistry:
+    """Instrumentos por nombre. Volver a pedir un nombre devuelve el mismo (recargar un cog no duplica)."""
+
+    def __init__(self):
+        self._metricas = {}
+        self._colectores = []
+        self._lock = threading.Lock()
+
+    def _registrar(self, clase, name, *args, **kwargs):
+        with self._lock:
+            metrica = self._metricas.get(name)
+            if metrica is None:
+                metrica = self._metricas[name] = clase(name, *args, **kwargs)
+            elif not isinstance(metrica, clase):
+                raise ValueError(f"{name} ya está registrada como {metrica.tipo}")
+            return metrica
+
+    def counter(self, name, help, labels=()):
+        return self._registrar(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._registrar(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._registrar(Histogram, name, help, labels, buckets)
+
+    def add_collector(self, funcion):
+        """funcion() actualiza gauges; se llama en el event loop antes de cada muestreo."""
+        self._colectores.append(funcion)
+
+    def remove_collector(self, funcion):
+        if funcion in self._colectores:
+            self._colectores.remove(funcion)
+
+    def collect(self):
+        for funcion in list(self._colectores):
+            try:
+                funcion()
+            except Exception as e:
+                logger.warning(f"Error en el colector de métricas {funcion.__qualname__}: {e}")
+
+    def render(self):
+        with self._lock:
+            metricas = sorted(self._metricas.values(), key=lambda m: m.name)
+        lineas = []
+        for metrica in metricas:
+            lineas.extend(metrica.render())
+        return '\n'.join(lineas) + '\n'
+
+
+registry = MetricsRegistry()
+
+COMMAND_SECONDS = registry.histogram(
+    'archeon_command_seconds', "Duración de los comandos", ('command',)
+)
+COMMANDS_TOTAL = registry.counter(
+    'archeon_commands_total', "Comandos ejecutados por resultado", ('command', 'status')
+)
+EXTERNAL_SECONDS = registry.histogram(
+    'archeon_external_call_seconds', "Duración de las llamadas externas (yt-dlp, Gemini...)", ('call',)
+)
+EXTERNAL_ERRORS = registry.counter(
+    'archeon_external_call_errors_total', "Llamadas externas que terminaron en error", ('call',)
+)
+DISCORD_REST_SECONDS = registry.histogram(
+    'archeon_discord_rest_seconds', "Duración de las peticiones REST a Discord", ('method', 'route')
+)
+DISCORD_REST_TOTAL = registry.counter(
+    'archeon_discord_rest_requests_total', "Peticiones REST a Discord por código de respuesta",
+    ('method', 'route', 'status')
+)
+LOOP_LAG = registry.histogram(
+    'archeon_event_loop_lag_seconds', "Retraso del event loop al despertar de un sleep",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+)
+
+
+@contextmanager
+def llamada_externa(nombre):
+    """Mide una llamada externa y cuenta sus errores (las cancelaciones no cuentan)."""
+    with EXTERNAL_SECONDS.time(call=nombre):
+        try:
+            yield
+        except Exception:
+            EXTERNAL_ERRORS.inc(call=nombre)
+            raise
+
+
+async def medir_llamada(nombre, awaitable):
+    """Como llamada_externa(), para esperar un future o corrutina ya creados."""
+    with llamada_externa(nombre):
+        return await awaitable
+
+
+# Ids y tokens fuera de la ruta: si no, cada canal o interacción sería una serie distinta
+_RUTA_ID = re.compile(r'/\d{15,}')
+_RUTA_TOKEN = re.compile(r'(/(?:webhooks|interactions)/:id)/[^/]+')
+_RUTA_VERSION = re.compile(r'^/api/v\d+')
+
+
+def ruta_discord(path):
+    return _RUTA_TOKEN.sub(r'\1/:token', _RUTA_ID.sub('/:id', _RUTA_VERSION.sub('', path)))
+
+
+def trace_discord_rest():
+    """aiohttp.TraceConfig para el `http_trace` del cliente de discord.py."""
+    import aiohttp
+
+    async def al_empezar(session, ctx, params):
+        ctx.inicio = time.perf_counter()
+
+    async def al_terminar(session, ctx, params):
+        ruta = ruta_discord(params.url.path)
+        DISCORD_REST_SECONDS.observe(time.perf_counter() - ctx.inicio, method=params.method, route=ruta)
+        DISCORD_REST_TOTAL.inc(method=params.method, route=ruta, status=params.response.status)
+
+    async def al_fallar(session, ctx, params):
+        ruta = ruta_discord(params.url.path)
+        DISCORD_REST_SECONDS.observe(time.perf_counter() - ctx.inicio, method=params.method, route=ruta)
+        DISCORD_REST_TOTAL.inc(method=params.method, route=ruta, status='error')
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(al_empezar)
+    trace.on_request_end.append(al_terminar)
+    trace.on_request_exception.append(al_fallar)
+    return trace
+
+
+async def muestrear(registry=registry, intervalo=METRICS_INTERVAL):
+    """Mide el retraso del loop de forma continua y ejecuta los colectores cada `intervalo` s."""
+    loop = asyncio.get_running_loop()
+    siguiente = loop.time()
+    while True:
+        inicio = loop.time()
+        await asyncio.sleep(LOOP_LAG_PROBE)
+        LOOP_LAG.observe(max(0.0, loop.time() - inicio - LOOP_LAG_PROBE))
+        if loop.time() >= siguiente:
+            registry.collect()
+            siguiente = loop.time() + intervalo
+
+
+def servir(registry=registry, host=METRICS_HOST, port=METRICS_PORT):
+    """Sirve /metrics en un hilo demonio; devuelve el servidor (para shutdown())."""
+    from flask import Flask, Response
+    from werkzeug.serving import make_server
+
+    app = Flask('archeon-metrics')
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # Sin una línea de log por cada scrape
+    server = make_server(host, port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Métricas en http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,191 @@
+"""Diagnóstico del event loop: detector de bloqueos y perfilador por muestreo.
+
+Los dos miran desde un hilo aparte la pila del hilo del loop (sys._current_frames)
+y atribuyen lo que ven al comando que la está ejecutando. Para eso Archeon
+anota en `tareas_comando` qué comando corre en cada tarea.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import Counter, deque
+
+from core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_STALL_THRESHOLD = float(os.getenv("LOOP_STALL_THRESHOLD", 0.25))  # Segundos sin que el loop responda
+LOOP_STALL_CHECK = 0.05
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+PROFILE_MAX_SECONDS = 120
+
+STALLS = registry.counter('archeon_event_loop_stalls_total', "Bloqueos del event loop por encima del umbral", ('origin',))
+STALL_SECONDS = registry.histogram(
+    'archeon_event_loop_stall_seconds', "Duración de los bloqueos del event loop",
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 30, 60)
+)
+
+tareas_comando = weakref.WeakKeyDictionary()  # asyncio.Task -> nombre del comando
+
+# Marcos en los que el loop está esperando eventos (no bloqueado por nadie)
+_ESPERA_LOOP = {('selectors.py', 'select'), ('base_events.py', '_run_once')}
+
+
+def origen_de(loop):
+    """Quién ocupa el loop ahora: el comando, la corrutina de la tarea o '(callbacks)'."""
+    try:
+        tarea = asyncio.current_task(loop)
+    except RuntimeError:
+        tarea = None
+    if tarea is None:
+        return '(callbacks)'
+    comando = tareas_comando.get(tarea)
+    if comando is not None:
+        return comando
+    return f"tarea:{getattr(tarea.get_coro(), '__qualname__', tarea.get_name())}"
+
+
+def _nombre_marco(frame):
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+
+def pila_plegada(frame):
+    """'a;b;c' de la raíz a la hoja, el formato de flamegraph.pl/speedscope."""
+    marcos = []
+    while frame is not None:
+        marcos.append(_nombre_marco(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(marcos))
+
+
+def _esperando(frame):
+    return frame is not None and (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _ESPERA_LOOP
+
+
+class LoopWatchdog:
+    """Avisa cuando el loop pasa más de `threshold` segundos sin atender su latido.
+
+    Una tarea del loop actualiza el latido; un hilo lo vigila y, si se atrasa,
+    guarda la pila del hilo del loop en ese momento (la del código que bloquea)
+    y el comando responsable. Al volver el loop registra cuánto duró.
+    """
+
+    def __init__(self, threshold=LOOP_STALL_THRESHOLD):
+        self.threshold = threshold
+        self.recientes = deque(maxlen=20)  # (hora, segundos, origen, pila)
+        self._latido = time.monotonic()
+        self._loop = None
+        self._hilo_loop = None
+        self._tarea = None
+        self._parar = threading.Event()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._hilo_loop = threading.get_ident()
+        self._tarea = asyncio.create_task(self._latir())
+        threading.Thread(target=self._vigilar, name='loop-watchdog', daemon=True).start()
+
+    def stop(self):
+        self._parar.set()
+        if self._tarea is not None:
+            self._tarea.cancel()
+
+    async def _latir(self):
+        while True:
+            self._latido = time.monotonic()
+            await asyncio.sleep(LOOP_STALL_CHECK)
+
+    def _vigilar(self):
+        bloqueo = None  # (inicio, origen, pila) del bloqueo en curso
+        while not self._parar.wait(LOOP_STALL_CHECK):
+            atraso = time.monotonic() - self._latido
+            if atraso > self.threshold and bloqueo is None:
+                frame = sys._current_frames().get(self._hilo_loop)
+                if _esperando(frame):
+                    continue  # El loop está en select(): es el latido el que va tarde, no hay bloqueo
+                origen = origen_de(self._loop)
+                pila = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+                bloqueo = (self._latido, origen, pila)
+                logger.warning(f"Event loop bloqueado más de {self.threshold:.2f} s por {origen}:\n{pila}")
+            elif atraso <= self.threshold and bloqueo is not None:
+                inicio, origen, pila = bloqueo
+                duracion = self._latido - inicio
+                STALLS.inc(origin=origen)
+                STALL_SECONDS.observe(duracion)
+                self.recientes.append((time.time(), duracion, origen, pila))
+                logger.warning(f"Event loop bloqueado {duracion:.2f} s por {origen}")
+                bloqueo = None
+
+
+class SamplingProfiler:
+    """Muestrea la pila del hilo del loop cada `interval` segundos durante un tiempo dado."""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.muestras = Counter()  # (origen, pila plegada) -> nº de muestras
+        self.inactivo = 0
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._lock.locked()
+
+    async def run(self, segundos):
+        """Perfila durante `segundos` (sin bloquear el loop) y devuelve self."""
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("Ya hay un perfilado en curso")
+        try:
+            self.muestras.clear()
+            self.inactivo = 0
+            loop = asyncio.get_running_loop()
+            parar = threading.Event()
+            hilo = threading.Thread(
+                target=self._muestrear, args=(loop, threading.get_ident(), parar), name='profiler', daemon=True
+            )
+            hilo.start()
+            try:
+                await asyncio.sleep(min(segundos, PROFILE_MAX_SECONDS))
+            finally:
+                parar.set()
+                await asyncio.to_thread(hilo.join)
+            return self
+        finally:
+            self._lock.release()
+
+    def _muestrear(self, loop, hilo_loop, parar):
+        while not parar.wait(self.interval):
+            frame = sys._current_frames().get(hilo_loop)
+            if frame is None:
+                continue
+            if _esperando(frame):
+                self.inactivo += 1
+                continue
+            self.muestras[(origen_de(loop), pila_plegada(frame))] += 1
+
+    def total(self):
+        return sum(self.muestras.values()) + self.inactivo
+
+    def por_origen(self):
+        """{origen: nº de muestras}, de mayor a menor."""
+        totales = Counter()
+        for (origen, _), n in self.muestras.items():
+            totales[origen] += n
+        return dict(totales.most_common())
+
+    def funciones_propias(self, origen, limite=5):
+        """Funciones hoja (tiempo propio) más frecuentes de un origen."""
+        hojas = Counter()
+        for (o, pila), n in self.muestras.items():
+            if o == origen:
+                hojas[pila.rsplit(';', 1)[-1]] += n
+        return hojas.most_common(limite)
+
+    def plegado(self):
+        """Pilas plegadas con el origen como raíz, una por línea: 'origen;a;b;c N'."""
+        return '\n'.join(
+            f"{origen};{pila} {n}" for (origen, pila), n in self.muestras.most_common()
+        ) + '\n'
@@ -0,0 +1,44 @@
+"""Llamadas REST de Discord en paralelo con límite por ruta."""
+import asyncio
+
+# Llamadas simultáneas por ruta REST (discord.py ya respeta los buckets; esto evita ráfagas de 429)
+ROUTE_CONCURRENCY = {
+    'create_channel': 2,
+    'move_member': 5,
+    'delete_channel': 2,
+    'set_permissions': 5,
+}
+
+
+class DiscordScheduler:
+    """Ejecuta llamadas REST de Discord en paralelo con un límite por ruta y servidor."""
+
+    def __init__(self, limites=ROUTE_CONCURRENCY, por_defecto=3):
+        self.limites = limites
+        self.por_defecto = por_defecto
+        self._semaforos = {}  # (ruta, servidor) -> [semáforo, llamadas dentro o esperando]
+
+    async def run(self, route, guild_id, llamada):
+        clave = (route, guild_id)
+        entrada = self._semaforos.get(clave)
+        if entrada is None:
+            entrada = self._semaforos[clave] = [asyncio.Semaphore(self.limites.get(route, self.por_defecto)), 0]
+        entrada[1] += 1
+        try:
+            async with entrada[0]:
+                return await llamada()
+        finally:
+            # Sin nadie dentro ni esperando se descarta: si no, queda uno por cada servidor y ruta usados
+            entrada[1] -= 1
+            if not entrada[1]:
+                del self._semaforos[clave]
+
+    async def gather(self, route, guild_id, llamadas):
+        """Lanza todas las llamadas; devuelve resultados o excepciones en el mismo orden."""
+        return await asyncio.gather(
+            *(self.run(route, guild_id, llamada) for llamada in llamadas),
+            return_exceptions=True
+        )
+
+
+scheduler = DiscordScheduler()
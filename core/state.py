@@ -0,0 +1,135 @@
+"""Estado compartido entre clusters (procesos) del bot.
+
+Lo que pertenece a un servidor vive en el cluster que tiene su shard; esto es
+para lo que no: la memoria de ¡charla de un usuario o los latidos de cada
+cluster. ARCHEON_STATE_STORE elige la implementación:
+
+- sqlite (por defecto): tabla en la base compartida, válida para varios procesos en la misma máquina.
+- memory: diccionario en memoria, para un solo proceso (o pruebas).
+"""
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+
+from core.storage import db
+
+STATE_STORE = os.getenv("ARCHEON_STATE_STORE", "sqlite")
+
+
+class StateStore(ABC):
+    """Almacén clave/valor por espacio de nombres; los valores son JSON y pueden caducar."""
+
+    @abstractmethod
+    async def get(self, namespace, key):
+        ...
+
+    @abstractmethod
+    async def set(self, namespace, key, value, ttl=None):
+        ...
+
+    @abstractmethod
+    async def delete(self, namespace, key):
+        ...
+
+    @abstractmethod
+    async def items(self, namespace):
+        """{clave: valor} de todas las entradas vigentes del espacio de nombres."""
+
+    @abstractmethod
+    async def purge(self):
+        """Borra las entradas caducadas."""
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self):
+        self._datos = {}  # namespace -> {key: (expira, valor)}
+
+    async def get(self, namespace, key):
+        item = self._datos.get(namespace, {}).get(str(key))
+        if item is None or (item[0] is not None and item[0] <= time.time()):
+            return None
+        return item[1]
+
+    async def set(self, namespace, key, value, ttl=None):
+        expira = time.time() + ttl if ttl else None
+        # Se guarda una copia serializada, como haría cualquier almacén externo
+        self._datos.setdefault(namespace, {})[str(key)] = (expira, json.loads(json.dumps(value)))
+
+    async def delete(self, namespace, key):
+        self._datos.get(namespace, {}).pop(str(key), None)
+
+    async def items(self, namespace):
+        ahora = time.time()
+        return {
+            key: valor
+            for key, (expira, valor) in self._datos.get(namespace, {}).items()
+            if expira is None or expira > ahora
+        }
+
+    async def purge(self):
+        ahora = time.time()
+        for entradas in self._datos.values():
+            for key in [k for k, (expira, _) in entradas.items() if expira is not None and expira <= ahora]:
+                del entradas[key]
+
+
+class SQLiteStateStore(StateStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS state (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            expira REAL,
+            PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db):
+        self.db = db
+        db.executescript(self.SCHEMA)
+
+    async def get(self, namespace, key):
+        filas = await self.db.run(
+            self.db.execute,
+            "SELECT value FROM state WHERE namespace = ? AND key = ? AND (expira IS NULL OR expira > ?)",
+            (namespace, str(key), time.time())
+        )
+        return json.loads(filas[0][0]) if filas else None
+
+    async def set(self, namespace, key, value, ttl=None):
+        await self.db.run(
+            self.db.execute,
+            "INSERT OR REPLACE INTO state VALUES (?, ?, ?, ?)",
+            (namespace, str(key), json.dumps(value, ensure_ascii=False, separators=(',', ':')),
+             time.time() + ttl if ttl else None)
+        )
+
+    async def delete(self, namespace, key):
+        await self.db.run(
+            self.db.execute, "DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, str(key))
+        )
+
+    async def items(self, namespace):
+        filas = await self.db.run(
+            self.db.execute,
+            "SELECT key, value FROM state WHERE namespace = ? AND (expira IS NULL OR expira > ?)",
+            (namespace, time.time())
+        )
+        return {key: json.loads(valor) for key, valor in filas}
+
+    async def purge(self):
+        await self.db.run(
+            self.db.execute, "DELETE FROM state WHERE expira IS NOT NULL AND expira <= ?", (time.time(),)
+        )
+
+
+def crear_state_store(tipo=STATE_STORE):
+    if tipo == 'memory':
+        return MemoryStateStore()
+    if tipo == 'sqlite':
+        return SQLiteStateStore(db)
+    raise ValueError(f"ARCHEON_STATE_STORE desconocido: {tipo!r} (usa 'sqlite' o 'memory')")
+
+
+state = crear_state_store()
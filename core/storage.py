@@ -0,0 +1,46 @@
+"""Conexión SQLite compartida por los almacenes del bot."""
+import asyncio
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.config import DATA_DIR
+
+DB_PATH = os.path.join(DATA_DIR, "archeon.db")
+
+
+class Database:
+    """Conexión SQLite compartida por los almacenes del bot.
+
+    Las consultas desde el event loop se hacen con `await db.run(...)`, que las
+    ejecuta en un único hilo dedicado; `execute` es la versión bloqueante.
+    """
+
+    def __init__(self, path=DB_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        # Con varios clusters, otros procesos escriben en el mismo archivo
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+
+    def execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def executemany(self, sql, rows):
+        with self._lock:
+            self._conn.executemany(sql, rows)
+
+    def executescript(self, script):
+        with self._lock:
+            self._conn.executescript(script)
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+
+db = Database()
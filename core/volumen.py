@@ -0,0 +1,289 @@
+"""Volumen por servidor y normalización de sonoridad por canción.
+
+La sonoridad de cada canción (LUFS integrados, ITU-R BS.1770: filtro K y
+doble umbral) se mide una sola vez sobre el PCM decodificado y se guarda en
+SQLite. Se mide al guardarla en la caché de audio, leyendo el contenedor; si
+la caché está desactivada, con un ffmpeg aparte que la decodifica a PCM.
+
+La ganancia (volumen del servidor por la corrección de sonoridad) la aplica
+GainTransformer: mientras es neutra los paquetes Opus pasan tal cual; si no,
+se decodifican, se multiplican con numpy y se vuelven a codificar
+(core.ganancia). Con el backend local eso ocurre en el hilo de audio del bot,
+y el cambio se oye en la siguiente trama; con el remoto, en el nodo de audio,
+y se oye cuando se agota lo que el nodo ya había adelantado (AUDIO_CREDITS).
+Nunca se relanza ffmpeg ni afecta a otros servidores.
+
+La normalización está desactivada por defecto (LOUDNESS_NORMALIZATION=1 la
+activa): pocas canciones quedan a menos de GANANCIA_NEUTRA_DB del
+objetivo, así que con ella la mayoría se transcodifica y se pierde el ahorro
+de copiar el Opus de YouTube tal cual. Con el volumen al 100 % y sin
+normalización no se transcodifica nada.
+"""
+import logging
+import math
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import discord
+import numpy as np
+
+from core.audio import AUDIO_BACKEND, RemoteAudioSource
+from core.cache_audio import FRAME_SECONDS, CacheCorrupta, CachedOpusSource, audio_cache
+from core.ganancia import GainStage
+from core.storage import db
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOLUME = float(os.getenv("DEFAULT_VOLUME", 100)) / 100
+LOUDNESS_NORMALIZATION = os.getenv("LOUDNESS_NORMALIZATION", "0") != "0"
+LOUDNESS_TARGET = float(os.getenv("LOUDNESS_TARGET", -14))  # LUFS; el mismo nivel que usa YouTube
+LOUDNESS_MAX_BOOST = float(os.getenv("LOUDNESS_MAX_BOOST", 6))  # dB: subir más solo amplifica ruido y satura
+LOUDNESS_MAX_TRACK = float(os.getenv("LOUDNESS_MAX_TRACK", 1200))
+LOUDNESS_WORKERS = int(os.getenv("LOUDNESS_WORKERS", 1))
+LOUDNESS_CACHE_SIZE = int(os.getenv("LOUDNESS_CACHE_SIZE", 2048))  # Medidas que se guardan en memoria
+
+SAMPLE_RATE = 48000
+SUBBLOQUE = SAMPLE_RATE // 10  # 100 ms: los bloques de 400 ms se solapan un 75 %
+LECTURA_PCM = SUBBLOQUE * 4 * 10  # Bytes por lectura de la salida de ffmpeg (1 s de s16le estéreo)
+
+# Filtro K a 48 kHz (BS.1770-4): estante de altas y paso alto RLB, en una sola etapa
+FILTRO_K_B = np.convolve([1.53512485958697, -2.69169618940638, 1.19839281085285], [1.0, -2.0, 1.0])
+FILTRO_K_A = np.convolve([1.0, -1.69065929318241, 0.73248077421585], [1.0, -1.99004745483398, 0.99007225036621])
+
+
+class GainTransformer(discord.AudioSource):
+    """Aplica la ganancia a una fuente Opus. read() corre en el hilo de audio de discord.py.
+
+    `ganancia` se consulta en cada trama. Con una fuente local la aplica aquí
+    GainStage (la salida siempre es Opus, así que no depende del encoder del
+    VoiceClient); con una RemoteAudioSource solo se le comunica al nodo cuando
+    cambia, y la transcodificación ocurre allí. Cuenta los paquetes leídos:
+    `posicion` es por dónde va la canción.
+    """
+
+    def __init__(self, original, ganancia, posicion=0.0):
+        self.original = original
+        self.ganancia = ganancia
+        self.tramas = round(posicion / FRAME_SECONDS)
+        self._etapa = None if isinstance(original, RemoteAudioSource) else GainStage()
+
+    def read(self):
+        paquete = self.original.read()
+        if not paquete:
+            return paquete
+        self.tramas += 1
+        if self._etapa is None:
+            self.original.ganancia = self.ganancia()  # Solo envía algo al nodo si cambió
+            return paquete
+        return self._etapa.procesar(paquete, self.ganancia())
+
+    @property
+    def posicion(self):
+        """Segundos de la canción ya enviados."""
+        return self.tramas * FRAME_SECONDS
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        self.original.cleanup()
+
+
+class MedidorSonoridad:
+    """Sonoridad integrada (BS.1770) de PCM s16le estéreo a 48 kHz que llega por trozos."""
+
+    def __init__(self):
+        from scipy.signal import lfilter
+
+        self._lfilter = lfilter
+        self._estado = np.zeros((len(FILTRO_K_A) - 1, 2))
+        self._resto = np.empty((0, 2))
+        self._bytes = b''  # Muestra estéreo partida entre dos trozos
+        self._energias = []  # Energía media de cada subbloque de 100 ms (suma de canales)
+
+    def añadir(self, pcm):
+        if self._bytes:
+            pcm = self._bytes + pcm
+        completos = len(pcm) // 4 * 4
+        self._bytes = pcm[completos:]
+        muestras = np.frombuffer(pcm[:completos], dtype='<i2').reshape(-1, 2) / 32768.0
+        filtradas, self._estado = self._lfilter(FILTRO_K_B, FILTRO_K_A, muestras, axis=0, zi=self._estado)
+        filtradas = np.concatenate((self._resto, filtradas))
+        n = len(filtradas) // SUBBLOQUE * SUBBLOQUE
+        self._energias.append((filtradas[:n] ** 2).reshape(-1, SUBBLOQUE, 2).mean(axis=1).sum(axis=1))
+        self._resto = filtradas[n:]
+
+    def resultado(self):
+        """LUFS, o None si es demasiado corta o es silencio."""
+        energias = np.concatenate(self._energias) if self._energias else np.empty(0)
+        if len(energias) < 4:
+            return None
+        bloques = (energias[:-3] + energias[1:-2] + energias[2:-1] + energias[3:]) / 4
+        bloques = bloques[bloques > 10 ** ((-70 + 0.691) / 10)]  # Umbral absoluto: -70 LUFS
+        if not len(bloques):
+            return None
+        relativo = -0.691 + 10 * math.log10(bloques.mean()) - 10
+        bloques = bloques[bloques > 10 ** ((relativo + 0.691) / 10)]
+        return -0.691 + 10 * math.log10(bloques.mean())
+
+
+class LoudnessStore:
+    """Sonoridad medida de cada canción (por su clave de caché) y la ganancia que le corresponde.
+
+    Las medidas se hacen en un pool aparte y no bloquean la reproducción: una
+    canción que aún no se ha medido suena con ganancia 1. Las medidas viven en
+    SQLite; en memoria solo se guardan las `maxsize` usadas más recientemente,
+    que cargar() trae de la base de datos antes de crear la fuente.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sonoridad (
+            clave TEXT PRIMARY KEY,
+            lufs REAL,
+            medido REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db, objetivo=LOUDNESS_TARGET, max_boost=LOUDNESS_MAX_BOOST,
+                 workers=LOUDNESS_WORKERS, maxsize=LOUDNESS_CACHE_SIZE, enabled=LOUDNESS_NORMALIZATION):
+        self.db = db
+        self.objetivo = objetivo
+        self.max_boost = max_boost
+        self.enabled = enabled
+        self.maxsize = maxsize
+        self.measured = 0
+        self.failed = 0
+        # El loop, el hilo de la caché de audio y los de las medidas usan _lufs y _midiendo
+        self._lock = threading.Lock()
+        self._lufs = OrderedDict()  # LRU: clave -> LUFS (None: silencio o demasiado corta)
+        self._midiendo = set()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='loudness')
+        if enabled:
+            db.executescript(self.SCHEMA)
+            self.measured = db.execute("SELECT COUNT(*) FROM sonoridad")[0][0]
+            audio_cache.al_guardar.append(self._guardada)
+
+    async def cargar(self, clave):
+        """Trae de SQLite la medida de la canción, si la hay y no está ya en memoria."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if clave in self._lufs:
+                self._lufs.move_to_end(clave)
+                return
+        filas = await self.db.run(self.db.execute, "SELECT lufs FROM sonoridad WHERE clave = ?", (clave,))
+        if filas:
+            self._recordar(clave, filas[0][0])
+
+    def ganancia(self, clave):
+        """Factor que lleva la canción al nivel objetivo (1.0 si no está medida o no se ha cargado)."""
+        with self._lock:
+            lufs = self._lufs.get(clave) if self.enabled else None
+        if lufs is None:
+            return 1.0
+        return 10 ** (min(self.objetivo - lufs, self.max_boost) / 20)
+
+    def reproducida(self, clave, cancion, before_options, executable):
+        """Llamar al empezar a sonar una canción (en el loop): programa su medida si falta."""
+        if not self.enabled or self._conocida(clave):
+            return
+        path = audio_cache.archivo(clave)
+        if path is not None:
+            self._programar(clave, self._medir_contenedor, path)
+        elif audio_cache.admite(cancion):
+            return  # Se mide cuando termine de guardarse en la caché
+        elif AUDIO_BACKEND == 'local' and cancion.url and 0 < cancion.duration <= LOUDNESS_MAX_TRACK:
+            self._programar(clave, self._medir_stream, cancion.url, before_options, executable)
+
+    def _guardada(self, clave, path):
+        # Llamado desde el hilo de la caché de audio
+        self._programar(clave, self._medir_contenedor, path)
+
+    def _conocida(self, clave):
+        with self._lock:
+            return clave in self._lufs or clave in self._midiendo
+
+    def _programar(self, clave, medir, *args):
+        # Comprobar y apuntar a la vez: reproducida() y _guardada() pueden coincidir con la misma canción
+        with self._lock:
+            if clave in self._lufs or clave in self._midiendo:
+                return
+            self._midiendo.add(clave)
+        futuro = self._executor.submit(self._medir, clave, medir, *args)
+        futuro.add_done_callback(lambda f: self._terminada(clave))
+
+    def _terminada(self, clave):
+        with self._lock:
+            self._midiendo.discard(clave)
+
+    def _recordar(self, clave, lufs):
+        with self._lock:
+            self._lufs[clave] = lufs
+            self._lufs.move_to_end(clave)
+            while len(self._lufs) > self.maxsize:
+                self._lufs.popitem(last=False)
+
+    def _medir(self, clave, medir, *args):
+        # Puede estar medida aunque ya no esté en memoria
+        filas = self.db.execute("SELECT lufs FROM sonoridad WHERE clave = ?", (clave,))
+        if filas:
+            self._recordar(clave, filas[0][0])
+            return
+        medidor = MedidorSonoridad()
+        inicio = time.perf_counter()
+        try:
+            medir(medidor, *args)
+        except (OSError, ValueError, CacheCorrupta, discord.DiscordException) as e:
+            self.failed += 1
+            logger.warning(f"Sonoridad: no se pudo medir {clave}: {e}")
+            return
+        lufs = medidor.resultado()
+        self.db.execute("INSERT OR REPLACE INTO sonoridad VALUES (?, ?, ?)", (clave, lufs, time.time()))
+        self._recordar(clave, lufs)
+        self.measured += 1
+        logger.debug(f"Sonoridad de {clave}: {lufs} LUFS ({time.perf_counter() - inicio:.2f} s)")
+
+    def _medir_contenedor(self, medidor, path):
+        decoder = discord.opus.Decoder()
+        fuente = CachedOpusSource(path)
+        try:
+            while paquete := fuente.read():
+                medidor.añadir(decoder.decode(paquete))
+        finally:
+            fuente.cleanup()
+
+    def _medir_stream(self, medidor, url, before_options, executable):
+        proceso = subprocess.Popen(
+            [executable, *shlex.split(before_options or ''), '-i', url, '-vn',
+             '-f', 's16le', '-ar', str(SAMPLE_RATE), '-ac', '2', '-loglevel', 'error', 'pipe:1'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+        )
+        try:
+            while pcm := proceso.stdout.read(LECTURA_PCM):
+                medidor.añadir(pcm)
+            if proceso.wait(timeout=10):
+                raise OSError(f"ffmpeg salió con código {proceso.returncode}")
+        except subprocess.TimeoutExpired as e:
+            raise OSError(str(e)) from None
+        finally:
+            if proceso.poll() is None:
+                proceso.kill()
+                proceso.wait()
+
+    def stats(self):
+        return {
+            'measured': self.measured,
+            'cached': len(self._lufs),
+            'measuring': len(self._midiendo),  # Lecturas sueltas: basta un valor aproximado
+            'failed': self.failed,
+        }
+
+
+loudness_store = LoudnessStore(db)
@@ -0,0 +1,165 @@
+"""Lanza Archeon repartido en varios procesos (clusters), cada uno con un rango de shards.
+
+Uso:
+    python launcher.py                      # un cluster por núcleo, shards recomendados por Discord
+    python launcher.py --clusters 4 --shards 16
+    python launcher.py --audio-nodes 2      # además, dos nodos de audio (audio_node.py)
+
+Cada cluster es un `python bot.py` con ARCHEON_SHARD_IDS / ARCHEON_SHARD_COUNT /
+ARCHEON_CLUSTER_ID en el entorno. Si un cluster o un nodo muere se vuelve a lanzar.
+"""
+import argparse
+import asyncio
+import math
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from core.config import TOKEN
+
+IDENTIFY_INTERVAL = 5.0   # Discord permite max_concurrency IDENTIFY cada 5 s
+RESTART_DELAY_MAX = 60.0
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bot.py')
+AUDIO_NODE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'audio_node.py')
+AUDIO_NODE_PORT = int(os.getenv("AUDIO_NODE_PORT", 7070))
+
+
+async def info_gateway(token):
+    """(shards recomendados, max_concurrency) según GET /gateway/bot."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {token}"}
+        ) as response:
+            response.raise_for_status()
+            datos = await response.json()
+    return datos['shards'], datos['session_start_limit'].get('max_concurrency', 1)
+
+
+def repartir(shard_count, clusters):
+    """Rangos contiguos de shards, lo más parejos posible."""
+    base, extra = divmod(shard_count, clusters)
+    rangos, inicio = [], 0
+    for i in range(clusters):
+        fin = inicio + base + (1 if i < extra else 0)
+        rangos.append(list(range(inicio, fin)))
+        inicio = fin
+    return [r for r in rangos if r]
+
+
+class Proceso:
+    """Un proceso hijo que el launcher mantiene vivo."""
+
+    def __init__(self, nombre, argv, env):
+        self.nombre = nombre
+        self.argv = argv
+        self.env = env
+        self.proceso = None
+        self.reinicios = 0
+        self.lanzado = 0.0
+
+    def start(self):
+        self.proceso = subprocess.Popen(self.argv, env=self.env)
+        self.lanzado = time.monotonic()
+        print(f"[launcher] {self.nombre} pid {self.proceso.pid}")
+
+    def alive(self):
+        return self.proceso is not None and self.proceso.poll() is None
+
+    def stop(self):
+        if self.alive():
+            self.proceso.terminate()
+
+
+class Cluster(Proceso):
+    def __init__(self, cluster_id, shard_ids, shard_count, cluster_count, env=None):
+        self.cluster_id = cluster_id
+        self.shard_ids = shard_ids
+        super().__init__(
+            f"cluster {cluster_id} (shards {shard_ids})",
+            [sys.executable, BOT_SCRIPT],
+            dict(
+                env or os.environ,
+                ARCHEON_CLUSTER_ID=str(cluster_id),
+                ARCHEON_CLUSTER_COUNT=str(cluster_count),
+                ARCHEON_SHARD_IDS=','.join(map(str, shard_ids)),
+                ARCHEON_SHARD_COUNT=str(shard_count),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lanza Archeon en varios procesos")
+    parser.add_argument('--clusters', type=int, default=os.cpu_count() or 1, help="Número de procesos")
+    parser.add_argument('--shards', type=int, default=0, help="Total de shards (0 = lo que recomiende Discord)")
+    parser.add_argument('--audio-nodes', type=int, default=0, help="Nodos de audio a lanzar (0 = audio en cada cluster)")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    nodos = [
+        Proceso(f"nodo de audio {i}", [sys.executable, AUDIO_NODE_SCRIPT, '--listen', f"127.0.0.1:{AUDIO_NODE_PORT + i}"], dict(os.environ))
+        for i in range(args.audio_nodes)
+    ]
+    if nodos:
+        env.update(
+            AUDIO_BACKEND='remote',
+            AUDIO_NODES=','.join(f"127.0.0.1:{AUDIO_NODE_PORT + i}" for i in range(len(nodos)))
+        )
+
+    shard_count, max_concurrency = asyncio.run(info_gateway(TOKEN))
+    shard_count = args.shards or shard_count
+    rangos = repartir(shard_count, max(1, args.clusters))
+    clusters = [Cluster(i, shard_ids, shard_count, len(rangos), env) for i, shard_ids in enumerate(rangos)]
+    print(f"[launcher] {shard_count} shards en {len(clusters)} clusters, {len(nodos)} nodos de audio")
+
+    detener = False
+
+    def al_recibir_senal(signum, frame):
+        nonlocal detener
+        detener = True
+
+    signal.signal(signal.SIGINT, al_recibir_senal)
+    signal.signal(signal.SIGTERM, al_recibir_senal)
+
+    # Los nodos de audio arrancan primero: los clusters se conectan a ellos al cargar la música
+    for nodo in nodos:
+        nodo.start()
+
+    # Escalonar los arranques: los IDENTIFY de todos los procesos comparten el mismo límite
+    for cluster in clusters:
+        if detener:
+            break
+        cluster.start()
+        time.sleep(IDENTIFY_INTERVAL * math.ceil(len(cluster.shard_ids) / max_concurrency))
+
+    while not detener:
+        for hijo in nodos + clusters:
+            if hijo.alive() or detener:
+                continue
+            # Backoff si el proceso se cae nada más arrancar (token inválido, error de código...)
+            estable = time.monotonic() - hijo.lanzado > RESTART_DELAY_MAX
+            hijo.reinicios = 0 if estable else hijo.reinicios + 1
+            espera = min(RESTART_DELAY_MAX, IDENTIFY_INTERVAL * 2 ** hijo.reinicios)
+            print(f"[launcher] {hijo.nombre} terminó ({hijo.proceso.returncode}); reinicio en {espera:.0f} s")
+            time.sleep(espera)
+            if not detener:
+                hijo.start()
+        time.sleep(1)
+
+    print("[launcher] deteniendo clusters...")
+    for hijo in clusters + nodos:
+        hijo.stop()
+    for hijo in clusters + nodos:
+        if hijo.proceso is not None:
+            try:
+                hijo.proceso.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                hijo.proceso.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+"""Los módulos de core/ leen la configuración del entorno al importarse: antes de importarlos,
+los datos (SQLite, caché de audio) van a un directorio temporal."""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['ARCHEON_DATA_DIR'] = tempfile.mkdtemp(prefix='archeon-tests-')
+os.environ['ARCHEON_STATE_STORE'] = 'memory'
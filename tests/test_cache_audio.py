@@ -0,0 +1,82 @@
+"""Contenedor de la caché de audio: escritura, lectura desde mmap, salto de posición y CRC."""
+import os
+
+import pytest
+
+from core.cache_audio import CABECERA, FRAME_SECONDS, CacheCorrupta, CachedOpusSource, escribir_contenedor
+
+PAQUETES = [bytes([i % 256]) * (i % 300 + 1) for i in range(500)]
+
+
+def leer_todo(fuente):
+    paquetes = []
+    while paquete := fuente.read():
+        paquetes.append(paquete)
+    return paquetes
+
+
+@pytest.fixture
+def contenedor(tmp_path):
+    path = str(tmp_path / 'cancion.opk')
+    n, tamaño = escribir_contenedor(path, iter(PAQUETES))
+    assert n == len(PAQUETES)
+    assert tamaño == os.path.getsize(path)
+    return path
+
+
+def test_ida_y_vuelta(contenedor):
+    cerradas = []
+    fuente = CachedOpusSource(contenedor, al_cerrar=cerradas.append)
+    assert fuente.paquetes == len(PAQUETES)
+    assert leer_todo(fuente) == PAQUETES
+    assert not fuente.corrupta
+    fuente.cleanup()
+    assert cerradas == [False]
+
+
+def test_posicion_salta_paquetes(contenedor):
+    fuente = CachedOpusSource(contenedor, posicion=100 * FRAME_SECONDS)
+    assert leer_todo(fuente) == PAQUETES[100:]
+    fuente.cleanup()
+
+
+def test_no_quedan_temporales(contenedor):
+    assert os.listdir(os.path.dirname(contenedor)) == ['cancion.opk']
+
+
+def test_contenedor_vacio(tmp_path):
+    path = str(tmp_path / 'vacia.opk')
+    assert escribir_contenedor(path, []) == (0, CABECERA.size)
+    fuente = CachedOpusSource(path)
+    assert fuente.read() == b''
+    assert not fuente.corrupta
+    fuente.cleanup()
+
+
+def test_crc_detecta_datos_cambiados(contenedor):
+    with open(contenedor, 'r+b') as f:
+        f.seek(CABECERA.size + 1000)
+        byte = f.read(1)
+        f.seek(-1, os.SEEK_CUR)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    cerradas = []
+    fuente = CachedOpusSource(contenedor, al_cerrar=cerradas.append)
+    leer_todo(fuente)
+    assert fuente.corrupta
+    fuente.cleanup()
+    assert cerradas == [True]
+
+
+def test_archivo_truncado(contenedor):
+    with open(contenedor, 'r+b') as f:
+        f.truncate(os.path.getsize(contenedor) - 10)
+    with pytest.raises(CacheCorrupta):
+        CachedOpusSource(contenedor)
+
+
+def test_cabecera_desconocida(contenedor):
+    with open(contenedor, 'r+b') as f:
+        f.write(b'OTRACOSA')
+    with pytest.raises(CacheCorrupta):
+        CachedOpusSource(contenedor)
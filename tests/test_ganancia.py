@@ -0,0 +1,61 @@
+"""GainStage con un libopus simulado: paso directo con ganancia neutra, rampa y saturación."""
+import discord
+import numpy as np
+import pytest
+
+from core.ganancia import GainStage, aplicar_ganancia, es_neutra
+
+TRAMA = 960
+
+
+def pcm(valor):
+    return np.full(TRAMA * 2, valor, dtype='<i2').tobytes()
+
+
+def muestras(datos):
+    return np.frombuffer(datos, dtype='<i2')
+
+
+class DecoderSimulado:
+    def decode(self, paquete):
+        return pcm(int.from_bytes(paquete, 'big', signed=True))
+
+
+class EncoderSimulado:
+    def encode(self, datos, frame_size):
+        assert frame_size == TRAMA
+        return int(muestras(datos)[-1]).to_bytes(2, 'big', signed=True)
+
+
+@pytest.fixture
+def opus_simulado(monkeypatch):
+    monkeypatch.setattr(discord.opus, 'Decoder', DecoderSimulado)
+    monkeypatch.setattr(discord.opus, 'Encoder', EncoderSimulado)
+
+
+def test_es_neutra():
+    assert es_neutra(1.0)
+    assert es_neutra(10 ** (0.2 / 20))
+    assert not es_neutra(10 ** (0.3 / 20))
+    assert not es_neutra(0.0)
+
+
+def test_aplicar_ganancia_con_rampa():
+    salida = muestras(aplicar_ganancia(pcm(1000), 0.5, 1.0)).reshape(-1, 2)
+    assert tuple(salida[0]) == (1000, 1000)
+    assert tuple(salida[-1]) == (500, 500)
+    assert np.all(np.diff(salida[:, 0]) <= 0)
+
+
+def test_aplicar_ganancia_satura():
+    assert set(muestras(aplicar_ganancia(pcm(20000), 4.0, 4.0))) == {32767}
+    assert set(muestras(aplicar_ganancia(pcm(-20000), 4.0, 4.0))) == {-32768}
+
+
+def test_gain_stage(opus_simulado):
+    etapa = GainStage()
+    paquete = (1000).to_bytes(2, 'big', signed=True)
+    assert etapa.procesar(paquete, 1.0) is paquete  # Neutra: ni se decodifica
+    assert etapa.procesar(paquete, 0.5) == (500).to_bytes(2, 'big', signed=True)
+    assert etapa.procesar(paquete, 1.0) == paquete  # La rampa de vuelta aún pasa por el encoder
+    assert etapa.procesar(paquete, 1.0) is paquete
@@ -0,0 +1,53 @@
+"""StreamingReply: ningún mensaje pasa del límite de Discord, con el cursor incluido."""
+import asyncio
+
+import pytest
+
+from cogs.ia import DISCORD_MESSAGE_LIMIT, StreamingReply
+
+
+class Mensaje:
+    def __init__(self, canal, content):
+        self.canal = canal
+        self.content = content
+
+    async def edit(self, content):
+        assert len(content) <= DISCORD_MESSAGE_LIMIT, f"edición de {len(content)} caracteres"
+        self.content = content
+
+
+class Canal:
+    def __init__(self):
+        self.mensajes = []
+
+    async def send(self, content):
+        self.mensajes.append(Mensaje(self, content))
+        return self.mensajes[-1]
+
+
+def responder(fragmentos):
+    async def probar():
+        canal = Canal()
+        reply = StreamingReply(canal)
+        await reply.start()
+        for fragmento in fragmentos:
+            await reply.feed(fragmento)
+            await reply.flush()
+        return canal, await reply.finish()
+
+    return asyncio.run(probar())
+
+
+@pytest.mark.parametrize('longitud', [DISCORD_MESSAGE_LIMIT - 2, DISCORD_MESSAGE_LIMIT - 1, DISCORD_MESSAGE_LIMIT])
+def test_texto_en_el_limite(longitud):
+    texto = 'a' * (longitud - 1)  # start() deja el prefijo vacío seguido de un espacio
+    canal, respuesta = responder([texto])
+    assert respuesta == texto
+    assert ''.join(m.content for m in canal.mensajes).replace(' ', '') == texto
+
+
+def test_respuesta_larga_en_varios_mensajes():
+    palabras = ['palabra'] * 1000
+    canal, respuesta = responder([p + ' ' for p in palabras])
+    assert len(canal.mensajes) > 1
+    assert ' '.join(m.content.strip() for m in canal.mensajes).split() == palabras
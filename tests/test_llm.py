@@ -0,0 +1,82 @@
+"""Control de admisión de la IA: token buckets por usuario, por servidor y global."""
+import asyncio
+
+import pytest
+
+from core.llm import AI_USER_BURST, AdmissionController, RateLimited, TokenBucket
+
+
+def test_token_bucket():
+    cubo = TokenBucket(rate=2, capacity=3)
+    ahora = cubo.updated
+    for _ in range(3):
+        assert cubo.wait_time(ahora) == 0
+        cubo.consume()
+    assert cubo.wait_time(ahora) == pytest.approx(0.5)
+    assert cubo.wait_time(ahora + 0.5) == pytest.approx(0)
+    assert cubo.wait_time(ahora + 100) == 0
+    assert cubo.tokens == 3  # No acumula más que la capacidad
+
+
+def test_token_bucket_drain():
+    cubo = TokenBucket(rate=1, capacity=10)
+    cubo.drain(4)
+    assert cubo.wait_time(cubo.updated) == pytest.approx(4)
+
+
+def test_usuario_se_rechaza_al_instante():
+    async def probar():
+        limiter = AdmissionController()
+        for _ in range(int(AI_USER_BURST)):
+            await limiter.acquire(user_id=1, guild_id=1)
+        with pytest.raises(RateLimited) as error:
+            await limiter.acquire(user_id=1, guild_id=1, max_wait=60)
+        assert error.value.scope == 'usuario'
+        assert error.value.retry_after > 0
+        await limiter.acquire(user_id=2, guild_id=1)  # Los demás usuarios siguen entrando
+        return limiter
+
+    limiter = asyncio.run(probar())
+    assert limiter.rejected == 1
+    assert limiter.queued == 0
+
+
+def test_limite_global_hace_esperar():
+    async def probar():
+        limiter = AdmissionController()
+        limiter._global = TokenBucket(rate=50, capacity=1)
+        await limiter.acquire()
+        inicio = asyncio.get_running_loop().time()
+        await limiter.acquire(max_wait=1)
+        return limiter, asyncio.get_running_loop().time() - inicio
+
+    limiter, espera = asyncio.run(probar())
+    assert espera == pytest.approx(0.02, abs=0.015)
+    assert limiter.queued == 1
+    assert limiter.rejected == 0
+
+
+def test_limite_global_rechaza_si_la_espera_es_larga():
+    async def probar():
+        limiter = AdmissionController()
+        limiter.penalize(30)  # Un 429 de la API
+        with pytest.raises(RateLimited) as error:
+            await limiter.acquire(max_wait=1)
+        return error.value
+
+    error = asyncio.run(probar())
+    assert error.scope == 'global'
+    assert error.retry_after == pytest.approx(30, abs=0.5)
+
+
+def test_servidor_limita_a_sus_usuarios():
+    async def probar():
+        limiter = AdmissionController()
+        limiter._servidores[7] = TokenBucket(rate=0.001, capacity=1)
+        await limiter.acquire(user_id=1, guild_id=7)
+        with pytest.raises(RateLimited) as error:
+            await limiter.acquire(user_id=2, guild_id=7, max_wait=0)
+        await limiter.acquire(user_id=2, guild_id=8)
+        return error.value
+
+    assert asyncio.run(probar()).scope == 'servidor'
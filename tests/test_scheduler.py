@@ -0,0 +1,28 @@
+"""DiscordScheduler: límite de llamadas simultáneas por ruta y servidor."""
+import asyncio
+
+from core.scheduler import DiscordScheduler
+
+
+def test_limite_por_ruta_y_semaforos_descartados():
+    scheduler = DiscordScheduler({'move_member': 2})
+    dentro, maximo = 0, 0
+
+    async def llamada(i):
+        nonlocal dentro, maximo
+        dentro += 1
+        maximo = max(maximo, dentro)
+        await asyncio.sleep(0.01)
+        dentro -= 1
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    async def main():
+        resultados = await scheduler.gather('move_member', 1, [lambda i=i: llamada(i) for i in range(6)])
+        return resultados, len(scheduler._semaforos)
+
+    resultados, en_uso = asyncio.run(main())
+    assert maximo == 2
+    assert resultados[:3] == [0, 1, 2] and isinstance(resultados[3], ValueError)
+    assert en_uso == 0  # Ni siquiera tras una llamada fallida queda el semáforo
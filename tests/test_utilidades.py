@@ -0,0 +1,33 @@
+"""Qué canales toca ¡silenciar: solo los que no niegan ya send_messages al rol, categorías primero."""
+from types import SimpleNamespace
+
+import discord
+
+from cogs.utilidades import canales_sin_silenciar
+
+
+class Canal:
+    def __init__(self, nombre, overwrites=None):
+        self.name = nombre
+        self._overwrites = overwrites or {}
+
+    def overwrites_for(self, role):
+        return self._overwrites.get(role, discord.PermissionOverwrite())
+
+
+class Categoria(Canal, discord.CategoryChannel):
+    pass
+
+
+def test_canales_sin_silenciar():
+    role = object()
+    silenciado = {role: discord.PermissionOverwrite(send_messages=False)}
+    canales = [
+        Canal('general'),
+        Canal('ya-silenciado', silenciado),
+        Categoria('texto'),
+        Canal('permitido', {role: discord.PermissionOverwrite(send_messages=True)}),
+        Categoria('voz', silenciado),
+    ]
+    pendientes = canales_sin_silenciar(SimpleNamespace(channels=canales), role)
+    assert [c.name for c in pendientes] == ['texto', 'general', 'permitido']
@@ -0,0 +1,87 @@
+"""Sonoridad BS.1770 con señales de referencia: una senoidal de 1 kHz mide lo mismo en LUFS que en dBFS."""
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from core.cache_audio import audio_cache
+from core.storage import Database
+from core.volumen import LoudnessStore, MedidorSonoridad, SAMPLE_RATE
+
+
+def senoidal(dbfs, segundos, frecuencia=1000):
+    t = np.arange(int(segundos * SAMPLE_RATE)) / SAMPLE_RATE
+    mono = 10 ** (dbfs / 20) * 32767 * np.sin(2 * np.pi * frecuencia * t)
+    return np.repeat(mono, 2).astype('<i2').tobytes()  # Estéreo, la misma señal en los dos canales
+
+
+def medir(pcm, trozo=3840):
+    medidor = MedidorSonoridad()
+    for i in range(0, len(pcm), trozo):
+        medidor.añadir(pcm[i:i + trozo])
+    return medidor.resultado()
+
+
+@pytest.mark.parametrize('dbfs', [0, -20, -40])
+def test_senoidal_de_referencia(dbfs):
+    assert medir(senoidal(dbfs, 5)) == pytest.approx(dbfs, abs=0.1)
+
+
+def test_no_depende_del_tamaño_de_los_trozos():
+    pcm = senoidal(-18, 3)
+    assert medir(pcm, trozo=3840) == pytest.approx(medir(pcm, trozo=len(pcm)), abs=1e-6)
+    assert medir(pcm, trozo=1002) == pytest.approx(medir(pcm, trozo=len(pcm)), abs=1e-6)  # Muestras partidas
+
+
+def test_umbrales_ignoran_los_silencios():
+    # 3 s de señal y 3 s de silencio: sin umbrales la media bajaría 3 dB; con ellos
+    # solo cuentan, además de la señal, los bloques de 400 ms que la tocan
+    assert medir(senoidal(-20, 3) + bytes(3 * SAMPLE_RATE * 4)) == pytest.approx(-20, abs=0.3)
+
+
+def test_silencio_o_demasiado_corta():
+    assert medir(bytes(2 * SAMPLE_RATE * 4)) is None
+    assert medir(senoidal(-20, 0.2)) is None
+
+
+def test_medidas_en_memoria_acotadas(tmp_path):
+    db = Database(str(tmp_path / 'sonoridad.db'))
+    store = LoudnessStore(db, objetivo=-14, maxsize=2, enabled=True)
+    audio_cache.al_guardar.remove(store._guardada)
+    db.executemany("INSERT INTO sonoridad VALUES (?, ?, 0)", [('a', -20.0), ('b', -8.0), ('c', -14.0)])
+
+    async def cargar(*claves):
+        for clave in claves:
+            await store.cargar(clave)
+    asyncio.run(cargar('a', 'b', 'a', 'c'))
+
+    assert store.stats()['cached'] == 2
+    assert store.ganancia('b') == 1.0  # La menos usada: se desalojó
+    assert store.ganancia('a') == pytest.approx(10 ** (6 / 20))
+    asyncio.run(cargar('b'))
+    assert store.ganancia('b') == pytest.approx(10 ** (-6 / 20))
+
+
+def test_una_sola_medida_por_cancion(tmp_path):
+    store = LoudnessStore(Database(str(tmp_path / 'sonoridad.db')), enabled=True)
+    audio_cache.al_guardar.remove(store._guardada)
+    soltar, llamadas = threading.Event(), []
+
+    def medir(medidor, pcm):
+        llamadas.append(pcm)
+        soltar.wait(5)
+        medidor.añadir(pcm)
+
+    hilos = [threading.Thread(target=store._programar, args=('a', medir, senoidal(-20, 1))) for _ in range(8)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert store.stats()['measuring'] == 1
+    soltar.set()
+    store._executor.shutdown(wait=True)
+
+    assert len(llamadas) == 1
+    assert store.stats()['measuring'] == 0
+    assert store.ganancia('a') == pytest.approx(10 ** (6 / 20), rel=0.01)